@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Vault format benchmark for WinOTP
+Compares encrypting and decrypting a synthetic vault in the version 1 format
+(str() payload, Fernet, base64 JSON envelope) and the current format (binary
+header, each token sealed with AES-256-GCM), then measures a save and a reload
+after one token changed, which only re-encrypt and decrypt that token.
+
+The key is derived once up front, as it is for a whole unlocked session, so
+the numbers measure the formats themselves rather than the key derivation.
+"""
+
+import sys
+import json
+import time
+import base64
+import argparse
+
+from utils.crypto import VAULT_VERSION, VaultEnvelope, vault_session, encrypt_data, encrypt_tokens, decrypt_tokens
+
+
+def make_tokens(count):
+    """Build a vault with ``count`` tokens"""
+    return {
+        f"token{i}": {
+            "issuer": f"Issuer {i % 50}",
+            "name": f"user{i}@example.com",
+            "secret": "HXDMVJECJJWSRB3HWIZR4IFUGFTMXBOZ",
+            "created": "2024-01-02T03:04:05.678901"
+        }
+        for i in range(count)
+    }
+
+
+def encrypt_version1(tokens, password):
+    """Encrypt tokens the way version 1 wrote tokens.json"""
+    encrypted_data, salt = encrypt_data(tokens, password)
+    return json.dumps({
+        "encrypted": True,
+        "data": base64.b64encode(encrypted_data).decode(),
+        "salt": base64.b64encode(salt).decode()
+    }, indent=4).encode()
+
+
+def best_of(repeat, function, *args):
+    """Return the fastest of ``repeat`` runs in seconds and the last result"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function(*args)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the WinOTP encrypted vault formats")
+    parser.add_argument("--tokens", type=int, default=10000, help="Number of tokens in the vault (default: 10000)")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per measurement, the best is kept (default: 5)")
+    args = parser.parse_args(argv)
+
+    password = "benchmark password"
+    tokens = make_tokens(args.tokens)
+    plain_size = len(json.dumps(tokens, separators=(",", ":")))
+
+    # Derive the key once; both formats reuse it like an unlocked session does
+    encrypt_tokens({}, password)
+
+    print(f"{args.tokens} tokens, {plain_size / 1024:.0f} KiB of compact JSON")
+    print(f"{'format':<10}{'encrypt':>12}{'decrypt':>12}{'file size':>12}")
+    results = {}
+    for name, encrypt in (("v1", encrypt_version1), (f"v{VAULT_VERSION}", lambda t, p: encrypt_tokens(t, p))):
+        encrypt_time, content = best_of(args.repeat, encrypt, tokens, password)
+        decrypt_time, decrypted = best_of(args.repeat, decrypt_tokens, content, password)
+        if decrypted != tokens:
+            print(f"{name}: decrypted tokens don't match")
+            return 1
+        results[name] = (encrypt_time, decrypt_time)
+        print(f"{name:<10}{plain_size / encrypt_time / 2**20:>8.1f} MB/s{plain_size / decrypt_time / 2**20:>8.1f} MB/s"
+              f"{len(content) / 1024:>8.0f} KiB")
+
+    current = results[f"v{VAULT_VERSION}"]
+    print(f"v{VAULT_VERSION} speedup: encrypt {results['v1'][0] / current[0]:.1f}x, "
+          f"decrypt {results['v1'][1] / current[1]:.1f}x")
+
+    # A writer and a reader that already hold the vault, as after an unlock
+    writer, reader = VaultEnvelope(), VaultEnvelope()
+    reader.open(writer.seal(tokens, password), password)
+    edits = iter(range(10 ** 9))
+
+    def edit_and_save():
+        tokens["token0"] = dict(tokens["token0"], name=f"renamed{next(edits)}")
+        return writer.seal(tokens, password)
+
+    save_time, content = best_of(args.repeat, edit_and_save)
+    reload_time, _ = best_of(1, reader.open, content, password)
+    print(f"1 token changed: save {save_time * 1000:.1f} ms ({writer.encrypted_records} encrypted), "
+          f"reload {reload_time * 1000:.1f} ms ({reader.decrypted_records} decrypted)")
+    vault_session.lock()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
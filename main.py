@@ -15,18 +15,27 @@ import winreg
 
 # Import utilities
 from utils.file_io import read_json, write_json, clear_cache
-from utils.ntp_sync import start_ntp_sync, get_accurate_time, get_sync_status
+from utils.ntp_sync import start_ntp_sync, get_sync_status, default_clock
 from utils.auth import (
     set_pin, set_password, clear_auth, verify_pin, verify_password, 
-    is_auth_enabled, get_auth_type, hash_password, set_timeout,
-    get_timeout, check_timeout, set_auth_path
+    is_auth_enabled, get_auth_type, hash_password, is_legacy_hash, set_timeout,
+    get_timeout, check_timeout, set_auth_path, is_kdf_calibrated, calibrate_kdf_params, auth_state
 )
-from utils.crypto import encrypt_tokens_file, decrypt_tokens_file
-from models.token import Token  # Import Token class directly
+from utils.crypto import encrypt_tokens_file, decrypt_tokens_file, vault_session
+from utils.write_behind import WriteBehind
+from utils.file_watch import FileWatcher
+from utils.vault_storage import open_vault_storage, JsonVaultStorage
+from models.token import Token, forget_secret  # Import Token class directly
+from models.totp_engine import normalize_params, params_from_dict, DEFAULT_PARAMS
+from models.code_table import CodeTable
+from models.token_store import TokenStore
 from utils import asset_manager # Import asset_manager
 from utils.importers.winotp_importer import parse_winotp_json
 from utils.importers.twofas_importer import parse_2fas_json
 from utils.importers.authenticator_plugin import parse_authenticator_plugin_export
+from utils.exporters.stream_exporter import (
+    write_export, write_backup_file, read_encrypted_export, ExportCancelled, EXPORT_FORMATS, ENCRYPTED_EXTENSION
+)
 from utils.single_instance import is_already_running, activate_existing_window
 
 # Globals for on-demand imports
@@ -115,11 +124,12 @@ def load_settings():
             "backup_to_google_drive": False,
             "last_backup_date_google_drive": "",
             "backup_to_onedrive": False,
-            "last_backup_date_onedrive": ""
+            "last_backup_date_onedrive": "",
+            "vault_format": "json"  # "json", "journal" (append-only edits) or "sqlite" (tokens.db)
         }
         
         if os.path.exists(settings_path):
-            current_settings = read_json(settings_path) or {}
+            current_settings = read_json(settings_path, mutable=True) or {}
             defaults_added = False
             # Ensure all default settings exist
             for key, value in default_settings.items():
@@ -152,7 +162,7 @@ def save_settings(settings):
     print("=== Entered save_settings ===")
     return persist_settings(settings)
 
-def create_tray_icon(window):
+def create_tray_icon(window, on_quit=None):
     """Create system tray icon"""
     try:
         image_module = _ensure_pil_image()
@@ -196,6 +206,8 @@ def create_tray_icon(window):
         def quit_app():
             # Use the global tray_icon reference if available
             global tray_icon
+            if on_quit:
+                on_quit()
             window.destroy()
             if tray_icon:
                 tray_icon.stop()
@@ -259,6 +271,18 @@ def _perform_startup_backups(api, delay_seconds=2.0):
     today_str = datetime.now().date().isoformat()
     updated_fields = {}
 
+    if not (settings_snapshot.get("backup_to_google_drive", False) or settings_snapshot.get("backup_to_onedrive", False)):
+        return
+    # Protected vaults are backed up encrypted with the credential, so they wait for the unlock
+    if api._vault_locked():
+        print("Vault is locked; backups will run after unlock")
+        api._backups_pending = True
+        return
+    encrypted = api._credential is not None
+
+    # Back up the current vault, not one with debounced changes still pending
+    api.flush_tokens()
+
     # Google Drive backup
     if settings_snapshot.get("backup_to_google_drive", False):
         try:
@@ -266,13 +290,13 @@ def _perform_startup_backups(api, delay_seconds=2.0):
             needs_backup = settings_snapshot.get("last_backup_date_google_drive", "") != today_str
             if not needs_backup:
                 try:
-                    needs_backup = not check_backup_exists()
+                    needs_backup = not check_backup_exists(encrypted=encrypted)
                     if needs_backup:
                         print("Today's backup file not found on Google Drive. Will create a new backup.")
                 except Exception as check_error:
                     print(f"Error checking Google Drive backup existence: {check_error}")
                     needs_backup = True
-            if needs_backup and upload_tokens_json_to_drive(local_file_path=tokens_path):
+            if needs_backup and api._run_backup(upload_tokens_json_to_drive):
                 updated_fields["last_backup_date_google_drive"] = today_str
                 print("Google Drive backup completed and date updated.")
         except Exception as backup_error:
@@ -285,13 +309,13 @@ def _perform_startup_backups(api, delay_seconds=2.0):
             needs_backup = settings_snapshot.get("last_backup_date_onedrive", "") != today_str
             if not needs_backup:
                 try:
-                    needs_backup = not check_onedrive_backup_exists()
+                    needs_backup = not check_onedrive_backup_exists(encrypted=encrypted)
                     if needs_backup:
                         print("Today's backup file not found on OneDrive. Will create a new backup.")
                 except Exception as check_error:
                     print(f"Error checking OneDrive backup existence: {check_error}")
                     needs_backup = True
-            if needs_backup and upload_tokens_json_to_onedrive(local_file_path=tokens_path):
+            if needs_backup and api._run_backup(upload_tokens_json_to_onedrive):
                 updated_fields["last_backup_date_onedrive"] = today_str
                 print("OneDrive backup completed and date updated.")
         except Exception as backup_error:
@@ -315,17 +339,52 @@ def schedule_startup_backups(api, delay_seconds=2.0):
     ).start()
 
 class Api:
-    def __init__(self):
+    def __init__(self, clock=None, tokens_file=None):
+        """
+        Args:
+            clock (Clock, optional): Time source for code generation. Defaults to the
+                NTP-corrected clock; tests and benchmarks can pass a SimulatedClock.
+            tokens_file (str, optional): Vault file of this instance. Defaults to the
+                tokens path set when the instance is created.
+        """
         self._window = None
+        self.tokens_path = tokens_file if tokens_file is not None else tokens_path
+        self._clock = clock if clock is not None else default_clock
         self._settings = load_settings()
         # Start NTP sync in the background with delayed initialization
         start_ntp_sync()
         
         # Initialize tokens as None - will load on first request
         self._tokens_loaded = False
-        self.tokens = {}
+        self.tokens = TokenStore()
         self.last_tokens_update = 0
         
+        # Token edits mark the vault dirty and are written once after a short debounce
+        self._token_writer = WriteBehind(self._write_tokens)
+        # Storage the pending debounced save goes to, bound when the save is scheduled
+        self._save_storage = None
+        # Storage backend for the vault_format setting (see utils/vault_storage.py)
+        self._storage = None
+        # Vault files are watched for external changes, so reading tokens needs no
+        # filesystem calls; the watcher only raises this flag
+        self._file_watcher = FileWatcher()
+        self._tokens_stale = False
+        # Auth checks answer from memory; the watcher reports edits to auth_config.json
+        auth_state.attach(self._file_watcher)
+        # Set by cancel_export while an export is running
+        self._export_cancel = None
+        # Startup backups of a protected vault wait for the unlock
+        self._backups_pending = False
+        # Background unlock started by start_unlock (set by cancel_unlock while it runs)
+        self._unlock_lock = threading.Lock()
+        self._unlock_cancel = None
+        self._unlock_status = {"state": "idle"}
+        
+        # Precomputed previous/current/next codes, advanced before each TOTP boundary
+        # (one schedule per period/digits/algorithm class)
+        self._code_table = CodeTable(self._clock)
+        self._code_table.start()
+        
         # Check authentication status
         auth_enabled = is_auth_enabled()
         auth_type = get_auth_type()
@@ -334,6 +393,8 @@ class Api:
         # Authentication state - initially not authenticated if auth is enabled
         self.is_authenticated = False
         self.last_auth_time = None
+        # PIN or password of the unlocked session; the vault is encrypted with it
+        self._credential = None
         print(f"Initial authentication state: {self.is_authenticated}")
         
         # Start lazy import in background
@@ -360,10 +421,13 @@ class Api:
         # Store window reference
         self._window = window
         
+        # Push new codes to the page at every window boundary instead of letting it poll
+        self._code_table.add_listener(self._push_code_snapshot)
+        
         # Create tray icon if minimize to tray is enabled
         if self._settings.get("minimize_to_tray", False):
             global tray_icon
-            tray_icon = create_tray_icon(window)
+            tray_icon = create_tray_icon(window, on_quit=self.close)
             if tray_icon:
                 threading.Thread(target=tray_icon.run, daemon=True).start()
         
@@ -373,6 +437,9 @@ class Api:
             self.get_auth_status,
             self.get_tokens,
             self.verify_authentication,
+            self.start_unlock,
+            self.cancel_unlock,
+            self.get_unlock_status,
             self.add_token,
             self.update_token,
             self.delete_token,
@@ -386,6 +453,8 @@ class Api:
             self.import_tokens_from_2fas,
             self.import_tokens_from_authenticator_plugin,
             self.export_tokens_to_json,
+            self.export_tokens,
+            self.cancel_export,
             self.get_minimize_to_tray,
             self.get_setting,
             self.set_setting,
@@ -411,22 +480,15 @@ class Api:
     
     def load_tokens(self):
         """Load tokens from the tokens file"""
-        print(f"--- Enter load_tokens --- ")
-        print(f"    Current tokens_path: {tokens_path}")
-        print(f"    Current settings_path: {settings_path}")
-        print(f"    Current AUTH_CONFIG_PATH: {AUTH_CONFIG_PATH}")
+        if self._vault_locked():
+            return {"status": "error", "message": "Authentication required to load tokens"}
         try:
-            # Get current auth type and credentials
-            auth_type = get_auth_type()
-            config = read_json(AUTH_CONFIG_PATH) or {}
+            # Debounced edits that haven't been written yet must not be replaced by the file
+            if self._token_writer.dirty:
+                self._token_writer.flush()
             
-            # Try to decrypt tokens if auth is enabled
-            if auth_type == "pin":
-                tokens_data = decrypt_tokens_file(tokens_path, config.get("pin_hash", ""))
-            elif auth_type == "password":
-                tokens_data = decrypt_tokens_file(tokens_path, config.get("password_hash", ""))
-            else:
-                tokens_data = read_json(tokens_path)
+            # Read (and decrypt if auth is enabled) through the configured storage backend
+            tokens_data = self._vault_storage().load()
             
             # Validate tokens data
             if isinstance(tokens_data, dict):
@@ -434,44 +496,190 @@ class Api:
                 valid_tokens = {}
                 for token_id, token_data in tokens_data.items():
                     if isinstance(token_data, dict) and "secret" in token_data:
-                        valid_tokens[token_id] = {
-                            "issuer": token_data.get("issuer", "Unknown"),
-                            "name": token_data.get("name", "Unknown"),
-                            "secret": token_data["secret"],
-                            "created": token_data.get("created", datetime.now().isoformat())
-                        }
+                        try:
+                            params_from_dict(token_data)
+                            valid_tokens[token_id] = token_data
+                        except ValueError as e:
+                            print(f"Skipping token {token_id}: {e}")
                 
-                self.tokens = valid_tokens
+                # Update the existing store in place so only real changes get new versions
+                if self.tokens.sync_from_dict(valid_tokens):
+                    self._code_table.load(self.tokens.code_table_items())
+                self._tokens_loaded = True
                 self.last_tokens_update = time.time()
-                print(f"Successfully processed {len(self.tokens)} tokens loaded from {tokens_path}")
+                print(f"Successfully processed {len(self.tokens)} tokens loaded from {self.tokens_path}")
                 return {"status": "success", "message": f"Loaded {len(self.tokens)} tokens"}
             
-            print(f"No valid tokens found in file: {tokens_path}")
-            self.tokens = {}  # Reset to empty dict if invalid data
+            print(f"No valid tokens found in file: {self.tokens_path}")
+            self._reset_tokens()  # Reset to empty store if invalid data
             return {"status": "warning", "message": "No valid tokens found"}
         except Exception as e:
             print(f"Failed to load tokens: {str(e)}")
-            self.tokens = {}  # Reset to empty dict on error
+            self._reset_tokens()  # Reset to empty store on error
             return {"status": "error", "message": f"Failed to load tokens: {str(e)}"}
     
+    def _reset_tokens(self):
+        """Empty the token store (recording the removals) and the code table"""
+        self.tokens.clear()
+        self._code_table.load(())
+    
     def save_tokens(self):
-        """Save tokens to the tokens file"""
+        """Save tokens to the tokens file now (also writes any pending debounced changes)"""
+        self._schedule_save(self._vault_storage())
+        return self._token_writer.flush()
+    
+    def _schedule_save(self, storage):
+        """Mark the tokens dirty for a debounced full save to ``storage``
+        
+        The storage is bound here rather than looked up when the save runs, so a
+        save can't land in a vault that became current in the meantime.
+        """
+        self._save_storage = storage
+        self._token_writer.mark_dirty()
+    
+    def flush_tokens(self):
+        """Write pending token changes to disk (exit, lock, backup)"""
+        result = self._token_writer.flush()
+        if self._storage is not None:
+            try:
+                # Backends that buffer edits (journal compaction, database WAL) write them out
+                self._storage.flush()
+            except Exception as e:
+                print(f"Failed to flush token storage: {e}")
+                return {"status": "error", "message": f"Failed to flush token storage: {str(e)}"}
+        return result
+    
+    def close(self):
+        """Write pending changes and stop the background work of this instance
+        
+        Stops the write-behind thread, the code table refresher and the file
+        watcher, then closes the vault storage. Called on exit.
+        
+        Returns:
+            dict: Result of writing the pending changes
+        """
+        result = self.flush_tokens()
+        self._token_writer.close()
+        self._code_table.stop()
+        auth_state.detach(self._file_watcher)
+        self._file_watcher.stop()
+        if self._storage is not None:
+            try:
+                self._storage.close()
+            except Exception as e:
+                print(f"Failed to close token storage: {e}")
+            self._storage = self._save_storage = None
+        return result
+    
+    def _export_tokens_file(self):
+        """Write pending changes and bring tokens.json up to date before it is re-encrypted"""
+        self.flush_tokens()
+        try:
+            self._vault_storage().export_tokens_file()
+        except Exception as e:
+            print(f"Failed to export tokens.json from the token storage: {e}")
+    
+    def _vault_locked(self):
+        """True while protection is enabled and no credential was verified"""
+        return self._credential is None and get_auth_type() in ("pin", "password")
+    
+    def _vault_storage(self):
+        """Return the storage backend for the current vault_format setting and credentials
+        
+        Raises:
+            RuntimeError: If protection is enabled and the vault is locked
+        """
+        vault_format = self._settings.get("vault_format", "json")
+        if self._vault_locked():
+            raise RuntimeError("The vault is locked")
+        password = self._credential if get_auth_type() in ("pin", "password") else None
+        
+        storage = self._storage
+        if (storage is None or storage.format != vault_format
+                or storage.tokens_path != self.tokens_path or storage.password != password):
+            if storage is not None:
+                # Pending saves bound to the old storage are written before it closes
+                if self._save_storage is storage and self._token_writer.dirty:
+                    self._token_writer.flush()
+                if storage.format != vault_format and vault_format == "json":
+                    # Moving back to the JSON format: tokens.json becomes the vault again
+                    storage.export_tokens_file()
+                storage.close()
+                for path in storage.watch_paths:
+                    self._file_watcher.unwatch(path, self._on_vault_changed)
+            storage = self._storage = open_vault_storage(vault_format, self.tokens_path, password)
+            for path in storage.watch_paths:
+                self._file_watcher.watch(path, self._on_vault_changed)
+        return storage
+    
+    def _on_vault_changed(self, path):
+        """File-watch callback: the vault changed on disk, check it on the next read"""
+        self._tokens_stale = True
+    
+    def _record_token_change(self, token_id):
+        """Persist a change to one token: a single-record write, or a debounced full save"""
+        storage = self._vault_storage()
+        if not storage.incremental:
+            self._schedule_save(storage)
+        elif not storage.loaded:
+            # Fresh storage (format switched or credentials changed): start from a full save
+            storage.save_all(self.tokens.to_dict())
+        else:
+            record = self.tokens.get(token_id)
+            if record is not None:
+                storage.put(token_id, self.tokens.record_to_dict(record))
+            else:
+                storage.delete(token_id)
+    
+    def _recover_legacy_vault(self, legacy_hash):
+        """Re-encrypt a vault that earlier versions keyed with the stored credential hash
+        
+        Those versions saved the vault with the PIN or password hash from
+        auth_config.json as its password. Once the credential is verified (and its
+        hash upgraded), such a vault is decrypted with the old hash one last time
+        and saved under the credential.
+        """
+        try:
+            storage = self._vault_storage()
+            if storage.load() is not None:
+                return
+            legacy = open_vault_storage(storage.format, self.tokens_path, legacy_hash)
+            try:
+                tokens_data = legacy.load()
+            finally:
+                legacy.close()
+            if tokens_data is None:
+                print("Vault could not be decrypted with the credential or its previous hash")
+                return
+            print("Re-encrypting vault saved under the previous credential hash")
+            storage.save_all(tokens_data)
+        except Exception as e:
+            print(f"Failed to recover vault saved under the previous credential hash: {e}")
+    
+    def _rekey_storage(self):
+        """Rewrite the vault after the credentials changed (protection enabled or disabled)
+        
+        tokens.json itself is re-encrypted by the protection methods; other backends
+        are rewritten from the loaded tokens under the new credentials.
+        """
+        storage = self._vault_storage()
+        if isinstance(storage, JsonVaultStorage):
+            return
+        if not self._tokens_loaded:
+            print("Tokens not loaded; skipping storage re-key")
+            return
+        try:
+            storage.save_all(self.tokens.to_dict())
+        except Exception as e:
+            print(f"Failed to re-key token storage: {e}")
+    
+    def _write_tokens(self):
+        """Write the tokens file (called by the write-behind layer)"""
         try:
             with file_write_lock:
-                # Get current auth type and credentials
-                auth_type = get_auth_type()
-                config = read_json(AUTH_CONFIG_PATH) or {}
-                
-                # First write tokens to file without encryption
-                write_json(tokens_path, self.tokens)
-                
-                # Then encrypt if auth is enabled
-                if auth_type == "pin":
-                    success = encrypt_tokens_file(tokens_path, config.get("pin_hash", ""))
-                elif auth_type == "password":
-                    success = encrypt_tokens_file(tokens_path, config.get("password_hash", ""))
-                else:
-                    success = True
+                # Serialize, encrypt if auth is enabled, and write once through the storage backend
+                storage = self._save_storage if self._save_storage is not None else self._vault_storage()
+                success = storage.save_all(self.tokens.to_dict())
                 
                 if success:
                     self.last_tokens_update = time.time()
@@ -492,62 +700,119 @@ class Api:
         # Check if we need to reload tokens from disk
         self.check_reload_tokens()
         
-        # Get current time for TOTP generation
-        current_time = get_accurate_time()
+        # All codes come from the precomputed table for the current window
+        codes, errors = self._code_table.lookup_all()
         
-        for token_id, token_data in self.tokens.items():
-            try:
-                # Create Token object
-                token_obj = Token(
-                    token_data.get("issuer", "Unknown"),
-                    token_data.get("secret", ""),
-                    token_data.get("name", "Unknown")
-                )
-                
-                # Get the current code and time remaining
-                code = token_obj.get_code()
-                time_remaining = token_obj.get_time_remaining()
-                
-                # Add to result
-                result.append({
-                    "id": token_id,
-                    "issuer": token_data.get("issuer", "Unknown"),
-                    "name": token_data.get("name", "Unknown"),
-                    "code": code,
-                    "timeRemaining": time_remaining,
-                    "icon": token_data.get("icon", None)
-                })
-            except Exception as e:
-                print(f"Error generating code for token {token_id}: {str(e)}")
-                result.append({
-                    "id": token_id,
-                    "issuer": token_data.get("issuer", "Unknown"),
-                    "name": token_data.get("name", "Unknown"),
-                    "code": "ERROR",
-                    "timeRemaining": 30,
-                    "icon": token_data.get("icon", None),
-                    "error": str(e)
-                })
-        
-        # Sort tokens by issuer and name
-        if sort_ascending:
-            result.sort(key=lambda x: (x["issuer"].lower(), x["name"].lower()))
-        else:
-            result.sort(key=lambda x: (x["issuer"].lower(), x["name"].lower()), reverse=True)
+        # The store keeps tokens sorted by issuer and name; the sort order only picks the direction
+        for record in self.tokens.sorted_records(sort_ascending):
+            result.append(self._token_entry(record, codes.get(record.id), errors.get(record.id)))
             
         return result
     
+    def _token_entry(self, record, code_entry, error=None):
+        """Build the dict sent to the UI for one token
+        
+        ``sortKey`` is the token's key in the store's sorted index, so the UI
+        places tokens from a delta exactly where the backend orders them.
+        
+        Args:
+            record (TokenRecord): Token from the store
+            code_entry (tuple): ``(code, next_code, time_remaining)`` from the code table, or None
+            error (str): Error reported by the code table, if any
+        """
+        if code_entry is not None:
+            return {
+                "id": record.id,
+                "issuer": record.issuer,
+                "name": record.name,
+                "code": code_entry[0],
+                "nextCode": code_entry[1],
+                "timeRemaining": code_entry[2],
+                "period": record.params.period,
+                "icon": record.icon,
+                "sortKey": record.sort_key[:3]
+            }
+        
+        error = error or "Code not available"
+        print(f"Error generating code for token {record.id}: {error}")
+        return {
+            "id": record.id,
+            "issuer": record.issuer,
+            "name": record.name,
+            "code": "ERROR",
+            "timeRemaining": record.params.period,
+            "period": record.params.period,
+            "icon": record.icon,
+            "sortKey": record.sort_key[:3],
+            "error": error
+        }
+    
+    def get_token_changes(self, since_version=None):
+        """Get the tokens added, changed or removed since a version of the token list
+        
+        The UI keeps the version from its last call and asks only for what changed,
+        so refreshing the list after an edit or import costs O(changes) instead of
+        rebuilding every card.
+        
+        Args:
+            since_version (int): Version returned by the previous call, or None for everything
+            
+        Returns:
+            dict: ``version`` and ``reset``; when ``reset`` is True, ``tokens`` holds the
+                full sorted list, otherwise ``added``/``changed`` hold token entries and
+                ``removed`` holds token ids
+        """
+        try:
+            if not self._tokens_loaded:
+                self.load_tokens()
+            self.check_reload_tokens()
+            
+            version, reset, added, changed, removed = self.tokens.changes_since(since_version)
+            if reset:
+                return {"status": "success", "version": version, "reset": True, "tokens": self.get_tokens()}
+            
+            def entries(records):
+                result = []
+                for record in records:
+                    try:
+                        code_entry = self._code_table.lookup(record.id)
+                        error = None
+                    except (KeyError, ValueError) as e:
+                        code_entry, error = None, str(e)
+                    result.append(self._token_entry(record, code_entry, error))
+                return result
+            
+            return {
+                "status": "success",
+                "version": version,
+                "reset": False,
+                "added": entries(added),
+                "changed": entries(changed),
+                "removed": removed
+            }
+        except Exception as e:
+            return {"status": "error", "message": f"Failed to get token changes: {str(e)}"}
+    
     def check_reload_tokens(self):
-        """Check if tokens need to be reloaded from disk"""
+        """Reload tokens if the vault was changed on disk by something other than this app
+        
+        Only a flag is checked until the file watcher reports a change, so this is
+        free to call on every read.
+        """
+        # Unsaved in-memory changes win over the file until they are written
+        if not self._tokens_stale or self._token_writer.dirty:
+            return
+        self._tokens_stale = False
         try:
-            # Check if file has been modified since last load
-            if os.path.exists(tokens_path):
-                file_mtime = os.path.getmtime(tokens_path)
-                if file_mtime > self.last_tokens_update:
-                    self.load_tokens()
-        except Exception:
-            # Ignore errors, will try again next time
-            pass
+            # The vault's generation (or signature) tells our own writes apart from external ones
+            storage = self._storage
+            if storage is not None and storage.is_current():
+                return
+            print("Vault changed on disk, reloading tokens")
+            self.load_tokens()
+        except Exception as e:
+            # Try again on the next change
+            print(f"Failed to check the vault for changes: {e}")
     
     def add_token(self, token_data):
         """Add a new token"""
@@ -563,12 +828,11 @@ class Api:
             token_data["created"] = datetime.now().isoformat()
             
             # Add token to tokens
-            self.tokens[token_id] = token_data
+            record = self.tokens.add_from_dict(token_id, token_data)
+            self._code_table.set_token(token_id, self.tokens.key_or_secret(record), record.params)
             
-            # Save tokens
-            save_result = self.save_tokens()
-            if save_result["status"] != "success":
-                return save_result
+            # Journaled, or written to disk after a short debounce so bulk adds hit the disk once
+            self._record_token_change(token_id)
             
             return {"status": "success", "message": "Token added successfully", "id": token_id}
         except Exception as e:
@@ -582,13 +846,10 @@ class Api:
                 return {"status": "error", "message": "Token not found"}
             
             # Update token details
-            self.tokens[token_id]["issuer"] = data.get("issuer", self.tokens[token_id]["issuer"])
-            self.tokens[token_id]["name"] = data.get("name", self.tokens[token_id]["name"])
+            self.tokens.update(token_id, issuer=data.get("issuer"), name=data.get("name"))
             
-            # Save tokens
-            save_result = self.save_tokens()
-            if save_result["status"] != "success":
-                return save_result
+            # Journaled, or written to disk after a short debounce
+            self._record_token_change(token_id)
             
             return {"status": "success", "message": "Token updated successfully"}
         except Exception as e:
@@ -601,13 +862,17 @@ class Api:
             if token_id not in self.tokens:
                 return {"status": "error", "message": "Token not found"}
             
+            # Drop cached keys and codes unless another token shares the secret
+            record = self.tokens.get(token_id)
+            if not self.tokens.shares_secret(record):
+                forget_secret(self.tokens.secret(record))
+            
             # Delete token
-            del self.tokens[token_id]
+            self.tokens.remove(token_id)
+            self._code_table.remove_token(token_id)
             
-            # Save tokens
-            save_result = self.save_tokens()
-            if save_result["status"] != "success":
-                return save_result
+            # Journaled, or written to disk after a short debounce
+            self._record_token_change(token_id)
             
             return {"status": "success", "message": "Token deleted successfully"}
         except Exception as e:
@@ -641,8 +906,8 @@ class Api:
                 # For Google Auth migration QR, return the raw string
                 return {"status": "success", "data": result}
             else:
-                # For regular TOTP QR, return the tuple
-                return {"status": "success", "data": result}
+                # For regular TOTP QR, return the token data with its parameters
+                return {"status": "success", "data": qr_result_to_token_data(result)}
                 
         except Exception as e:
             return {"status": "error", "message": f"Failed to scan QR code: {str(e)}"}
@@ -671,8 +936,8 @@ class Api:
                 # For Google Auth migration QR, return the raw string
                 return {"status": "success", "data": result}
             else:
-                # For regular TOTP QR, return the tuple
-                return {"status": "success", "data": result}
+                # For regular TOTP QR, return the token data with its parameters
+                return {"status": "success", "data": qr_result_to_token_data(result)}
         except Exception as e:
             return {"status": "error", "message": f"Failed to scan QR code: {str(e)}"}
 
@@ -723,15 +988,8 @@ class Api:
                 # For Google Auth migration QR, return the raw string
                 return {"status": "success", "data": qr_result}
             else:
-                # For regular TOTP QR, convert the tuple to a dictionary
-                # The tuple format is (issuer, secret, name)
-                issuer, secret, name = qr_result
-                token_data = {
-                    "issuer": issuer,
-                    "secret": secret,
-                    "name": name
-                }
-                return {"status": "success", "data": token_data}
+                # For regular TOTP QR, convert the result to a dictionary
+                return {"status": "success", "data": qr_result_to_token_data(qr_result)}
                 
         except Exception as e:
             import traceback
@@ -770,14 +1028,8 @@ class Api:
                         # Scan for QR code
                         result = scan_qr_image(pil_image)
                         if result:
-                            # Found a QR code, process it
-                            issuer, secret, name = result
-                            # Add token
-                            add_result = self.add_token({
-                                'issuer': issuer,
-                                'name': name,
-                                'secret': secret
-                            })
+                            # Found a QR code, add it as a token
+                            add_result = self.add_token(qr_result_to_token_data(result))
                             
                             if add_result["status"] == "success":
                                 # Show success notification
@@ -849,11 +1101,15 @@ class Api:
                 if not Token.validate_base32_secret(totp.secret):
                     return {"status": "error", "message": "Invalid secret: Not a valid base32 string"}
                 
-                # Extract token data
+                # Extract token data, keeping non-default TOTP parameters
+                params = normalize_params(totp.interval, totp.digits, totp.digest().name)
                 token_data = {
                     "issuer": totp.issuer or "Unknown",
                     "name": totp.name or "Unknown",
-                    "secret": totp.secret
+                    "secret": totp.secret,
+                    "period": params.period,
+                    "digits": params.digits,
+                    "algorithm": params.algorithm
                 }
                 
                 # Add the token using the existing method
@@ -886,7 +1142,8 @@ class Api:
                         # Add each token with a new ID and created timestamp
                         token_id = str(uuid.uuid4())
                         token_data["created"] = datetime.now().isoformat()
-                        self.tokens[token_id] = token_data
+                        record = self.tokens.add_from_dict(token_id, token_data)
+                        self._code_table.set_token(token_id, self.tokens.key_or_secret(record), record.params)
                         successful_adds += 1 # Assume add is successful for now
 
                     # Save all added tokens at once
@@ -962,7 +1219,8 @@ class Api:
                         for token_data in valid_tokens_data:
                             token_id = str(uuid.uuid4())
                             token_data["created"] = datetime.now().isoformat()
-                            self.tokens[token_id] = token_data
+                            record = self.tokens.add_from_dict(token_id, token_data)
+                            self._code_table.set_token(token_id, self.tokens.key_or_secret(record), record.params)
                             # successful_adds count will be finalized after save
 
                         # Save all new tokens at once
@@ -1078,7 +1336,8 @@ class Api:
                         for token_data in valid_tokens_data:
                             token_id = str(uuid.uuid4())
                             token_data["created"] = datetime.now().isoformat()
-                            self.tokens[token_id] = token_data
+                            record = self.tokens.add_from_dict(token_id, token_data)
+                            self._code_table.set_token(token_id, self.tokens.key_or_secret(record), record.params)
                             # successful_adds count will be finalized after save
 
                         # Save all new tokens at once
@@ -1153,6 +1412,34 @@ class Api:
             print(f"Unexpected error during Authenticator Plugin import process: {str(e)}")
             return {"status": "error", "message": f"Failed to import tokens from Authenticator Plugin: {str(e)}"}
 
+    def import_encrypted_export(self, file_data, password):
+        """Import tokens from an encrypted export or cloud backup (.enc)
+
+        The file is decrypted with the password it was exported with and the
+        plaintext is handed to the importer of the format recorded in the export.
+
+        Args:
+            file_data (str): File contents as a base64 data URL
+            password (str): Password the export was encrypted with
+        """
+        if not password:
+            return {"status": "error", "message": "Enter the password the export was encrypted with"}
+        try:
+            content = base64.b64decode(file_data.split(',')[-1])
+            content_format, chunks = read_encrypted_export(io.BytesIO(content), password)
+            plaintext = b"".join(chunks).decode("utf-8")
+        except (ValueError, UnicodeDecodeError) as e:
+            return {"status": "error", "message": f"Could not decrypt the export: {str(e)}"}
+
+        importers = {
+            "winotp": self.import_tokens_from_json,
+            "2fas": self.import_tokens_from_2fas,
+            "otpauth": self.import_tokens_from_authenticator_plugin,
+        }
+        if content_format not in importers:
+            return {"status": "error", "message": f"Unsupported export format: {content_format}"}
+        return importers[content_format](plaintext)
+
     def get_icon_base64(self, icon_name):
         """Get base64 encoded icon data"""
         try:
@@ -1197,11 +1484,17 @@ class Api:
         # Validate PIN format (numbers only)
         if not pin.isdigit():
             return {"status": "error", "message": "PIN must contain only digits"}
+        
+        # The tokens file is re-encrypted below, so it must include pending changes
+        self._export_tokens_file()
+        self._calibrate_kdf()
             
         # Set the PIN
         if set_pin(pin):
             # Encrypt the tokens file with the new PIN (use the raw pin, not the hash)
-            if encrypt_tokens_file(tokens_path, pin):
+            if encrypt_tokens_file(self.tokens_path, pin):
+                self._credential = pin
+                self._rekey_storage()
                 return {"status": "success", "message": "PIN protection enabled"}
             else:
                 # If encryption fails, clear the PIN
@@ -1214,11 +1507,17 @@ class Api:
         """Set a password for app protection"""
         if not password or len(password) < 6:
             return {"status": "error", "message": "Password must be at least 6 characters"}
+        
+        # The tokens file is re-encrypted below, so it must include pending changes
+        self._export_tokens_file()
+        self._calibrate_kdf()
             
         # Set the password
         if set_password(password):
             # Encrypt the tokens file with the new password (use the raw password, not the hash)
-            if encrypt_tokens_file(tokens_path, password):
+            if encrypt_tokens_file(self.tokens_path, password):
+                self._credential = password
+                self._rekey_storage()
                 return {"status": "success", "message": "Password protection enabled"}
             else:
                 # If encryption fails, clear the password
@@ -1230,7 +1529,6 @@ class Api:
     def disable_protection(self, credential):
         """Disable PIN/password protection after verifying the current credential"""
         auth_type = get_auth_type()
-        config = read_json(AUTH_CONFIG_PATH) or {}
         
         # Verify the provided credential first
         if auth_type == "pin":
@@ -1245,14 +1543,15 @@ class Api:
 
         # If verification passed, proceed with decryption using the raw credential
         print(f"Verification successful for disabling {auth_type} protection.")
+        self._export_tokens_file()
         
         try:
             if auth_type == "pin":
                 # Decrypt using the verified raw PIN
-                current_tokens = decrypt_tokens_file(tokens_path, credential) 
+                current_tokens = decrypt_tokens_file(self.tokens_path, credential) 
             elif auth_type == "password":
                 # Decrypt using the verified raw password
-                current_tokens = decrypt_tokens_file(tokens_path, credential)
+                current_tokens = decrypt_tokens_file(self.tokens_path, credential)
             # No 'else' needed here because we handled 'None' auth_type earlier
 
             if current_tokens is None:
@@ -1267,7 +1566,10 @@ class Api:
                 
                 # Save the decrypted tokens without encryption
                 try:
-                    write_json(tokens_path, current_tokens)
+                    write_json(self.tokens_path, current_tokens)
+                    self._credential = None
+                    self._rekey_storage()
+                    vault_session.lock()
                     # Reset authentication state in the API instance
                     self.is_authenticated = False 
                     self.last_auth_time = None
@@ -1279,7 +1581,7 @@ class Api:
                     if auth_type == "pin": set_pin(credential) 
                     if auth_type == "password": set_password(credential)
                     # Re-encrypt the file (best effort)
-                    encrypt_tokens_file(tokens_path, credential) 
+                    encrypt_tokens_file(self.tokens_path, credential) 
                     return {"status": "error", "message": f"Failed to save unencrypted tokens: {str(e)}. Protection may not be fully disabled."}
             else:
                 print("Error: Failed to clear authentication settings.")
@@ -1292,9 +1594,23 @@ class Api:
     
     def verify_authentication(self, credential):
         """Verify PIN or password and check for updates on success."""
+        authenticated, message = self._authenticate(credential)
+        if authenticated:
+            return {"status": "success", "message": message, "update_info": self._auth_update_info()}
+        else:
+            return {"status": "error", "message": message}
+    
+    def _authenticate(self, credential):
+        """Verify the credential and unlock the session on success
+        
+        Returns:
+            tuple: (authenticated, message)
+        """
         auth_type = get_auth_type()
         authenticated = False
         message = ""
+        # Hash before verification replaces an outdated one (see _recover_legacy_vault)
+        stored_hash = auth_state.config.get(f"{auth_type}_hash") if auth_type else None
 
         if auth_type == "pin":
             if verify_pin(credential):
@@ -1315,19 +1631,119 @@ class Api:
         if authenticated:
             self.is_authenticated = True
             self.last_auth_time = time.time()
-            print("Authentication successful. Checking for updates...")
-            
-            # Check for updates after successful authentication
-            update_status = asset_manager.get_update_status()
-            if update_status.get("available"):
-                print("Update available, including status in auth response.")
-            else:
-                print("No update available or already up-to-date.")
-                
-            # Return success message AND update status
-            return {"status": "success", "message": message, "update_info": update_status}
+            if auth_type in ("pin", "password"):
+                # Verifying derived the vault key too (kept in the vault session)
+                self._credential = credential
+                if stored_hash and is_legacy_hash(stored_hash):
+                    self._recover_legacy_vault(stored_hash)
+                # Installs from before calibration measure once; the hash is upgraded at the next unlock
+                self._calibrate_kdf()
+            if self._backups_pending:
+                self._backups_pending = False
+                schedule_startup_backups(self, delay_seconds=0)
+        return authenticated, message
+    
+    def _calibrate_kdf(self):
+        """Pick key derivation parameters for this machine, unless that was done already"""
+        if is_kdf_calibrated():
+            return
+        if self._unlock_cancel is not None:
+            self._report_unlock_progress("calibrating", 40)
+        calibrate_kdf_params()
+    
+    def _auth_update_info(self):
+        """Update status included in a successful authentication response"""
+        print("Authentication successful. Checking for updates...")
+        
+        # Check for updates after successful authentication
+        update_status = asset_manager.get_update_status()
+        if update_status.get("available"):
+            print("Update available, including status in auth response.")
         else:
-            return {"status": "error", "message": message}
+            print("No update available or already up-to-date.")
+        return update_status
+    
+    def start_unlock(self, credential):
+        """Unlock the app in the background: verify the credential, then decrypt and load the vault
+        
+        Returns at once so the page can render the main page and load icons while
+        the key derivation runs. Each stage is pushed to the page with
+        ``updateUnlockProgress`` and the outcome with ``onUnlockComplete`` (also
+        available from ``get_unlock_status``). ``cancel_unlock`` stops the job at
+        the next stage and leaves the app locked.
+        """
+        with self._unlock_lock:
+            if self._unlock_cancel is not None:
+                return {"status": "warning", "message": "Unlock already in progress"}
+            cancel_event = self._unlock_cancel = threading.Event()
+            self._unlock_status = {"state": "running", "stage": "verifying", "progress": 0}
+        threading.Thread(target=self._run_unlock, args=(credential, cancel_event), daemon=True).start()
+        return {"status": "success", "message": "Unlocking"}
+    
+    def _run_unlock(self, credential, cancel_event):
+        """Unlock job started by start_unlock (runs on a worker thread)"""
+        try:
+            self._report_unlock_progress("verifying", 10)
+            authenticated, message = self._authenticate(credential)
+            if not authenticated:
+                result = {"status": "error", "message": message}
+            elif cancel_event.is_set():
+                result = self._abort_unlock()
+            else:
+                self._report_unlock_progress("decrypting", 60)
+                load_result = self.load_tokens()
+                if cancel_event.is_set():
+                    result = self._abort_unlock()
+                elif load_result["status"] == "error":
+                    result = load_result
+                else:
+                    self._report_unlock_progress("ready", 100)
+                    result = {"status": "success", "message": message, "update_info": self._auth_update_info()}
+        except Exception as e:
+            print(f"Unlock failed: {e}")
+            result = {"status": "error", "message": f"Unlock failed: {str(e)}"}
+        with self._unlock_lock:
+            self._unlock_cancel = None
+            self._unlock_status = {"state": "done", "result": result}
+        if self._window:
+            try:
+                self._window.evaluate_js(f"onUnlockComplete({json.dumps(result)})")
+            except Exception as eval_e:
+                print(f"Error sending unlock result to frontend: {eval_e}")
+    
+    def _abort_unlock(self):
+        """Undo a cancelled unlock: drop the loaded tokens and lock the vault again"""
+        self._reset_tokens()
+        self._tokens_loaded = False
+        vault_session.lock()
+        self._credential = None
+        self.is_authenticated = False
+        self.last_auth_time = None
+        return {"status": "cancelled", "message": "Unlock cancelled"}
+    
+    def cancel_unlock(self):
+        """Stop the unlock in progress after its current stage (the app stays locked)"""
+        with self._unlock_lock:
+            cancel_event = self._unlock_cancel
+        if cancel_event is None:
+            return {"status": "warning", "message": "No unlock in progress"}
+        cancel_event.set()
+        return {"status": "success", "message": "Cancelling unlock"}
+    
+    def get_unlock_status(self):
+        """Stage and progress of the unlock job, or its result once it finished"""
+        with self._unlock_lock:
+            return dict(self._unlock_status)
+    
+    def _report_unlock_progress(self, stage, progress_percent):
+        """Send unlock progress to the frontend"""
+        with self._unlock_lock:
+            self._unlock_status = {"state": "running", "stage": stage, "progress": progress_percent}
+        if self._window:
+            try:
+                self._window.evaluate_js(f'updateUnlockProgress("{stage}", {progress_percent})')
+            except Exception as eval_e:
+                print(f"Error sending unlock progress to frontend: {eval_e}")
     
     def get_auth_status(self):
         """Get current authentication status"""
@@ -1337,6 +1753,10 @@ class Api:
         # Check if authentication has timed out
         if auth_enabled and self.is_authenticated and self.last_auth_time:
             if check_timeout(self.last_auth_time):
+                self.flush_tokens()
+                # The vault key is derived again at the next unlock
+                vault_session.lock()
+                self._credential = None
                 self.is_authenticated = False
                 self.last_auth_time = None
         
@@ -1348,35 +1768,112 @@ class Api:
         }
 
     def export_tokens_to_json(self):
-        """Export tokens to a JSON string"""
+        """Export tokens to a WinOTP JSON file"""
+        return self.export_tokens("winotp")
+
+    def export_tokens(self, export_format="winotp", password=None):
+        """Export tokens to a file chosen by the user
+        
+        Tokens are streamed to disk one record at a time, so large vaults export
+        with bounded memory. Progress is pushed to the page and the export can be
+        stopped with ``cancel_export``.
+        
+        Args:
+            export_format (str): "winotp" (JSON), "otpauth" (URI list) or "2fas"
+            password (str, optional): Encrypt the export with this password
+        """
         try:
-            # Convert tokens to JSON string with pretty printing
-            json_str = json.dumps(self.tokens, indent=4)
+            if export_format not in EXPORT_FORMATS:
+                return {"status": "error", "message": f"Unknown export format: {export_format}"}
+            extension, file_type = EXPORT_FORMATS[export_format]
+            if password:
+                extension += ENCRYPTED_EXTENSION
+                file_type = f"Encrypted Export (*{extension})"
             
             # Get current date for default filename
-            default_filename = f"winotp_backup_{datetime.now().strftime('%Y-%m-%d')}.json"
+            default_filename = f"winotp_backup_{datetime.now().strftime('%Y-%m-%d')}{extension}"
             
             # Show save file dialog
             file_path = self._window.create_file_dialog(
                 webview.SAVE_DIALOG,
                 directory='~',
                 save_filename=default_filename,
-                file_types=('JSON Files (*.json)',)
+                file_types=(file_type,)
             )
-            
-            if file_path:
-                # Ensure file has .json extension
-                if not file_path.lower().endswith('.json'):
-                    file_path += '.json'
-                    
-                # Write the file
-                with open(file_path, 'w') as f:
-                    f.write(json_str)
-                return {"status": "success", "message": "Tokens exported successfully"}
-            else:
+            if not file_path:
                 return {"status": "cancelled", "message": "Export cancelled"}
+            
+            # Ensure file has the right extension
+            if not file_path.lower().endswith(extension):
+                file_path += extension
+            
+            self._export_cancel = threading.Event()
+            count = write_export(
+                self.tokens.iter_dicts(),
+                len(self.tokens),
+                file_path,
+                export_format,
+                password=password,
+                progress_callback=self._report_export_progress,
+                cancel_event=self._export_cancel
+            )
+            return {"status": "success", "message": f"Exported {count} tokens successfully"}
+        except ExportCancelled:
+            return {"status": "cancelled", "message": "Export cancelled"}
         except Exception as e:
             return {"status": "error", "message": f"Failed to export tokens: {str(e)}"}
+        finally:
+            self._export_cancel = None
+
+    def cancel_export(self):
+        """Stop the export in progress (the partial file is discarded)"""
+        cancel_event = self._export_cancel
+        if cancel_event is None:
+            return {"status": "warning", "message": "No export in progress"}
+        cancel_event.set()
+        return {"status": "success", "message": "Cancelling export"}
+
+    def _report_export_progress(self, current, total):
+        """Send export progress to the frontend"""
+        if self._window:
+            try:
+                progress_percent = int((current / total) * 100) if total else 100
+                self._window.evaluate_js(f'updateExportProgress({current}, {total}, {progress_percent})')
+            except Exception as eval_e:
+                print(f"Error sending export progress to frontend: {eval_e}")
+
+    def _run_backup(self, upload):
+        """Write a backup of the tokens and hand it to a cloud uploader
+        
+        The backup is streamed from the token store to a temporary file, encrypted
+        with the PIN or password when protection is enabled, and removed after
+        the upload.
+        
+        Args:
+            upload (callable): Uploader called with the backup file path, returning True on success
+            
+        Returns:
+            bool: True if the backup was uploaded
+        """
+        if self._vault_locked():
+            print("Vault is locked; backup postponed until unlock")
+            self._backups_pending = True
+            return False
+        try:
+            self.flush_tokens()
+            if not self._tokens_loaded:
+                self.load_tokens()
+            backup_path = write_backup_file(self.tokens.iter_dicts(), len(self.tokens), self._credential)
+        except Exception as e:
+            print(f"Failed to write backup: {e}")
+            return False
+        try:
+            return upload(backup_path)
+        finally:
+            try:
+                os.remove(backup_path)
+            except OSError as e:
+                print(f"Warning: Could not delete backup file {backup_path}: {e}")
 
     def get_minimize_to_tray(self):
         """Get minimize to tray setting"""
@@ -1441,7 +1938,8 @@ class Api:
                             from utils.onedrive_backup import upload_tokens_json_to_onedrive
                             # Run backup in a separate thread to avoid blocking
                             import threading
-                            backup_thread = threading.Thread(target=upload_tokens_json_to_onedrive, args=('tokens.json',))
+                            self.flush_tokens()
+                            backup_thread = threading.Thread(target=self._run_backup, args=(upload_tokens_json_to_onedrive,))
                             backup_thread.daemon = True
                             backup_thread.start()
                             return {"status": "success", "message": "OneDrive backup enabled and authenticated. Initial backup started."}
@@ -1476,7 +1974,8 @@ class Api:
                             from utils.drive_backup import upload_tokens_json_to_drive
                             # Run backup in a separate thread to avoid blocking
                             import threading
-                            backup_thread = threading.Thread(target=upload_tokens_json_to_drive, args=('tokens.json',))
+                            self.flush_tokens()
+                            backup_thread = threading.Thread(target=self._run_backup, args=(upload_tokens_json_to_drive,))
                             backup_thread.daemon = True
                             backup_thread.start()
                             return {"status": "success", "message": "Google Drive backup enabled and authenticated. Initial backup started."}
@@ -1583,7 +2082,7 @@ class Api:
                     # Create or destroy tray icon based on setting
                     global tray_icon
                     if enabled and not tray_icon and self._window:
-                        tray_icon = create_tray_icon(self._window)
+                        tray_icon = create_tray_icon(self._window, on_quit=self.close)
                         if tray_icon:
                             threading.Thread(target=tray_icon.run, daemon=True).start()
                     elif not enabled and tray_icon:
@@ -1740,19 +2239,8 @@ class Api:
             if token_id not in self.tokens:
                 return {"status": "error", "message": "Token not found"}
 
-            token_data = self.tokens[token_id]
-            token_obj = Token(
-                token_data.get("issuer", "Unknown"),
-                token_data.get("secret", ""),
-                token_data.get("name", "Unknown")
-            )
-
-            # Get the current time and calculate the next interval
-            current_time = get_accurate_time()
-            next_interval = current_time + (30 - (current_time % 30))
-
-            # Get the next code
-            next_code = token_obj.totp.at(next_interval)
+            # The next window's code is already in the table
+            _, next_code, _ = self._code_table.lookup(token_id)
 
             return {"status": "success", "code": next_code}
         except Exception as e:
@@ -1774,6 +2262,7 @@ class Api:
             # Got valid migration payload, now import the tokens
             migration_payload = result
             tokens_added = 0
+            md5_skipped = 0
             
             # Ensure pyotp is imported
             global pyotp
@@ -1793,22 +2282,29 @@ class Api:
                     # Create TOTP object to validate secret
                     totp = pyotp.TOTP(secret)
                     
+                    otp_params = google_auth_otp_params(otp_param)
+                    if otp_params is None:
+                        print(f"Skipping MD5 token for {otp_param.issuer or 'Unknown'} - {otp_param.name or 'Unknown'}")
+                        md5_skipped += 1
+                        continue
+                    
                     # Add token to database
-                    self.add_token({
+                    add_result = self.add_token({
                         'issuer': otp_param.issuer or 'Unknown',
                         'name': otp_param.name or 'Unknown',
-                        'secret': secret
+                        'secret': secret,
+                        **otp_params
                     })
+                    if add_result["status"] != "success":
+                        print(f"Error adding token: {add_result['message']}")
+                        continue
                     tokens_added += 1
                     print(f"Added token for {otp_param.issuer or 'Unknown'} - {otp_param.name or 'Unknown'}")
                 except Exception as e:
                     print(f"Error adding token: {str(e)}")
                     continue
 
-            if tokens_added > 0:
-                return {"status": "success", "message": f"Successfully imported {tokens_added} tokens", "tokens_count": tokens_added}
-            else:
-                return {"status": "error", "message": "No valid tokens found in QR code"}
+            return google_auth_import_result(tokens_added, md5_skipped)
 
         except Exception as e:
             import traceback
@@ -1854,6 +2350,7 @@ class Api:
             # Got valid migration payload, now import the tokens
             migration_payload = result
             tokens_added = 0
+            md5_skipped = 0
             
             # Ensure pyotp is imported
             global pyotp
@@ -1873,22 +2370,29 @@ class Api:
                     # Create TOTP object to validate secret
                     totp = pyotp.TOTP(secret)
                     
+                    otp_params = google_auth_otp_params(otp_param)
+                    if otp_params is None:
+                        print(f"Skipping MD5 token for {otp_param.issuer or 'Unknown'} - {otp_param.name or 'Unknown'}")
+                        md5_skipped += 1
+                        continue
+                    
                     # Add token to database
-                    self.add_token({
+                    add_result = self.add_token({
                         'issuer': otp_param.issuer or 'Unknown',
                         'name': otp_param.name or 'Unknown',
-                        'secret': secret
+                        'secret': secret,
+                        **otp_params
                     })
+                    if add_result["status"] != "success":
+                        print(f"Error adding token: {add_result['message']}")
+                        continue
                     tokens_added += 1
                     print(f"Added token for {otp_param.issuer or 'Unknown'} - {otp_param.name or 'Unknown'}")
                 except Exception as e:
                     print(f"Error adding token: {str(e)}")
                     continue
 
-            if tokens_added > 0:
-                return {"status": "success", "message": f"Successfully imported {tokens_added} tokens", "tokens_count": tokens_added}
-            else:
-                return {"status": "error", "message": "No valid tokens found in QR code"}
+            return google_auth_import_result(tokens_added, md5_skipped)
                 
         except Exception as e:
             import traceback
@@ -2114,24 +2618,15 @@ class Api:
             if token_id not in self.tokens:
                 return {"status": "error", "message": "Token not found"}
             
-            token_data = self.tokens[token_id]
-            
-            # Create Token object
-            token_obj = Token(
-                token_data.get("issuer", "Unknown"),
-                token_data.get("secret", ""),
-                token_data.get("name", "Unknown")
-            )
-            
-            # Get the current code and time remaining
-            code = token_obj.get_code()
-            time_remaining = token_obj.get_time_remaining()
+            # Look up the current code from the precomputed table
+            code, _, time_remaining = self._code_table.lookup(token_id)
             
             return {
                 "status": "success",
                 "id": token_id,
                 "code": code,
-                "timeRemaining": time_remaining
+                "timeRemaining": time_remaining,
+                "period": self.tokens.get(token_id).params.period
             }
         except Exception as e:
             return {"status": "error", "message": f"Error generating code: {str(e)}"}
@@ -2141,7 +2636,9 @@ class Api:
         try:
             results = {}
             
-            # Process only tokens that exist in memory
+            # One table read so every code in the batch agrees on the same window
+            codes, errors = self._code_table.lookup_all()
+            
             for token_id in token_ids:
                 if token_id not in self.tokens:
                     results[token_id] = {
@@ -2150,26 +2647,21 @@ class Api:
                     }
                     continue
                 
-                token_data = self.tokens[token_id]
-                
-                # Create Token object
-                token_obj = Token(
-                    token_data.get("issuer", "Unknown"),
-                    token_data.get("secret", ""),
-                    token_data.get("name", "Unknown")
-                )
-                
-                # Get the current code and time remaining
-                code = token_obj.get_code()
-                time_remaining = token_obj.get_time_remaining()
+                entry = codes.get(token_id)
+                if entry is None:
+                    results[token_id] = {
+                        "status": "error",
+                        "message": f"Error generating code: {errors.get(token_id, 'Code not available')}"
+                    }
+                    continue
                 
-                # Store in results
                 results[token_id] = {
                     "status": "success",
                     "id": token_id,
-                    "code": code,
-                    "timeRemaining": time_remaining,
-                    "nextCode": token_obj.totp.at(get_accurate_time() + (30 - time_remaining))
+                    "code": entry[0],
+                    "timeRemaining": entry[2],
+                    "period": self.tokens.get(token_id).params.period,
+                    "nextCode": entry[1]
                 }
             
             return {
@@ -2179,6 +2671,102 @@ class Api:
         except Exception as e:
             return {"status": "error", "message": f"Error generating codes in batch: {str(e)}"}
 
+    def get_code_snapshot(self):
+        """Get current and next codes for every token as columnar arrays
+        
+        The clock is read once, so every code in the response belongs to the same
+        instant. Tokens are listed in display order. ``windowEnd`` is the unix time
+        at which the first window ends (when some code changes next); vaults with
+        several periods also get a ``periods`` column and a ``windowEnds`` map
+        keyed by period, one entry per parameter class period.
+        """
+        try:
+            return self._code_snapshot_payload(self._code_table.snapshot())
+        except Exception as e:
+            return {"status": "error", "message": f"Error generating code snapshot: {str(e)}"}
+
+    def _code_snapshot_payload(self, snapshot):
+        """Convert a CodeTable snapshot into the columnar get_code_snapshot format"""
+        now, codes, errors, window_ends = snapshot
+        
+        ids, current, upcoming, periods = [], [], [], []
+        for record in self.tokens.sorted_records(sort_ascending):
+            entry = codes.get(record.id)
+            if entry is None:
+                continue
+            ids.append(record.id)
+            current.append(entry[0])
+            upcoming.append(entry[1])
+            periods.append(record.params.period)
+        
+        default_period = DEFAULT_PARAMS.period
+        payload = {
+            "status": "success",
+            "time": now,
+            "windowEnd": min(window_ends.values(), default=(int(now) // default_period + 1) * default_period),
+            "ids": ids,
+            "codes": current,
+            "nextCodes": upcoming
+        }
+        if len(window_ends) > 1:
+            payload["periods"] = periods
+            payload["windowEnds"] = {str(period): end for period, end in window_ends.items()}
+        if errors:
+            payload["errors"] = errors
+        return payload
+
+    def _push_code_snapshot(self, snapshot):
+        """Send a new code snapshot to the page (called by the code table after each boundary)"""
+        if not self._window:
+            return
+        try:
+            # Don't send codes to a locked page
+            if is_auth_enabled() and not self.is_authenticated:
+                return
+            payload = self._code_snapshot_payload(snapshot)
+            self._window.evaluate_js(f"applyPushedCodes({json.dumps(payload)})")
+        except Exception as e:
+            print(f"Failed to push code snapshot: {e}")
+
+def qr_result_to_token_data(qr_result):
+    """Convert a scan_qr_image result into the token dict accepted by add_token"""
+    issuer, secret, name = qr_result
+    params = getattr(qr_result, "params", None) or normalize_params()
+    return {
+        "issuer": issuer,
+        "secret": secret,
+        "name": name,
+        "period": params.period,
+        "digits": params.digits,
+        "algorithm": params.algorithm
+    }
+
+# Google Authenticator migration enums -> otpauth values (4, MD5, isn't supported)
+_GOOGLE_AUTH_ALGORITHMS = {0: "SHA1", 1: "SHA1", 2: "SHA256", 3: "SHA512"}
+_GOOGLE_AUTH_MD5 = 4
+_GOOGLE_AUTH_DIGITS = {0: 6, 1: 6, 2: 8}
+
+def google_auth_otp_params(otp_param):
+    """Return the period/digits/algorithm fields for a Google Authenticator OtpParameters entry,
+    or None for MD5 entries, which can't be imported"""
+    if otp_param.algorithm == _GOOGLE_AUTH_MD5:
+        return None
+    return {
+        "period": 30,  # The migration format has no period field
+        "digits": _GOOGLE_AUTH_DIGITS.get(otp_param.digits, 6),
+        "algorithm": _GOOGLE_AUTH_ALGORITHMS.get(otp_param.algorithm, "SHA1")
+    }
+
+def google_auth_import_result(tokens_added, md5_skipped):
+    """Build the result of a Google Authenticator import, naming the MD5 entries that were skipped"""
+    skipped = f"{md5_skipped} tokens use MD5, which isn't supported" if md5_skipped else ""
+    if tokens_added > 0:
+        message = f"Successfully imported {tokens_added} tokens" + (f"; {skipped} and were skipped" if skipped else "")
+        return {"status": "success", "message": message, "tokens_count": tokens_added, "unsupported_count": md5_skipped}
+    if md5_skipped:
+        return {"status": "error", "message": f"No tokens imported: {skipped}", "unsupported_count": md5_skipped}
+    return {"status": "error", "message": "No valid tokens found in QR code"}
+
 def set_tokens_path(path):
     """Set the path to the tokens file"""
     global tokens_path
@@ -2248,9 +2836,7 @@ def main():
         import utils.drive_backup as drive_backup
         import utils.onedrive_backup as onedrive_backup
         drive_backup.TOKEN_PATH = DRIVE_PICKLE_PATH
-        drive_backup.AUTH_CONFIG_PATH = AUTH_CONFIG_PATH
         onedrive_backup.TOKEN_PATH = ONEDRIVE_TOKEN_PATH
-        onedrive_backup.AUTH_CONFIG_PATH = AUTH_CONFIG_PATH
         print(f"DEBUG MODE: Using local development files:")
         print(f"  - Tokens: {tokens_path}")
         print(f"  - Settings: {settings_path}")
@@ -2393,6 +2979,8 @@ def main():
             return False  # Prevent window from closing
         else:
             # If we're not minimizing to tray, ensure the application exits
+            # Pending token changes are written first; os._exit skips any cleanup
+            api.close()
             # We need to delay the exit to allow the window to close properly
             threading.Timer(0.5, lambda: os._exit(0)).start()
         return True  # Allow window to close
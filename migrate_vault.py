@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Vault migration tool for WinOTP
+Copies an existing tokens.json into a SQLite vault (tokens.db) and optionally
+switches the app to it by setting "vault_format" in app_settings.json.
+
+The app must be closed while migrating.
+"""
+
+import os
+import sys
+import getpass
+import argparse
+
+from utils.auth import verify_password_hash
+from utils.file_io import read_json, write_json
+from utils.vault_storage import sqlite_path_for
+from utils.sqlite_vault import migrate_tokens_file
+
+
+def vault_password(auth_config_path):
+    """Ask for the PIN or password the vault is encrypted with, or return None if protection is off
+
+    Raises:
+        ValueError: If the PIN or password is incorrect
+    """
+    config = read_json(auth_config_path) or {}
+    auth_type = config.get("auth_type")
+    if auth_type not in ("pin", "password"):
+        return None
+    credential = getpass.getpass("WinOTP PIN: " if auth_type == "pin" else "WinOTP password: ")
+    # Verifying also derives the vault key, so the migration doesn't derive it again
+    if not verify_password_hash(config.get(f"{auth_type}_hash", ""), credential):
+        raise ValueError(f"Incorrect {auth_type}")
+    return credential
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Migrate a WinOTP tokens.json vault to SQLite")
+    parser.add_argument("--data-dir", default=os.path.join(os.path.expandvars('%APPDATA%'), 'WinOTP'),
+                        help="WinOTP data directory (default: %%APPDATA%%\\WinOTP)")
+    parser.add_argument("--force", action="store_true", help="Overwrite an existing tokens.db")
+    parser.add_argument("--activate", action="store_true", help="Switch the app to the SQLite vault")
+    args = parser.parse_args(argv)
+
+    tokens_path = os.path.join(args.data_dir, "tokens.json")
+    settings_path = os.path.join(args.data_dir, "app_settings.json")
+    db_path = sqlite_path_for(tokens_path)
+
+    if not os.path.exists(tokens_path):
+        print(f"No vault found at {tokens_path}")
+        return 1
+    if os.path.exists(db_path):
+        if not args.force:
+            print(f"{db_path} already exists (use --force to replace it)")
+            return 1
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(db_path + suffix):
+                os.remove(db_path + suffix)
+
+    try:
+        count = migrate_tokens_file(tokens_path, db_path, vault_password(os.path.join(args.data_dir, "auth_config.json")))
+    except Exception as e:
+        print(f"Migration failed: {e}")
+        return 1
+    print(f"Migrated {count} tokens")
+
+    if args.activate:
+        settings = read_json(settings_path, mutable=True) or {}
+        settings["vault_format"] = "sqlite"
+        if not write_json(settings_path, settings):
+            print(f"Failed to update {settings_path}")
+            return 1
+        print("WinOTP will use the SQLite vault on next start")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,379 @@
+import threading
+import logging
+from models.totp_engine import TotpBatchEngine, DEFAULT_PARAMS
+from utils.ntp_sync import default_clock
+
+logger = logging.getLogger("code_table")
+
+
+class _CodeGroup:
+    """Columns for every token of one parameter class (period, digest, digits).
+
+    All methods must be called with the owning table's lock held.
+    """
+
+    __slots__ = ("params", "engine", "ids", "index", "keys",
+                 "prev", "cur", "next", "counter")
+
+    def __init__(self, params, engine):
+        self.params = params
+        self.engine = engine
+        # Parallel columns; index maps token id -> position
+        self.ids = []
+        self.index = {}
+        self.keys = []
+        self.prev = []
+        self.cur = []
+        self.next = []
+        # Counter (window number) the "cur" column is valid for
+        self.counter = None
+
+    def __len__(self):
+        return len(self.ids)
+
+    def reset(self, ids, keys):
+        self.ids = ids
+        self.index = {token_id: i for i, token_id in enumerate(ids)}
+        self.keys = keys
+        self.prev, self.cur, self.next = [], [], []
+        self.counter = None
+
+    def set(self, token_id, key):
+        position = self.index.get(token_id)
+        if position is None:
+            position = len(self.ids)
+            self.index[token_id] = position
+            self.ids.append(token_id)
+            self.keys.append(key)
+            if self.counter is not None:
+                self.prev.append(None)
+                self.cur.append(None)
+                self.next.append(None)
+        else:
+            self.keys[position] = key
+
+        if self.counter is not None:
+            engine = self.engine
+            counter = self.counter
+            self.prev[position] = engine.code_for_key(key, counter - 1)
+            self.cur[position] = engine.code_for_key(key, counter)
+            self.next[position] = engine.code_for_key(key, counter + 1)
+
+    def remove(self, token_id):
+        position = self.index.pop(token_id, None)
+        if position is None:
+            return
+        # Swap-remove keeps removal O(1)
+        last = len(self.ids) - 1
+        columns = [self.ids, self.keys]
+        if self.counter is not None:
+            columns.extend((self.prev, self.cur, self.next))
+        if position != last:
+            for column in columns:
+                column[position] = column[last]
+            self.index[self.ids[position]] = position
+        for column in columns:
+            column.pop()
+
+    def advance_to(self, counter):
+        engine = self.engine
+        if self.counter == counter:
+            return
+        if self.counter is not None and counter == self.counter + 1:
+            self.prev = self.cur
+            self.cur = self.next
+            self.next = engine.codes_for_keys(self.keys, counter + 1)
+        elif self.counter is not None and counter == self.counter - 1:
+            self.next = self.cur
+            self.cur = self.prev
+            self.prev = engine.codes_for_keys(self.keys, counter - 1)
+        else:
+            self.prev = engine.codes_for_keys(self.keys, counter - 1)
+            self.cur = engine.codes_for_keys(self.keys, counter)
+            self.next = engine.codes_for_keys(self.keys, counter + 1)
+        self.counter = counter
+
+    def columns_for(self, counter):
+        """Return (current, next) columns for a counter, rebuilding if stale."""
+        if self.counter is not None and counter == self.counter - 1:
+            # The next window was prepared ahead of the boundary
+            return self.prev, self.cur
+        self.advance_to(counter)
+        return self.cur, self.next
+
+
+class CodeTable:
+    """Previous, current and next TOTP codes for every vault token.
+
+    Codes only change once per window, so the table is advanced by a background
+    thread shortly before each boundary (using the NTP-corrected clock) and every
+    lookup in between is a dict/list access with no HMAC work. Advancing one
+    window reuses the old current/next columns, so each token costs exactly one
+    HMAC per window, which also pays for the "next code" preview.
+
+    Tokens are grouped by parameter class (period, digest, digits). Each group
+    has its own engine and its own boundary schedule, so 60-second tokens are
+    only recomputed every 60 seconds even when 30-second tokens share the vault.
+
+    Listeners registered with ``add_listener`` are called from the refresh
+    thread right after each boundary with a ``snapshot()``, so the UI can be
+    pushed new codes instead of polling for them.
+    """
+
+    def __init__(self, clock=default_clock, lead_time=1.0, engine_factory=TotpBatchEngine.for_params):
+        """
+        Args:
+            clock (Clock): Source of the current time (NTP-corrected by default)
+            lead_time (float): Seconds before a boundary at which the next window is prepared
+            engine_factory (callable): Creates a TotpBatchEngine for an OtpParams
+        """
+        self._clock = clock
+        self._lead_time = lead_time
+        self._engine_factory = engine_factory
+        self._lock = threading.Lock()
+
+        self._groups = {}   # OtpParams -> _CodeGroup
+        self._members = {}  # token id -> _CodeGroup
+        self._errors = {}
+        self._listeners = []
+
+        self._wake_event = threading.Event()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    # --- Membership -------------------------------------------------------
+
+    def _group_for(self, params):
+        """Return the group for a parameter class, creating it if needed (lock held)."""
+        group = self._groups.get(params)
+        if group is None:
+            group = self._groups[params] = _CodeGroup(params, self._engine_factory(params))
+        return group
+
+    def _resolve_key(self, secret, engine):
+        """Accept already-decoded key bytes or a base32 secret string."""
+        if isinstance(secret, (bytes, bytearray)):
+            return bytes(secret)
+        return engine.key_for(secret)
+
+    def load(self, items):
+        """Replace the table contents.
+
+        Args:
+            items (iterable): ``(token_id, secret_or_key)`` or
+                ``(token_id, secret_or_key, params)`` tuples
+        """
+        columns, errors = {}, {}
+        for item in items:
+            token_id, secret = item[0], item[1]
+            params = item[2] if len(item) > 2 else DEFAULT_PARAMS
+            try:
+                ids, keys, engine = columns.get(params) or columns.setdefault(
+                    params, ([], [], self._engine_factory(params)))
+                keys.append(self._resolve_key(secret, engine))
+                ids.append(token_id)
+            except Exception as e:
+                errors[token_id] = str(e)
+
+        groups, members = {}, {}
+        for params, (ids, keys, engine) in columns.items():
+            if not ids:
+                continue
+            group = groups[params] = _CodeGroup(params, engine)
+            group.reset(ids, keys)
+            for token_id in ids:
+                members[token_id] = group
+
+        with self._lock:
+            self._groups = groups
+            self._members = members
+            self._errors = errors
+        self._wake_event.set()
+
+    def set_token(self, token_id, secret, params=DEFAULT_PARAMS):
+        """Add or replace a single token (base32 secret or decoded key bytes)."""
+        with self._lock:
+            group = self._group_for(params)
+            try:
+                key = self._resolve_key(secret, group.engine)
+            except Exception as e:
+                if not group:
+                    self._groups.pop(params, None)
+                self._remove_locked(token_id)
+                self._errors[token_id] = str(e)
+                return
+
+            self._errors.pop(token_id, None)
+            previous = self._members.get(token_id)
+            if previous is not None and previous is not group:
+                self._remove_locked(token_id)
+            group.set(token_id, key)
+            self._members[token_id] = group
+        self._wake_event.set()
+
+    def remove_token(self, token_id):
+        """Remove a single token from the table."""
+        with self._lock:
+            self._remove_locked(token_id)
+            self._errors.pop(token_id, None)
+
+    def _remove_locked(self, token_id):
+        group = self._members.pop(token_id, None)
+        if group is None:
+            return
+        group.remove(token_id)
+        if not group:
+            self._groups.pop(group.params, None)
+
+    # --- Window management ------------------------------------------------
+
+    def advance_to(self, counter, params=DEFAULT_PARAMS):
+        """Make ``counter`` the current window of one parameter class, reusing codes where possible."""
+        with self._lock:
+            group = self._groups.get(params)
+            if group is not None:
+                group.advance_to(counter)
+
+    # --- Lookups ----------------------------------------------------------
+
+    def lookup(self, token_id, now=None):
+        """Return ``(code, next_code, time_remaining)`` for one token.
+
+        Raises:
+            KeyError: If the token is not in the table
+            ValueError: If the token's secret could not be decoded
+        """
+        if now is None:
+            now = self._clock.time()
+        with self._lock:
+            if token_id in self._errors:
+                raise ValueError(self._errors[token_id])
+            group = self._members[token_id]
+            period = group.params.period
+            position = group.index[token_id]
+            current, upcoming = group.columns_for(int(now) // period)
+            return current[position], upcoming[position], int(period - now % period)
+
+    def lookup_all(self, now=None):
+        """Return ``(codes, errors)`` for every token.
+
+        ``codes`` maps token id -> (code, next_code, time_remaining) and
+        ``errors`` maps token id -> error message for tokens whose secret is
+        invalid.
+        """
+        if now is None:
+            now = self._clock.time()
+        codes = {}
+        with self._lock:
+            for group in self._groups.values():
+                period = group.params.period
+                remaining = int(period - now % period)
+                current, upcoming = group.columns_for(int(now) // period)
+                for token_id, code, next_code in zip(group.ids, current, upcoming):
+                    codes[token_id] = (code, next_code, remaining)
+            errors = dict(self._errors)
+        return codes, errors
+
+    def snapshot(self, now=None):
+        """Return codes for every token from a single clock read.
+
+        Returns:
+            tuple: ``(now, codes, errors, window_ends)`` where ``codes`` maps
+            token id -> (code, next_code), ``errors`` maps token id -> error
+            message and ``window_ends`` maps period -> unix time at which the
+            current window of that period ends
+        """
+        if now is None:
+            now = self._clock.time()
+        codes, window_ends = {}, {}
+        with self._lock:
+            for group in self._groups.values():
+                period = group.params.period
+                counter = int(now) // period
+                current, upcoming = group.columns_for(counter)
+                codes.update(zip(group.ids, zip(current, upcoming)))
+                window_ends[period] = (counter + 1) * period
+            errors = dict(self._errors)
+        return now, codes, errors, window_ends
+
+    # --- Background refresh -----------------------------------------------
+
+    def add_listener(self, callback):
+        """Call ``callback(snapshot)`` after every window boundary (see ``snapshot``)."""
+        with self._lock:
+            if callback not in self._listeners:
+                self._listeners.append(callback)
+
+    def remove_listener(self, callback):
+        with self._lock:
+            if callback in self._listeners:
+                self._listeners.remove(callback)
+
+    def _notify_listeners(self, boundary):
+        with self._lock:
+            listeners = list(self._listeners)
+        if not listeners:
+            return
+        # Never publish from just before the boundary, even if the wait woke early
+        snapshot = self.snapshot(max(self._clock.time(), boundary))
+        for callback in listeners:
+            try:
+                callback(snapshot)
+            except Exception as e:
+                logger.error(f"Error in code table listener: {e}")
+
+    def start(self):
+        """Start the background thread that prepares each window before its boundary."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._refresh_loop, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the background refresh thread."""
+        self._stop_event.set()
+        self._wake_event.set()
+
+    def _next_refresh(self, now):
+        """Return ``(wake_at, [(params, target_counter), ...])`` for the earliest due groups."""
+        wake_at, due = None, []
+        with self._lock:
+            for params, group in self._groups.items():
+                period = params.period
+                target = int(now) // period + 1
+                if group.counter is not None and group.counter >= target:
+                    target = group.counter + 1
+                group_wake = target * period - self._lead_time
+                if wake_at is None or group_wake < wake_at:
+                    wake_at, due = group_wake, [(params, target)]
+                elif group_wake == wake_at:
+                    due.append((params, target))
+        return wake_at, due
+
+    def _refresh_loop(self):
+        while not self._stop_event.is_set():
+            try:
+                self._wake_event.clear()
+                now = self._clock.time()
+                wake_at, due = self._next_refresh(now)
+                if wake_at is None:
+                    # Nothing to refresh until tokens are added
+                    self._clock.wait(self._wake_event, 60.0)
+                    continue
+                if self._clock.wait(self._wake_event, wake_at - now):
+                    continue  # Membership changed; recompute the schedule
+                if self._stop_event.is_set():
+                    break
+                for params, target in due:
+                    self.advance_to(target, params)
+
+                # Codes were prepared ahead of time; publish them once the boundary passes
+                if self._listeners:
+                    boundary = wake_at + self._lead_time
+                    if self._clock.wait(self._stop_event, boundary - self._clock.time()):
+                        break
+                    self._notify_listeners(boundary)
+            except Exception as e:
+                logger.error(f"Error refreshing code table: {e}")
+                self._clock.wait(self._stop_event, 1.0)
@@ -1,72 +1,162 @@
 import re
+import threading
+from collections import OrderedDict
+import hashlib
 import pyotp
 from datetime import datetime
+from models.totp_engine import normalize_params, DEFAULT_PERIOD
 from utils.ntp_sync import get_accurate_time
 
-# Cache for TOTP objects
-_totp_cache = {}
+# Upper bound on cached TOTP objects; least recently used ones are dropped first
+_TOTP_CACHE_SIZE = 4096
+
+
+def _cache_key_matches(key, secret):
+    """Cache keys are the secret, or (secret, params) for non-default parameters"""
+    return key == secret or (isinstance(key, tuple) and key[0] == secret)
+
+
+class WindowCodeCache:
+    """Thread-safe cache of generated codes keyed by TOTP window number.
+
+    Codes are grouped per window, so expiring a whole window is a single
+    ``popitem`` and memory stays bounded by ``max_windows`` windows no matter
+    how long the app runs.
+    """
+
+    def __init__(self, max_windows=3):
+        self._max_windows = max_windows
+        self._windows = OrderedDict()  # window number -> {secret: code}
+        self._lock = threading.Lock()
+
+    def get(self, secret, window):
+        """Return the cached code for a secret in a window, or None"""
+        with self._lock:
+            codes = self._windows.get(window)
+            return codes.get(secret) if codes is not None else None
+
+    def put(self, secret, window, code):
+        """Store a code, evicting the oldest windows once the limit is reached"""
+        with self._lock:
+            codes = self._windows.get(window)
+            if codes is None:
+                newest = next(reversed(self._windows), None)
+                if newest is not None and window <= newest - self._max_windows:
+                    return  # Too old to be worth caching
+                codes = self._windows[window] = {}
+                # Drop whole windows that can no longer be requested
+                while self._windows:
+                    oldest = next(iter(self._windows))
+                    if len(self._windows) > self._max_windows or oldest <= window - self._max_windows:
+                        self._windows.popitem(last=False)
+                    else:
+                        break
+                if window not in self._windows:
+                    return
+            codes[secret] = code
+
+    def forget(self, secret):
+        """Remove every cached code for a secret (including non-default parameter variants)"""
+        with self._lock:
+            for codes in self._windows.values():
+                for key in [k for k in codes if _cache_key_matches(k, secret)]:
+                    del codes[key]
+
+    def clear(self):
+        """Remove all cached codes"""
+        with self._lock:
+            self._windows.clear()
+
+    def __len__(self):
+        with self._lock:
+            return sum(len(codes) for codes in self._windows.values())
+
+
+# Cache for TOTP objects (bounded LRU)
+_totp_cache = OrderedDict()
+_totp_cache_lock = threading.Lock()
+
+# Global caches for generated codes to reduce duplicate work during batch operations,
+# one per period: window numbers of different periods don't line up
+_code_cache = WindowCodeCache()
+_code_caches = {DEFAULT_PERIOD: _code_cache}
+_code_caches_lock = threading.Lock()
+
+
+def _code_cache_for(period):
+    """Return the code cache for tokens with a period"""
+    cache = _code_caches.get(period)
+    if cache is None:
+        with _code_caches_lock:
+            cache = _code_caches.setdefault(period, WindowCodeCache())
+    return cache
+
+
+def forget_secret(secret):
+    """Drop every cached object and code derived from a secret (e.g. on token deletion)"""
+    with _totp_cache_lock:
+        for key in [k for k in _totp_cache if _cache_key_matches(k, secret)]:
+            del _totp_cache[key]
+    with _code_caches_lock:
+        caches = list(_code_caches.values())
+    for cache in caches:
+        cache.forget(secret)
 
-# Global cache for generated codes to reduce duplicate work during batch operations
-_code_cache = {}
 
 class Token:
-    def __init__(self, issuer, secret, name):
+    def __init__(self, issuer, secret, name, period=None, digits=None, algorithm=None, clock=None):
         self.issuer = issuer
         self.secret = secret
         self.name = name
+        self.params = normalize_params(period, digits, algorithm)
+        self.clock = clock  # None means the NTP-synchronized time
         self.current_code = None
         self.expiry_timestamp = 0
         
-        # Use cached TOTP object if available
-        cache_key = self.secret
-        if cache_key in _totp_cache:
-            self.totp = _totp_cache[cache_key]
-        else:
-            self.totp = pyotp.TOTP(self.secret)
-            _totp_cache[cache_key] = self.totp
+        # Use cached TOTP object if available (keyed by secret and parameters)
+        cache_key = self._cache_key = self.secret if self.params.is_default else (self.secret, self.params)
+        with _totp_cache_lock:
+            totp = _totp_cache.get(cache_key)
+            if totp is not None:
+                _totp_cache.move_to_end(cache_key)
+        if totp is None:
+            totp = pyotp.TOTP(
+                self.secret,
+                digits=self.params.digits,
+                digest=getattr(hashlib, self.params.digest),
+                interval=self.params.period
+            )
+            with _totp_cache_lock:
+                _totp_cache[cache_key] = totp
+                if len(_totp_cache) > _TOTP_CACHE_SIZE:
+                    _totp_cache.popitem(last=False)
+        self.totp = totp
     
+    def _now(self):
+        return self.clock.time() if self.clock is not None else get_accurate_time()
+
     def get_code(self):
         """Generate the current TOTP code using NTP-synchronized time, caching the result."""
-        now = get_accurate_time()
-        
-        # Calculate current interval to use as cache key
-        current_interval_start = (now // self.totp.interval) * self.totp.interval
-        cache_key = f"{self.secret}:{current_interval_start}"
+        now = self._now()
+        interval = self.totp.interval
+        window = int(now) // interval
         
         # Check global cache first for batch optimization
-        if cache_key in _code_cache:
-            self.current_code = _code_cache[cache_key]
-            self.expiry_timestamp = current_interval_start + self.totp.interval
-            return self.current_code
-        
-        # Check if the cached code is still valid
-        if self.current_code is not None and now < self.expiry_timestamp:
-            return self.current_code
-            
-        # Generate a new code
-        new_code = self.totp.at(now)
-        self.current_code = new_code
+        cache_key = self._cache_key
+        code_cache = _code_cache_for(interval)
+        code = code_cache.get(cache_key, window)
+        if code is None:
+            code = self.totp.at(now)
+            code_cache.put(cache_key, window, code)
         
-        # Calculate the expiry time for the new code
+        self.current_code = code
         # The code expires at the beginning of the *next* interval
-        self.expiry_timestamp = current_interval_start + self.totp.interval
-        
-        # Store in global cache for batch operations
-        _code_cache[cache_key] = new_code
-        
-        # Cleanup old cache entries every 100 generations to prevent memory leaks
-        if len(_code_cache) > 1000:
-            # Keep only the most recent 100 codes
-            keys_to_keep = sorted(list(_code_cache.keys()), reverse=True)[:100]
-            new_cache = {k: _code_cache[k] for k in keys_to_keep}
-            _code_cache.clear()
-            _code_cache.update(new_cache)
-        
+        self.expiry_timestamp = (window + 1) * interval
         return self.current_code
 
     def get_time_remaining(self):
         """Calculate the time remaining until the next code refresh using NTP-synchronized time"""
-        return int(self.totp.interval - get_accurate_time() % self.totp.interval)
+        return int(self.totp.interval - self._now() % self.totp.interval)
     
     @staticmethod
     def validate_base32_secret(secret):
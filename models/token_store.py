@@ -0,0 +1,451 @@
+import base64
+import bisect
+import itertools
+import sys
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from models.totp_engine import decode_secret, params_from_dict, DEFAULT_PARAMS
+
+# Naive epoch used to store "created" timestamps as exact integer microseconds
+_EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+
+
+def _created_to_int(created):
+    """Convert an ISO timestamp into integer microseconds (or keep it as-is if not naive ISO)"""
+    if created is None:
+        created = datetime.now()
+    elif isinstance(created, str):
+        try:
+            created = datetime.fromisoformat(created)
+        except ValueError:
+            return created
+    if isinstance(created, datetime) and created.tzinfo is None:
+        return (created - _EPOCH) // _MICROSECOND
+    return created.isoformat() if isinstance(created, datetime) else created
+
+
+def _created_to_iso(created):
+    """Convert stored microseconds back into the ISO string format used in tokens.json"""
+    if isinstance(created, int):
+        return (_EPOCH + created * _MICROSECOND).isoformat()
+    return created
+
+
+class TokenRecord:
+    """A single token in a TokenStore.
+
+    Issuers are interned and the decoded secret lives in the store's shared
+    buffer, so a record holds little more than a few references.
+    """
+
+    __slots__ = ("handle", "id", "issuer", "name", "created", "icon", "params",
+                 "secret_offset", "secret_length", "sort_key",
+                 "created_version", "version")
+
+    def __init__(self, handle, token_id, issuer, name, created, icon=None, params=DEFAULT_PARAMS):
+        self.handle = handle
+        self.id = token_id
+        self.issuer = issuer
+        self.name = name
+        self.created = created
+        self.icon = icon
+        self.params = params  # Shared OtpParams (period, digits, algorithm)
+        self.secret_offset = 0
+        self.secret_length = -1  # -1 means the secret could not be decoded
+        self.sort_key = None     # Entry in the store's sorted index
+        self.created_version = 0  # Store version at which the token was added
+        self.version = 0          # Store version of the last change to the token
+
+    @property
+    def created_iso(self):
+        return _created_to_iso(self.created)
+
+
+class TokenStore:
+    """Compact in-memory vault for large token sets.
+
+    Token ids (usually uuid strings) map to small integer handles that index
+    a list of ``__slots__`` records. Decoded secret bytes for every token are
+    kept in one contiguous ``bytearray`` so keys can be handed to the TOTP
+    engine without re-decoding, and deleted ranges are reclaimed by compacting
+    the buffer once they make up more than half of it.
+
+    A sorted index of precomputed ``(issuer, name)`` casefolded keys is kept
+    up to date on every add, update and remove, so listing tokens in display
+    order is a walk over the index (reversed for descending order) instead
+    of a full sort.
+
+    Every change bumps a monotonically increasing ``version``. A change log
+    ordered by version (with tombstones for removed tokens) lets
+    ``changes_since`` return only what changed after a given version, walking
+    the log from the newest end, so the cost is proportional to the number of
+    changes rather than the vault size.
+    """
+
+    # Tombstones kept for removed tokens before the oldest ones are pruned
+    MAX_TOMBSTONES = 1024
+
+    def __init__(self):
+        self._records = []       # handle -> TokenRecord or None
+        self._free_handles = []
+        self._handles = {}       # token id -> handle (insertion ordered)
+        self._buffer = bytearray()
+        self._garbage = 0        # bytes of the buffer no longer referenced
+        self._raw_secrets = {}   # handle -> secret string that isn't valid base32
+        self._secret_refs = {}   # key (or raw secret) -> number of tokens using it
+        self._sorted = []        # sorted (issuer, name, sequence, handle) keys
+        self._sequence = itertools.count()  # Tie-breaker that keeps equal keys in insertion order
+        self.version = 0
+        self._change_log = OrderedDict()  # token id -> version of its last change (oldest first)
+        self._oldest_version = 0          # changes_since() needs a reset below this version
+        self._lock = threading.RLock()
+
+    @classmethod
+    def from_dict(cls, tokens):
+        """Build a store from a ``{token_id: token_data}`` mapping"""
+        store = cls()
+        for token_id, token_data in tokens.items():
+            store.add_from_dict(token_id, token_data, _index=False)
+        # One sort for the whole vault instead of an insertion per token
+        store._sorted = sorted(record.sort_key for record in store)
+        return store
+
+    # --- Container protocol ----------------------------------------------
+
+    def __len__(self):
+        return len(self._handles)
+
+    def __contains__(self, token_id):
+        return token_id in self._handles
+
+    def __iter__(self):
+        """Iterate over records in insertion order"""
+        records = self._records
+        return (records[handle] for handle in list(self._handles.values()))
+
+    def get(self, token_id):
+        """Return the record for a token id, or None"""
+        handle = self._handles.get(token_id)
+        return self._records[handle] if handle is not None else None
+
+    def ids(self):
+        return list(self._handles)
+
+    def sorted_records(self, ascending=True):
+        """Return records ordered by issuer then name (case-insensitive)"""
+        with self._lock:
+            records = self._records
+            keys = self._sorted if ascending else reversed(self._sorted)
+            return [records[key[3]] for key in keys]
+
+    # --- Sorted index -----------------------------------------------------
+
+    def _index_record(self, record, insert=True, sequence=None):
+        record.sort_key = (
+            record.issuer.casefold() if isinstance(record.issuer, str) else "",
+            record.name.casefold() if isinstance(record.name, str) else "",
+            next(self._sequence) if sequence is None else sequence,
+            record.handle
+        )
+        if insert:
+            bisect.insort(self._sorted, record.sort_key)
+
+    def _unindex_record(self, record):
+        position = bisect.bisect_left(self._sorted, record.sort_key)
+        if position < len(self._sorted) and self._sorted[position] == record.sort_key:
+            del self._sorted[position]
+
+    # --- Mutation ---------------------------------------------------------
+
+    def add(self, token_id, issuer, name, secret, created=None, icon=None, params=DEFAULT_PARAMS, _index=True):
+        """Add (or replace) a token and return its record"""
+        with self._lock:
+            replaced = self._remove_locked(token_id)
+
+            if self._free_handles:
+                handle = self._free_handles.pop()
+            else:
+                handle = len(self._records)
+                self._records.append(None)
+
+            record = TokenRecord(
+                handle,
+                token_id,
+                sys.intern(issuer) if isinstance(issuer, str) else issuer,
+                name,
+                _created_to_int(created),
+                icon,
+                params
+            )
+            self._set_secret(record, secret)
+            self._records[handle] = record
+            self._handles[token_id] = handle
+            self._index_record(record, insert=_index)
+            self._log_change(token_id, record)
+            record.created_version = replaced.created_version if replaced else record.version
+            return record
+
+    def add_from_dict(self, token_id, token_data, _index=True):
+        """Add a token from the dict format used in tokens.json
+
+        Raises:
+            ValueError: If the period, digits or algorithm are invalid
+        """
+        params = params_from_dict(token_data)
+        return self.add(
+            token_id,
+            token_data.get("issuer", "Unknown"),
+            token_data.get("name", "Unknown"),
+            token_data["secret"],
+            token_data.get("created"),
+            token_data.get("icon"),
+            params,
+            _index
+        )
+
+    def update(self, token_id, issuer=None, name=None):
+        """Update the display fields of a token; returns the record or None"""
+        with self._lock:
+            record = self.get(token_id)
+            if record is None:
+                return None
+            if issuer is None and name is None:
+                return record
+            self._unindex_record(record)
+            if issuer is not None:
+                record.issuer = sys.intern(issuer)
+            if name is not None:
+                record.name = name
+            self._index_record(record, sequence=record.sort_key[2])
+            self._log_change(token_id, record)
+            return record
+
+    def remove(self, token_id):
+        """Remove a token; returns the removed record or None"""
+        with self._lock:
+            record = self._remove_locked(token_id)
+            if record is not None:
+                self._log_change(token_id, None)
+            return record
+
+    def _remove_locked(self, token_id):
+        """Drop a token's record, index entry and secret without logging the change"""
+        with self._lock:
+            handle = self._handles.pop(token_id, None)
+            if handle is None:
+                return None
+            record = self._records[handle]
+            self._unindex_record(record)
+            self._release_secret(record)
+            self._records[handle] = None
+            self._free_handles.append(handle)
+            self._raw_secrets.pop(handle, None)
+            if record.secret_length > 0:
+                self._garbage += record.secret_length
+                if self._garbage > len(self._buffer) // 2:
+                    self._compact()
+            return record
+
+    def clear(self):
+        """Remove every token"""
+        with self._lock:
+            for token_id in self._handles:
+                self._log_change(token_id, None)
+            self._records = []
+            self._free_handles = []
+            self._handles = {}
+            self._buffer = bytearray()
+            self._garbage = 0
+            self._raw_secrets = {}
+            self._secret_refs = {}
+            self._sorted = []
+
+    def sync_from_dict(self, tokens):
+        """Make the store match a ``{token_id: token_data}`` mapping.
+
+        Only tokens that were added, changed or removed get a new version, so
+        reloading an unchanged vault from disk produces no changes.
+
+        Returns:
+            int: Number of tokens added, replaced or removed
+        """
+        changes = 0
+        with self._lock:
+            for token_id in [token_id for token_id in self._handles if token_id not in tokens]:
+                self.remove(token_id)
+                changes += 1
+            for token_id, token_data in tokens.items():
+                record = self.get(token_id)
+                if record is None or not self._matches(record, token_data):
+                    self.add_from_dict(token_id, token_data)
+                    changes += 1
+        return changes
+
+    def _matches(self, record, token_data):
+        """Check whether a record already holds the given tokens.json data"""
+        return (
+            record.issuer == token_data.get("issuer", "Unknown")
+            and record.name == token_data.get("name", "Unknown")
+            and self.secret(record) == token_data["secret"]
+            and ("created" not in token_data or record.created == _created_to_int(token_data["created"]))
+            and record.icon == token_data.get("icon")
+            and record.params == params_from_dict(token_data)
+        )
+
+    # --- Versioning -------------------------------------------------------
+
+    def _log_change(self, token_id, record):
+        """Record a change (``record`` is None for a removal) under a new version"""
+        self.version += 1
+        if record is not None:
+            record.version = self.version
+        self._change_log[token_id] = self.version
+        self._change_log.move_to_end(token_id)
+
+        # Prune the oldest tombstones; clients older than them must reload
+        tombstones = len(self._change_log) - len(self._handles)
+        if tombstones > self.MAX_TOMBSTONES:
+            for old_id, old_version in list(self._change_log.items()):
+                if tombstones <= self.MAX_TOMBSTONES:
+                    break
+                if old_id not in self._handles:
+                    del self._change_log[old_id]
+                    self._oldest_version = max(self._oldest_version, old_version)
+                    tombstones -= 1
+
+    def changes_since(self, since_version):
+        """Return what changed after ``since_version``.
+
+        Returns:
+            tuple: ``(version, reset, added, changed, removed)``. When ``reset``
+            is True the caller's version is unknown or too old and it should
+            reload everything; otherwise ``added``/``changed`` are records and
+            ``removed`` is a list of token ids.
+        """
+        with self._lock:
+            version = self.version
+            if since_version is None or since_version < self._oldest_version or since_version > version:
+                return version, True, [], [], []
+
+            added, changed, removed = [], [], []
+            for token_id in reversed(self._change_log):
+                if self._change_log[token_id] <= since_version:
+                    break
+                record = self.get(token_id)
+                if record is None:
+                    removed.append(token_id)
+                elif record.created_version > since_version:
+                    added.append(record)
+                else:
+                    changed.append(record)
+            return version, False, added, changed, removed
+
+    # --- Secrets ----------------------------------------------------------
+
+    def _set_secret(self, record, secret):
+        try:
+            key = decode_secret(secret)
+        except Exception:
+            self._raw_secrets[record.handle] = secret
+            record.secret_length = -1
+            self._secret_refs[secret] = self._secret_refs.get(secret, 0) + 1
+            return
+        record.secret_offset = len(self._buffer)
+        record.secret_length = len(key)
+        self._buffer += key
+        self._secret_refs[key] = self._secret_refs.get(key, 0) + 1
+        # Keep secrets that don't round-trip (lowercase, spaces, padding) verbatim
+        if base64.b32encode(key).decode("ascii").rstrip("=") != secret:
+            self._raw_secrets[record.handle] = secret
+
+    def _release_secret(self, record):
+        """Drop a removed record's reference to its secret (before its raw secret is discarded)"""
+        key = self.key_or_secret(record)
+        refs = self._secret_refs.get(key, 0) - 1
+        if refs > 0:
+            self._secret_refs[key] = refs
+        else:
+            self._secret_refs.pop(key, None)
+
+    def _compact(self):
+        """Rewrite the secret buffer without the ranges of deleted tokens"""
+        buffer = self._buffer
+        new_buffer = bytearray()
+        for handle in self._handles.values():
+            record = self._records[handle]
+            if record.secret_length > 0:
+                start = record.secret_offset
+                record.secret_offset = len(new_buffer)
+                new_buffer += buffer[start:start + record.secret_length]
+        self._buffer = new_buffer
+        self._garbage = 0
+
+    def key(self, record):
+        """Return the decoded key bytes for a record, or None if the secret is invalid"""
+        if record.secret_length < 0:
+            return None
+        start = record.secret_offset
+        return bytes(self._buffer[start:start + record.secret_length])
+
+    def secret(self, record):
+        """Return the base32 secret string for a record"""
+        raw = self._raw_secrets.get(record.handle)
+        if raw is not None:
+            return raw
+        return base64.b32encode(self.key(record)).decode("ascii").rstrip("=")
+
+    def key_or_secret(self, record):
+        """Return decoded key bytes, or the raw secret string when it can't be decoded"""
+        key = self.key(record)
+        return key if key is not None else self._raw_secrets.get(record.handle, "")
+
+    def shares_secret(self, record):
+        """Check whether any other token in the store uses the same secret"""
+        return self._secret_refs.get(self.key_or_secret(record), 0) > 1
+
+    # --- Serialization ----------------------------------------------------
+
+    def record_to_dict(self, record):
+        """Convert a record back into the tokens.json dict format"""
+        data = {
+            "issuer": record.issuer,
+            "name": record.name,
+            "secret": self.secret(record),
+            "created": record.created_iso
+        }
+        if record.icon is not None:
+            data["icon"] = record.icon
+        # Only non-default parameters are written so existing vaults stay unchanged
+        params = record.params
+        if not params.is_default:
+            data["period"] = params.period
+            data["digits"] = params.digits
+            data["algorithm"] = params.algorithm
+        return data
+
+    def code_table_items(self):
+        """Return ``(token_id, key_or_secret, params)`` tuples for loading a CodeTable"""
+        with self._lock:
+            return [(record.id, self.key_or_secret(record), record.params) for record in self]
+
+    def iter_dicts(self):
+        """Yield ``(token_id, token_data)`` pairs one token at a time
+
+        Only one token is converted at a time, so a streaming export of a large
+        vault never holds a second copy of it. Tokens removed or replaced while
+        the iteration is in progress are skipped.
+        """
+        for handle in list(self._handles.values()):
+            with self._lock:
+                record = self._records[handle]
+                if record is None or self.get(record.id) is not record:
+                    continue
+                data = self.record_to_dict(record)
+            yield record.id, data
+
+    def to_dict(self):
+        """Return the whole store in the ``{token_id: token_data}`` format"""
+        with self._lock:
+            return {record.id: self.record_to_dict(record) for record in self}
@@ -0,0 +1,179 @@
+import base64
+import hmac
+import struct
+import threading
+from collections import namedtuple
+
+# Pre-packed struct for the 8-byte big-endian counter HOTP expects
+_COUNTER_STRUCT = struct.Struct(">Q")
+
+DEFAULT_PERIOD = 30
+DEFAULT_DIGITS = 6
+DEFAULT_ALGORITHM = "SHA1"
+
+# otpauth algorithm names -> hashlib digest names
+ALGORITHMS = {
+    "SHA1": "sha1",
+    "SHA256": "sha256",
+    "SHA512": "sha512",
+}
+
+
+class OtpParams(namedtuple("OtpParams", ("period", "digits", "algorithm"))):
+    """TOTP parameters shared by every token of the same class."""
+
+    __slots__ = ()
+
+    @property
+    def digest(self):
+        return ALGORITHMS[self.algorithm]
+
+    @property
+    def is_default(self):
+        return self == DEFAULT_PARAMS
+
+
+DEFAULT_PARAMS = OtpParams(DEFAULT_PERIOD, DEFAULT_DIGITS, DEFAULT_ALGORITHM)
+
+# Interned parameter tuples so records of the same class share one object
+_params_cache = {DEFAULT_PARAMS: DEFAULT_PARAMS}
+
+
+def normalize_params(period=None, digits=None, algorithm=None):
+    """Validate otpauth period/digits/algorithm values and return an OtpParams.
+
+    Missing values fall back to the otpauth defaults (30 seconds, 6 digits,
+    SHA1). Strings such as ``"60"`` or ``"sha256"`` are accepted.
+
+    Raises:
+        ValueError: If a value is out of range or the algorithm is unsupported
+    """
+    try:
+        period = DEFAULT_PERIOD if period in (None, "") else int(period)
+        digits = DEFAULT_DIGITS if digits in (None, "") else int(digits)
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid period or digits: {period!r}, {digits!r}")
+    algorithm = DEFAULT_ALGORITHM if not algorithm else str(algorithm).upper().replace("-", "")
+
+    if period <= 0:
+        raise ValueError(f"Invalid period: {period}")
+    if not 6 <= digits <= 10:
+        raise ValueError(f"Invalid digits: {digits}")
+    if algorithm not in ALGORITHMS:
+        raise ValueError(f"Unsupported algorithm: {algorithm}")
+
+    params = OtpParams(period, digits, algorithm)
+    return _params_cache.setdefault(params, params)
+
+
+def params_from_dict(data):
+    """Return the OtpParams stored in a token dict (tokens.json or importer format)."""
+    return normalize_params(data.get("period"), data.get("digits"), data.get("algorithm"))
+
+
+def params_from_query(query):
+    """Return the OtpParams from ``urllib.parse.parse_qs`` output of an otpauth URI."""
+    def first(name):
+        values = query.get(name)
+        return values[0] if values else None
+    return normalize_params(first("period"), first("digits"), first("algorithm"))
+
+
+def decode_secret(secret):
+    """Decode a base32 TOTP secret into raw key bytes (same rules as pyotp)."""
+    secret = secret.replace(" ", "")
+    missing_padding = len(secret) % 8
+    if missing_padding:
+        secret += "=" * (8 - missing_padding)
+    return base64.b32decode(secret, casefold=True)
+
+
+class TotpBatchEngine:
+    """Generate TOTP codes for many secrets at a single timestep.
+
+    Each secret is base32-decoded only once and its raw key bytes are kept so
+    every code afterwards is a single one-shot ``hmac.digest`` call, instead of
+    ``pyotp.TOTP.at`` decoding the secret and rebuilding an HMAC per call.
+    """
+
+    def __init__(self, interval=DEFAULT_PERIOD, digits=DEFAULT_DIGITS, digest="sha1"):
+        self.interval = interval
+        self.digits = digits
+        self.digest = digest
+        self._modulo = 10 ** digits
+        self._keys = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def for_params(cls, params):
+        """Create an engine for one parameter class."""
+        return cls(params.period, params.digits, params.digest)
+
+    def key_for(self, secret):
+        """Return the decoded key bytes for a secret, decoding it on first use."""
+        key = self._keys.get(secret)
+        if key is None:
+            key = decode_secret(secret)
+            with self._lock:
+                self._keys[secret] = key
+        return key
+
+    def forget(self, secret):
+        """Drop the cached key for a secret (e.g. after the token is deleted)."""
+        with self._lock:
+            self._keys.pop(secret, None)
+
+    def clear(self):
+        """Drop all cached keys."""
+        with self._lock:
+            self._keys.clear()
+
+    def counter_at(self, for_time):
+        """Return the TOTP counter (window number) for a unix timestamp."""
+        return int(for_time) // self.interval
+
+    def code_for_key(self, key, counter):
+        """Compute a single code from raw key bytes and a counter."""
+        mac = hmac.digest(key, _COUNTER_STRUCT.pack(counter), self.digest)
+        offset = mac[-1] & 0x0F
+        binary = ((mac[offset] & 0x7F) << 24
+                  | mac[offset + 1] << 16
+                  | mac[offset + 2] << 8
+                  | mac[offset + 3])
+        return str(binary % self._modulo).zfill(self.digits)
+
+    def codes_for_keys(self, keys, counter):
+        """Compute codes for a list of raw keys at one counter in a tight loop."""
+        message = _COUNTER_STRUCT.pack(counter)
+        digest = self.digest
+        modulo = self._modulo
+        digits = self.digits
+        hmac_digest = hmac.digest
+        codes = []
+        append = codes.append
+        for key in keys:
+            mac = hmac_digest(key, message, digest)
+            offset = mac[-1] & 0x0F
+            binary = ((mac[offset] & 0x7F) << 24
+                      | mac[offset + 1] << 16
+                      | mac[offset + 2] << 8
+                      | mac[offset + 3])
+            append(str(binary % modulo).zfill(digits))
+        return codes
+
+    def code_at(self, secret, for_time):
+        """Compute the code for one secret at a unix timestamp."""
+        return self.code_for_key(self.key_for(secret), self.counter_at(for_time))
+
+    def codes_at(self, secrets, for_time):
+        """Compute codes for a list of secrets at a unix timestamp.
+
+        Args:
+            secrets (list): Base32 secrets
+            for_time (float): Unix timestamp (NTP-corrected)
+
+        Returns:
+            list: Codes in the same order as ``secrets``
+        """
+        key_for = self.key_for
+        return self.codes_for_keys([key_for(s) for s in secrets], self.counter_at(for_time))
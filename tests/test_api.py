@@ -5,7 +5,7 @@ import os
 import tempfile
 import shutil
 import time
-from main import Api, set_tokens_path
+from main import Api
 
 class TestApi(unittest.TestCase):
     """Test cases for the API class"""
@@ -34,20 +34,17 @@ class TestApi(unittest.TestCase):
         with open(self.test_tokens_path, 'w') as f:
             json.dump(self.sample_tokens, f)
             
-        # Set the tokens path for the API
-        set_tokens_path(self.test_tokens_path)
-        
-        # Create API instance
-        self.api = Api()
+        # Create API instance working on the test vault
+        self.api = Api(tokens_file=self.test_tokens_path)
         
     def tearDown(self):
         """Tear down test fixtures"""
+        # Write pending saves and stop background threads before the vault goes away
+        self.api.close()
+        
         # Remove the temporary directory and its contents
         shutil.rmtree(self.test_dir)
         
-        # Reset the tokens path
-        set_tokens_path("tokens.json")
-        
     def test_load_tokens(self):
         """Test loading tokens from file"""
         # Force reload tokens
@@ -306,6 +303,158 @@ class TestApi(unittest.TestCase):
         self.assertEqual(result["status"], "error")
         self.assertTrue("Failed to import tokens" in result["message"])
     
+    def test_pending_save_bound_to_its_vault(self):
+        """Test that a debounced save goes to the vault it was scheduled for and close writes it"""
+        self.api.load_tokens()
+        self.assertEqual(self.api.update_token("token1", {"issuer": "Renamed", "name": "Test Account"})["status"], "success")
+        self.assertTrue(self.api._token_writer.dirty)
+
+        # The vault this instance works on changes before the save runs
+        other_path = os.path.join(self.test_dir, "other_tokens.json")
+        self.api.tokens_path = other_path
+        self.assertEqual(self.api.close()["status"], "success")
+        self.assertFalse(os.path.exists(other_path))
+        with open(self.test_tokens_path) as f:
+            self.assertEqual(json.load(f)["token1"]["issuer"], "Renamed")
+
+        # Closed: no background thread keeps running
+        self.assertFalse(self.api._token_writer.dirty)
+        self.assertTrue(self.api._code_table._stop_event.is_set())
+        self.assertIsNone(self.api._file_watcher._thread)
+
+    def test_sqlite_format_round_trip(self):
+        """Test that the SQLite vault leaves tokens.json alone until the vault moves back to JSON"""
+        self.api._settings["vault_format"] = "sqlite"
+        self.api.load_tokens()
+        self.assertEqual(self.api.update_token("token1", {"issuer": "Renamed", "name": "Test Account"})["status"], "success")
+        self.api.flush_tokens()
+        with open(self.test_tokens_path) as f:
+            self.assertEqual(json.load(f)["token1"]["issuer"], "Test Issuer")
+
+        self.api._settings["vault_format"] = "json"
+        self.assertEqual(self.api.load_tokens()["status"], "success")
+        self.assertEqual(self.api.tokens.get("token1").issuer, "Renamed")
+
+    def test_token_entries_carry_sort_key(self):
+        """Test that token entries carry the sort key the list is ordered by"""
+        self.api.tokens.clear()
+        for token_id, issuer in (("t1", "Zulu"), ("t2", "Ärger"), ("t3", "apple"), ("t4", "a-b")):
+            self.api.tokens.add_from_dict(token_id, {"issuer": issuer, "name": "n", "secret": "JBSWY3DPEHPK3PXP"})
+        self.api._tokens_loaded = True
+        entries = self.api.get_tokens()
+        self.assertEqual([entry["id"] for entry in entries], ["t4", "t3", "t1", "t2"])
+        keys = [entry["sortKey"] for entry in entries]
+        self.assertEqual(keys, sorted(keys))
+        self.assertEqual(json.loads(json.dumps(keys))[3][:2], ["ärger", "n"])
+
+    def test_code_snapshot_window_ends(self):
+        """Test that the snapshot's window end follows the periods of the tokens"""
+        self.api.tokens.clear()
+        self.api.tokens.add_from_dict("slow", {"issuer": "A", "name": "a", "secret": "JBSWY3DPEHPK3PXP", "period": 60})
+        payload = self.api._code_snapshot_payload((130.0, {"slow": ("111111", "222222")}, {}, {60: 180}))
+        self.assertEqual(payload["windowEnd"], 180)
+        self.assertNotIn("periods", payload)
+
+        self.api.tokens.add_from_dict("fast", {"issuer": "B", "name": "b", "secret": "JBSWY3DPEHPK3PXP"})
+        codes = {"slow": ("111111", "222222"), "fast": ("333333", "444444")}
+        payload = self.api._code_snapshot_payload((130.0, codes, {}, {60: 180, 30: 150}))
+        self.assertEqual(payload["windowEnd"], 150)
+        self.assertEqual(payload["periods"], [60, 30])
+        self.assertEqual(payload["windowEnds"], {"60": 180, "30": 150})
+    
+    def test_google_auth_md5_entries_reported(self):
+        """Test that MD5 entries of a Google Authenticator export are skipped and reported"""
+        from types import SimpleNamespace
+        from main import google_auth_otp_params, google_auth_import_result
+        self.assertIsNone(google_auth_otp_params(SimpleNamespace(algorithm=4, digits=1)))
+        self.assertEqual(google_auth_otp_params(SimpleNamespace(algorithm=2, digits=2))["algorithm"], "SHA256")
+
+        result = google_auth_import_result(2, 1)
+        self.assertEqual((result["status"], result["tokens_count"], result["unsupported_count"]), ("success", 2, 1))
+        self.assertIn("MD5", result["message"])
+        result = google_auth_import_result(0, 3)
+        self.assertEqual(result["status"], "error")
+        self.assertIn("MD5", result["message"])
+
+    def test_import_encrypted_export(self):
+        """Test that encrypted exports and backups are decrypted and imported"""
+        import base64
+        from utils.exporters.stream_exporter import write_export, write_backup_file
+        exported = {"e1": {"issuer": "Exported", "name": "e@example.com", "secret": "HXDMVJECJJWSRB3HWIZR4IFUGFTMXBOZ"}}
+        export_path = os.path.join(self.test_dir, "export.2fas.enc")
+        write_export(iter(exported.items()), 1, export_path, "2fas", password="export password")
+        backup_path = write_backup_file(iter(exported.items()), 1, "backup password")
+        self.addCleanup(os.remove, backup_path)
+
+        def data_url(path):
+            with open(path, "rb") as f:
+                return "data:application/octet-stream;base64," + base64.b64encode(f.read()).decode()
+
+        self.api.load_tokens()
+        count = len(self.api.tokens)
+        self.assertEqual(self.api.import_encrypted_export(data_url(export_path), "wrong password")["status"], "error")
+        self.assertEqual(self.api.import_encrypted_export(data_url(export_path), "")["status"], "error")
+        self.assertEqual(len(self.api.tokens), count)
+
+        self.assertEqual(self.api.import_encrypted_export(data_url(export_path), "export password")["status"], "success")
+        self.assertEqual(self.api.import_encrypted_export(data_url(backup_path), "backup password")["status"], "success")
+        issuers = [record.issuer for record in self.api.tokens]
+        self.assertEqual(issuers.count("Exported"), 2)
+
+    def wait_for_unlock(self, timeout=10.0):
+        """Wait for the background unlock job and return its result"""
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            status = self.api.get_unlock_status()
+            if status["state"] == "done":
+                return status["result"]
+            time.sleep(0.01)
+        self.fail("Unlock did not finish")
+    
+    @patch('main.AUTH_CONFIG_PATH')
+    def test_start_unlock(self, _):
+        """Test the background unlock job: wrong credential, success, and cancellation"""
+        import main
+        from utils import auth
+        from utils import crypto
+        from utils.crypto import vault_session
+        previous_auth_path = auth._current_auth_path
+        main.AUTH_CONFIG_PATH = os.path.join(self.test_dir, "auth_config.json")
+        auth.set_auth_path(main.AUTH_CONFIG_PATH)
+        self.addCleanup(auth.set_auth_path, previous_auth_path)
+        self.addCleanup(vault_session.lock)
+        self.addCleanup(crypto.set_kdf_target, crypto.DEFAULT_KDF_PARAMS)
+        
+        def lock():
+            vault_session.lock()
+            self.api._abort_unlock()
+        
+        self.assertEqual(self.api.set_pin_protection("1234")["status"], "success")
+        lock()
+        
+        self.assertEqual(self.api.start_unlock("0000")["status"], "success")
+        self.assertEqual(self.wait_for_unlock()["status"], "error")
+        self.assertFalse(self.api.is_authenticated)
+        
+        self.api._window = MagicMock()
+        self.assertEqual(self.api.start_unlock("1234")["status"], "success")
+        self.assertEqual(self.wait_for_unlock()["status"], "success")
+        self.assertTrue(self.api.is_authenticated)
+        self.assertEqual(len(self.api.tokens), 2)
+        scripts = [call.args[0] for call in self.api._window.evaluate_js.call_args_list]
+        self.assertIn('updateUnlockProgress("decrypting", 60)', scripts)
+        self.assertTrue(scripts[-1].startswith("onUnlockComplete("))
+        
+        # A cancelled unlock leaves the app locked with no tokens in memory
+        lock()
+        self.api.start_unlock("1234")
+        self.assertEqual(self.api.cancel_unlock()["status"], "success")
+        self.assertEqual(self.wait_for_unlock()["status"], "cancelled")
+        self.assertFalse(self.api.is_authenticated)
+        self.assertEqual(len(self.api.tokens), 0)
+        self.assertEqual(self.api.load_tokens()["status"], "error")
+        self.assertEqual(self.api.cancel_unlock()["status"], "warning")
+    
     @unittest.skip("This test requires more complex mocking of pyotp module")
     @patch('main.pyotp')
     def test_add_token_from_uri(self, mock_pyotp):
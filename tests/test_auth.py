@@ -0,0 +1,200 @@
+import unittest
+import os
+import base64
+import io
+import time
+import contextlib
+import shutil
+import tempfile
+from unittest import mock
+from argon2 import PasswordHasher
+from utils import auth, crypto
+from utils.auth import (
+    set_pin, set_password, verify_pin, verify_password, is_legacy_hash, set_auth_path, needs_rehash,
+    calibrate_kdf_params, is_kdf_calibrated, is_auth_enabled, get_auth_type, get_timeout, check_timeout,
+    set_timeout, auth_state
+)
+from utils.crypto import vault_session, encrypt_data, read_vault_header, decrypt_tokens_file, encrypt_tokens_file
+from utils.file_io import read_json, write_json, clear_cache
+from utils.vault_storage import JsonVaultStorage
+from utils.sqlite_vault import SqliteVault
+from utils.file_watch import FileWatcher
+
+class TestAuth(unittest.TestCase):
+    """Test cases for credential verification and the vault key derived with it"""
+
+    def setUp(self):
+        """Set up test fixtures"""
+        self.test_dir = tempfile.mkdtemp()
+        self.auth_path = os.path.join(self.test_dir, "auth_config.json")
+        self.tokens_path = os.path.join(self.test_dir, "tokens.json")
+        self.tokens = {"token1": {"issuer": "Test Issuer", "name": "Test Account", "secret": "JBSWY3DPEHPK3PXP"}}
+        self.previous_auth_path = auth._current_auth_path
+        auth_state.attach(None)
+        set_auth_path(self.auth_path)
+        vault_session.lock()
+        clear_cache()
+
+    def tearDown(self):
+        """Tear down test fixtures"""
+        shutil.rmtree(self.test_dir)
+        set_auth_path(self.previous_auth_path)
+        crypto.set_kdf_target(crypto.DEFAULT_KDF_PARAMS)
+        vault_session.lock()
+        clear_cache()
+
+    @contextlib.contextmanager
+    def count_derivations(self):
+        """Count key derivations made by the auth and crypto modules"""
+        derive = mock.Mock(wraps=crypto.derive_credential_keys)
+        with mock.patch.object(crypto, "derive_credential_keys", derive), \
+                mock.patch.object(auth, "derive_credential_keys", derive):
+            yield derive
+
+    def test_unlock_derives_once(self):
+        """Test that verifying the PIN yields the key the vault is encrypted with"""
+        write_json(self.tokens_path, self.tokens)
+        self.assertTrue(set_pin("1234"))
+        self.assertTrue(encrypt_tokens_file(self.tokens_path, "1234"))
+        config = read_json(self.auth_path)
+        self.assertFalse(is_legacy_hash(config["pin_hash"]))
+
+        # The credential hash and the vault share the salt, so one run serves both
+        salt = read_vault_header(self.tokens_path)["salt"]
+        self.assertIn(f"${salt}$", config["pin_hash"])
+
+        vault_session.lock()
+        with self.count_derivations() as derive:
+            self.assertTrue(verify_pin("1234"))
+            self.assertEqual(JsonVaultStorage(self.tokens_path, "1234").load(), self.tokens)
+            self.assertEqual(derive.call_count, 1)
+
+    def test_wrong_credential(self):
+        """Test that a wrong PIN is rejected and leaves the vault locked"""
+        self.assertTrue(set_pin("1234"))
+        vault_session.lock()
+        self.assertFalse(verify_pin("4321"))
+        self.assertFalse(vault_session.unlocked)
+
+    def test_verifier_is_not_the_vault_key(self):
+        """Test that the stored verifier and the vault key are different HKDF outputs"""
+        salt = os.urandom(16)
+        verifier, key = crypto.derive_credential_keys("password", salt)
+        self.assertNotEqual(verifier, base64.urlsafe_b64decode(key))
+        self.assertEqual(crypto.derive_credential_keys("password", salt), (verifier, key))
+
+    def test_legacy_hash_and_vault_upgrade(self):
+        """Test that an Argon2 hash and a PBKDF2 vault from earlier versions are upgraded on unlock"""
+        write_json(self.auth_path, {"auth_type": "password", "password_hash": PasswordHasher().hash("secret password")})
+        encrypted_data, salt = encrypt_data(self.tokens, "secret password")
+        write_json(self.tokens_path, {
+            "encrypted": True,
+            "data": base64.b64encode(encrypted_data).decode(),
+            "salt": base64.b64encode(salt).decode()
+        })
+        vault_session.lock()
+
+        self.assertFalse(verify_password("wrong"))
+        self.assertTrue(verify_password("secret password"))
+        password_hash = read_json(self.auth_path)["password_hash"]
+        self.assertFalse(is_legacy_hash(password_hash))
+        self.assertEqual(JsonVaultStorage(self.tokens_path, "secret password").load(), self.tokens)
+        self.assertIn(f"${read_vault_header(self.tokens_path)['salt']}$", password_hash)
+
+        vault_session.lock()
+        with self.count_derivations() as derive:
+            self.assertTrue(verify_password("secret password"))
+            self.assertEqual(decrypt_tokens_file(self.tokens_path, "secret password"), self.tokens)
+            self.assertEqual(derive.call_count, 1)
+
+    def test_sqlite_vault_uses_session_key(self):
+        """Test that the SQLite vault is keyed by the credential without another derivation"""
+        self.assertTrue(set_password("secret password"))
+        db_path = os.path.join(self.test_dir, "tokens.db")
+        vault = SqliteVault(db_path, self.tokens_path, "secret password")
+        vault.save_all(self.tokens)
+        vault.close()
+
+        vault_session.lock()
+        with self.count_derivations() as derive:
+            self.assertTrue(verify_password("secret password"))
+            vault = SqliteVault(db_path, self.tokens_path, "secret password")
+            try:
+                self.assertEqual(vault.load(), self.tokens)
+            finally:
+                vault.close()
+            self.assertEqual(derive.call_count, 1)
+
+    def test_rehash_when_calibrated(self):
+        """Test that calibrated parameters are stored and applied to the hash and vault at the next unlock"""
+        write_json(self.tokens_path, self.tokens)
+        self.assertTrue(set_pin("1234"))
+        self.assertTrue(encrypt_tokens_file(self.tokens_path, "1234"))
+        self.assertFalse(is_kdf_calibrated())
+
+        floor = crypto.kdf_params(crypto.KDF_FLOOR_PARAMS)
+        with mock.patch.object(auth, "calibrate_kdf", return_value=floor):
+            self.assertEqual(calibrate_kdf_params(), floor)
+        self.assertTrue(is_kdf_calibrated())
+        self.assertEqual(read_json(self.auth_path)["kdf_params"], floor)
+
+        vault_session.lock()
+        self.assertTrue(verify_pin("1234"))
+        pin_hash = read_json(self.auth_path)["pin_hash"]
+        self.assertFalse(needs_rehash(pin_hash))
+        self.assertIn(f"m={floor['memory_cost']},t={floor['time_cost']}", pin_hash)
+        self.assertEqual(JsonVaultStorage(self.tokens_path, "1234").load(), self.tokens)
+        header = read_vault_header(self.tokens_path)
+        self.assertEqual(header["memory_cost"], floor["memory_cost"])
+        self.assertIn(f"${header['salt']}$", pin_hash)
+
+        # Rehashed once: the next unlock derives a single key again
+        vault_session.lock()
+        with self.count_derivations() as derive:
+            self.assertTrue(verify_pin("1234"))
+            self.assertEqual(JsonVaultStorage(self.tokens_path, "1234").load(), self.tokens)
+            self.assertEqual(derive.call_count, 1)
+
+    def test_auth_state_from_memory(self):
+        """Test that status checks with a watcher attached read no file and print nothing"""
+        self.assertTrue(set_pin("1234"))
+        self.assertTrue(set_timeout(5))
+        watcher = FileWatcher(interval=0.05)
+        self.addCleanup(watcher.stop)
+        self.addCleanup(auth_state.attach, None)
+        auth_state.attach(watcher)
+        get_auth_type()
+
+        output = io.StringIO()
+        with mock.patch.object(auth, "read_json", wraps=auth.read_json) as read, \
+                mock.patch.object(auth, "file_signature", wraps=auth.file_signature) as stat, \
+                contextlib.redirect_stdout(output):
+            for _ in range(100):
+                self.assertTrue(is_auth_enabled())
+                self.assertEqual(get_auth_type(), "pin")
+                self.assertEqual(get_timeout(), 5)
+                self.assertFalse(check_timeout(time.time()))
+            self.assertEqual((read.call_count, stat.call_count), (0, 0))
+        self.assertEqual(output.getvalue(), "")
+
+        # An edit by another process is picked up once the watcher reports it
+        write_json(self.auth_path, {"timeout_minutes": 0})
+        deadline = time.time() + 2
+        while is_auth_enabled() and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertFalse(is_auth_enabled())
+
+    def test_auth_state_without_watcher(self):
+        """Test that setters update the state and outside edits are seen without a watcher"""
+        self.assertEqual(get_auth_type(), None)
+        self.assertTrue(set_password("secret password"))
+        with mock.patch.object(auth, "read_json", wraps=auth.read_json) as read:
+            self.assertEqual(get_auth_type(), "password")
+            self.assertEqual(read.call_count, 0)
+
+        write_json(self.auth_path, {"auth_type": "pin"})
+        self.assertEqual(get_auth_type(), "pin")
+        self.assertFalse(is_auth_enabled())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,54 @@
+import unittest
+import threading
+import time
+from utils.clock import SystemClock, SimulatedClock
+
+class TestClock(unittest.TestCase):
+    """Test cases for the clock implementations"""
+
+    def test_system_clock(self):
+        """Test that the system clock follows time.time"""
+        self.assertAlmostEqual(SystemClock().time(), time.time(), delta=1.0)
+
+    def test_manual_clock(self):
+        """Test that a simulated clock with speed 0 only moves when advanced"""
+        clock = SimulatedClock(start=1000.0)
+        self.assertEqual(clock.time(), 1000.0)
+
+        clock.advance(29.5)
+        self.assertEqual(clock.time(), 1029.5)
+
+        clock.set_time(5000.0)
+        self.assertEqual(clock.time(), 5000.0)
+
+    def test_accelerated_clock(self):
+        """Test that an accelerated clock runs faster than real time"""
+        clock = SimulatedClock(start=0.0, speed=1000)
+        time.sleep(0.05)
+        self.assertGreater(clock.time(), 30.0)
+
+        clock.set_speed(0)
+        frozen = clock.time()
+        time.sleep(0.02)
+        self.assertEqual(clock.time(), frozen)
+
+    def test_wait_uses_simulated_seconds(self):
+        """Test that waits end when the simulated deadline passes"""
+        clock = SimulatedClock(start=0.0, speed=3000)
+        started = time.monotonic()
+        self.assertFalse(clock.wait(threading.Event(), 30.0))
+        self.assertLess(time.monotonic() - started, 1.0)
+
+    def test_wait_wakes_on_advance_and_event(self):
+        """Test that a manual clock wait ends on advance or when the event is set"""
+        clock = SimulatedClock(start=0.0)
+        event = threading.Event()
+
+        threading.Timer(0.05, clock.advance, args=(60.0,)).start()
+        self.assertFalse(clock.wait(event, 30.0))
+
+        threading.Timer(0.05, event.set).start()
+        self.assertTrue(clock.wait(event, 30.0))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,190 @@
+import unittest
+from unittest.mock import patch
+import hashlib
+import time
+import pyotp
+from models.code_table import CodeTable
+from models.totp_engine import TotpBatchEngine, normalize_params
+from utils.clock import SimulatedClock
+
+class TestCodeTable(unittest.TestCase):
+    """Test cases for the precomputed per-window code table"""
+
+    def setUp(self):
+        """Set up test fixtures"""
+        self.clock = SimulatedClock(start=1_700_000_010.0)
+        self.tokens = {
+            "token1": {"issuer": "Test Issuer", "name": "Test Account", "secret": "JBSWY3DPEHPK3PXP"},
+            "token2": {"issuer": "Another Issuer", "name": "Another Account", "secret": "HXDMVJECJJWSRB3HWIZR4IFUGFTMXBOZ"}
+        }
+        self.table = CodeTable(self.clock)
+        self.table.load((token_id, data["secret"]) for token_id, data in self.tokens.items())
+
+    def expected(self, token_id, timestamp):
+        return pyotp.TOTP(self.tokens[token_id]["secret"]).at(timestamp)
+
+    def test_lookup_current_and_next(self):
+        """Test that lookups return the current and next window codes"""
+        code, next_code, remaining = self.table.lookup("token1")
+
+        self.assertEqual(code, self.expected("token1", self.clock.time()))
+        self.assertEqual(next_code, self.expected("token1", self.clock.time() + 30))
+        self.assertEqual(remaining, 30 - int(self.clock.time() % 30))
+
+    def test_prepared_window_serves_old_window(self):
+        """Test that preparing the next window early keeps the current codes valid"""
+        counter = int(self.clock.time()) // 30
+        self.table.lookup("token1")
+        self.table.advance_to(counter + 1)
+
+        code, next_code, _ = self.table.lookup("token1")
+        self.assertEqual(code, self.expected("token1", self.clock.time()))
+        self.assertEqual(next_code, self.expected("token1", self.clock.time() + 30))
+
+        self.clock.advance(30)
+        code, next_code, _ = self.table.lookup("token1")
+        self.assertEqual(code, self.expected("token1", self.clock.time()))
+        self.assertEqual(next_code, self.expected("token1", self.clock.time() + 30))
+
+    def test_advance_computes_one_window_per_token(self):
+        """Test that a one-window advance only computes the new next column"""
+        counter = int(self.clock.time()) // 30
+        self.table.advance_to(counter)
+
+        with patch.object(TotpBatchEngine, 'codes_for_keys', autospec=True,
+                          side_effect=TotpBatchEngine.codes_for_keys) as spy:
+            self.table.advance_to(counter + 1)
+            spy.assert_called_once()
+
+    def test_stale_table_rebuilds_on_lookup(self):
+        """Test that a lookup far from the prepared window still returns correct codes"""
+        self.table.lookup("token1")
+        self.clock.advance(3600)
+
+        codes, errors = self.table.lookup_all()
+        self.assertEqual(codes["token2"][0], self.expected("token2", self.clock.time()))
+        self.assertEqual(errors, {})
+
+    def test_set_and_remove_token(self):
+        """Test adding and removing tokens after the table was built"""
+        self.table.lookup_all()
+        self.tokens["token3"] = {"secret": "ABCDEFGHIJKLMNOPQRSTUVWXYZ234567"}
+        self.table.set_token("token3", self.tokens["token3"]["secret"])
+        self.assertEqual(self.table.lookup("token3")[0], self.expected("token3", self.clock.time()))
+
+        self.table.remove_token("token1")
+        with self.assertRaises(KeyError):
+            self.table.lookup("token1")
+        self.assertEqual(self.table.lookup("token3")[0], self.expected("token3", self.clock.time()))
+        self.assertEqual(self.table.lookup("token2")[0], self.expected("token2", self.clock.time()))
+
+    def test_invalid_secret_reported(self):
+        """Test that tokens with invalid secrets are reported as errors"""
+        self.table.set_token("broken", "NOT-BASE32!")
+
+        with self.assertRaises(ValueError):
+            self.table.lookup("broken")
+        codes, errors = self.table.lookup_all()
+        self.assertIn("broken", errors)
+        self.assertNotIn("broken", codes)
+
+    def test_parameter_classes(self):
+        """Test that tokens with other periods, digits and algorithms get their own codes"""
+        secret = self.tokens["token2"]["secret"]
+        params = normalize_params(60, 8, "SHA256")
+        self.table.set_token("token60", secret, params)
+
+        code, next_code, remaining = self.table.lookup("token60")
+        totp = pyotp.TOTP(secret, digits=8, digest=hashlib.sha256, interval=60)
+        self.assertEqual(code, totp.at(self.clock.time()))
+        self.assertEqual(next_code, totp.at(self.clock.time() + 60))
+        self.assertEqual(remaining, 60 - int(self.clock.time() % 60))
+
+        codes, _ = self.table.lookup_all()
+        self.assertEqual(codes["token60"][2], 60 - int(self.clock.time() % 60))
+        self.assertEqual(codes["token1"][2], 30 - int(self.clock.time() % 30))
+
+    def test_groups_refresh_on_their_own_schedule(self):
+        """Test that the refresh schedule only advances groups whose boundary is due"""
+        params = normalize_params(60)
+        self.table.set_token("token60", self.tokens["token1"]["secret"], params)
+        self.clock.set_time(1_700_000_050.0)  # 30s boundary at ...070, 60s boundary at ...100
+        self.table.lookup_all()
+
+        wake_at, due = self.table._next_refresh(self.clock.time())
+        self.assertEqual(wake_at, 1_700_000_070 - 1.0)
+        self.assertEqual([p.period for p, _ in due], [30])
+
+    def test_snapshot(self):
+        """Test that a snapshot reads the clock once and reports window ends per period"""
+        self.table.set_token("token60", self.tokens["token1"]["secret"], normalize_params(60))
+        now = self.clock.time()
+
+        with patch.object(self.clock, 'time', wraps=self.clock.time) as spy:
+            taken_at, codes, errors, window_ends = self.table.snapshot()
+            spy.assert_called_once()
+
+        self.assertEqual(taken_at, now)
+        self.assertEqual(codes["token1"], (self.expected("token1", now), self.expected("token1", now + 30)))
+        self.assertEqual(errors, {})
+        self.assertEqual(window_ends, {30: (int(now) // 30 + 1) * 30, 60: (int(now) // 60 + 1) * 60})
+
+    def test_listeners_get_snapshot_after_boundary(self):
+        """Test that listeners receive the new window's codes once the boundary passes"""
+        clock = SimulatedClock(start=1_700_000_025.0, speed=60)
+        table = CodeTable(clock)
+        table.load((token_id, data["secret"]) for token_id, data in self.tokens.items())
+        pushed = []
+        table.add_listener(pushed.append)
+        table.start()
+        try:
+            time.sleep(0.5)  # ~30 simulated seconds, so at least one boundary
+        finally:
+            table.stop()
+
+        self.assertGreaterEqual(len(pushed), 1)
+        now, codes, errors, window_ends = pushed[0]
+        self.assertGreaterEqual(now, 1_700_000_040)
+        self.assertEqual(codes["token1"][0], self.expected("token1", now))
+        self.assertEqual(window_ends[30], (int(now) // 30 + 1) * 30)
+
+    def test_replay_one_day(self):
+        """Test 24 hours of window rollovers on a simulated clock"""
+        start = self.clock.time()
+        self.table.set_token("token60", self.tokens["token1"]["secret"], normalize_params(60))
+        self.table.lookup_all()
+
+        with patch.object(TotpBatchEngine, 'codes_for_keys', autospec=True,
+                          side_effect=TotpBatchEngine.codes_for_keys) as spy:
+            while self.clock.time() < start + 24 * 3600:
+                wake_at, due = self.table._next_refresh(self.clock.time())
+                self.clock.set_time(wake_at)
+                for params, target in due:
+                    self.table.advance_to(target, params)
+                self.clock.advance(1.0)  # Cross the boundary
+
+                codes, errors = self.table.lookup_all()
+                self.assertEqual(codes["token2"][0], self.expected("token2", self.clock.time()))
+                self.assertEqual(codes["token2"][1], self.expected("token2", self.clock.time() + 30))
+                self.assertEqual(errors, {})
+
+        # One batch per window for the 30s group, one per two windows for the 60s group
+        self.assertEqual(spy.call_count, 2880 + 1440)
+
+    def test_background_refresh_on_accelerated_clock(self):
+        """Test that the refresh thread keeps up with an accelerated clock"""
+        clock = SimulatedClock(start=1_700_000_000.0, speed=600)
+        table = CodeTable(clock)
+        table.load((token_id, data["secret"]) for token_id, data in self.tokens.items())
+        first = clock.time() // 30
+        table.start()
+        try:
+            time.sleep(0.5)  # ~300 simulated seconds
+        finally:
+            table.stop()
+
+        group = next(iter(table._groups.values()))
+        self.assertGreaterEqual(group.counter, first + 5)
+
+if __name__ == '__main__':
+    unittest.main()
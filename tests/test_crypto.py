@@ -0,0 +1,280 @@
+import unittest
+import io
+import os
+import json
+import base64
+import tempfile
+import shutil
+from unittest import mock
+from utils import crypto
+from utils.crypto import (
+    write_encrypted_tokens_file, encrypt_tokens_file, decrypt_tokens_file, vault_session,
+    encrypt_tokens, decrypt_tokens, encrypt_data, read_vault_header, is_encrypted_tokens_file
+)
+from utils.vault_storage import JsonVaultStorage
+from utils.file_io import write_json, clear_cache
+
+class TestCrypto(unittest.TestCase):
+    """Test cases for tokens file encryption"""
+
+    def setUp(self):
+        """Set up test fixtures"""
+        self.test_dir = tempfile.mkdtemp()
+        self.tokens_path = os.path.join(self.test_dir, "tokens.json")
+        self.tokens = {
+            "token1": {
+                "issuer": "Test Issuer",
+                "name": "Test Account",
+                "secret": "JBSWY3DPEHPK3PXP"
+            }
+        }
+        clear_cache()
+        vault_session.lock()
+
+    def tearDown(self):
+        """Tear down test fixtures"""
+        shutil.rmtree(self.test_dir)
+        clear_cache()
+        vault_session.lock()
+
+    def count_derivations(self):
+        return mock.patch.object(crypto, "derive_credential_keys", wraps=crypto.derive_credential_keys)
+
+    def test_write_encrypted_tokens_file(self):
+        """Test that tokens are encrypted in memory and written once"""
+        self.assertTrue(write_encrypted_tokens_file(self.tokens_path, self.tokens, "password"))
+
+        with open(self.tokens_path, 'rb') as file:
+            self.assertNotIn(b"JBSWY3DPEHPK3PXP", file.read())
+        self.assertEqual(os.listdir(self.test_dir), ["tokens.json"])
+        self.assertEqual(decrypt_tokens_file(self.tokens_path, "password"), self.tokens)
+
+    def test_encrypt_existing_tokens_file(self):
+        """Test encrypting a plaintext tokens file in place"""
+        write_json(self.tokens_path, self.tokens)
+
+        self.assertTrue(encrypt_tokens_file(self.tokens_path, "password"))
+        self.assertEqual(decrypt_tokens_file(self.tokens_path, "password"), self.tokens)
+        self.assertIsNone(decrypt_tokens_file(self.tokens_path, "wrong"))
+
+    def test_session_derives_key_once(self):
+        """Test that repeated saves and loads reuse the session key and salt"""
+        with self.count_derivations() as derive:
+            write_encrypted_tokens_file(self.tokens_path, self.tokens, "password")
+            salt = read_vault_header(self.tokens_path)["salt"]
+            for _ in range(3):
+                self.assertEqual(decrypt_tokens_file(self.tokens_path, "password"), self.tokens)
+                write_encrypted_tokens_file(self.tokens_path, self.tokens, "password")
+            self.assertEqual(derive.call_count, 1)
+        self.assertTrue(vault_session.unlocked)
+        self.assertEqual(read_vault_header(self.tokens_path)["salt"], salt)
+
+    def test_session_lock_and_password_change(self):
+        """Test that lock forgets the key and a new password rotates the salt"""
+        write_encrypted_tokens_file(self.tokens_path, self.tokens, "password")
+        salt = read_vault_header(self.tokens_path)["salt"]
+
+        vault_session.lock()
+        self.assertFalse(vault_session.unlocked)
+        with self.count_derivations() as derive:
+            self.assertEqual(decrypt_tokens_file(self.tokens_path, "password"), self.tokens)
+            self.assertEqual(derive.call_count, 1)
+
+        write_encrypted_tokens_file(self.tokens_path, self.tokens, "new password")
+        self.assertNotEqual(read_vault_header(self.tokens_path)["salt"], salt)
+        self.assertEqual(decrypt_tokens_file(self.tokens_path, "new password"), self.tokens)
+
+    def test_wrong_password_is_not_remembered(self):
+        """Test that a failed decryption doesn't replace the session key"""
+        write_encrypted_tokens_file(self.tokens_path, self.tokens, "password")
+        self.assertIsNone(decrypt_tokens_file(self.tokens_path, "wrong"))
+        with self.count_derivations() as derive:
+            self.assertEqual(decrypt_tokens_file(self.tokens_path, "password"), self.tokens)
+            self.assertEqual(derive.call_count, 0)
+
+    def write_version1(self, tokens, password):
+        """Write a tokens file the way version 1 did (str() payload, Fernet, base64 JSON envelope)"""
+        encrypted_data, salt = encrypt_data(tokens, password)
+        write_json(self.tokens_path, {
+            "encrypted": True,
+            "data": base64.b64encode(encrypted_data).decode(),
+            "salt": base64.b64encode(salt).decode()
+        })
+
+    def test_vault_envelope(self):
+        """Test the binary header and that the whole file is authenticated"""
+        content = encrypt_tokens(self.tokens, "password", generation=7)
+        self.assertTrue(content.startswith(b"WOTP\x03"))
+        self.assertNotIn(b"JBSWY3DPEHPK3PXP", content)
+        self.assertEqual(decrypt_tokens(content, "password"), self.tokens)
+        self.assertIsNone(decrypt_tokens(content, "wrong"))
+
+        with open(self.tokens_path, "wb") as file:
+            file.write(content)
+        header = read_vault_header(self.tokens_path)
+        self.assertEqual(crypto.kdf_params(header), crypto.DEFAULT_KDF_PARAMS)
+        self.assertEqual(header["generation"], 7)
+        self.assertTrue(is_encrypted_tokens_file(self.tokens_path))
+
+        tampered = content.replace(b'"generation":7', b'"generation":8')
+        self.assertIsNone(decrypt_tokens(tampered, "password"))
+        truncated = content[:-1]
+        self.assertIsNone(decrypt_tokens(truncated, "password"))
+
+    def test_only_changed_records_are_encrypted(self):
+        """Test that saves and reloads through one envelope only process changed tokens"""
+        tokens = {f"token{i}": {"issuer": f"Issuer {i}", "name": "Account", "secret": "JBSWY3DPEHPK3PXP"}
+                  for i in range(20)}
+        writer, reader = crypto.VaultEnvelope(), crypto.VaultEnvelope()
+        content = writer.seal(tokens, "password")
+        self.assertEqual(writer.encrypted_records, 20)
+        self.assertEqual(reader.open(content, "password"), tokens)
+        self.assertEqual(reader.decrypted_records, 20)
+
+        tokens["token3"] = dict(tokens["token3"], name="Renamed")
+        tokens["token20"] = {"issuer": "New", "name": "Account", "secret": "JBSWY3DPEHPK3PXP"}
+        del tokens["token7"]
+        content = writer.seal(tokens, "password")
+        self.assertEqual(writer.encrypted_records, 2)
+        self.assertEqual(reader.open(content, "password"), tokens)
+        self.assertEqual(reader.decrypted_records, 2)
+
+        # A new password only rewraps the data key
+        content = writer.seal(tokens, "new password")
+        self.assertEqual(writer.encrypted_records, 0)
+        self.assertEqual(decrypt_tokens(content, "new password"), tokens)
+        self.assertIsNone(decrypt_tokens(content, "password"))
+
+    def test_storage_saves_incrementally(self):
+        """Test that the JSON vault storage keeps its envelope between saves"""
+        storage = JsonVaultStorage(self.tokens_path, "password")
+        tokens = dict(self.tokens, token2={"issuer": "Other", "name": "Account", "secret": "JBSWY3DPEHPK3PXP"})
+        self.assertTrue(storage.save_all(tokens))
+        tokens["token2"] = dict(tokens["token2"], name="Renamed")
+        self.assertTrue(storage.save_all(tokens))
+        self.assertEqual(storage._envelope.encrypted_records, 1)
+        self.assertEqual(JsonVaultStorage(self.tokens_path, "password").load(), tokens)
+
+    def test_records_cannot_be_dropped_or_swapped(self):
+        """Test that the index MAC covers the records and their ids"""
+        tokens = {"a": {"issuer": "A", "name": "a", "secret": "JBSWY3DPEHPK3PXP"},
+                  "b": {"issuer": "B", "name": "b", "secret": "HXDMVJECJJWSRB3HWIZR4IFUGFTMXBOZ"}}
+        envelope = crypto.VaultEnvelope()
+        content = envelope.seal(tokens, "password")
+        only_a = envelope.seal({"a": tokens["a"]}, "password")
+
+        # Dropping record "b" while keeping the old MAC, or keeping the new MAC
+        dropped = only_a[:-32] + content[-32:]
+        self.assertIsNone(decrypt_tokens(dropped, "password"))
+        self.assertIsNone(decrypt_tokens(content[:len(only_a) - 32] + content[-32:], "password"))
+        offset = crypto.parse_vault_header(content)[1] + crypto._RECORD_HEADER.size  # First token id
+        self.assertEqual(content[offset:offset + 1], b"a")
+        renamed = content[:offset] + b"c" + content[offset + 1:]
+        self.assertIsNone(decrypt_tokens(renamed, "password"))
+
+    def test_version1_is_read_without_eval(self):
+        """Test that a version 1 payload is parsed as a literal, not evaluated"""
+        self.write_version1(self.tokens, "password")
+        self.assertTrue(is_encrypted_tokens_file(self.tokens_path))
+        self.assertEqual(decrypt_tokens_file(self.tokens_path, "password"), self.tokens)
+
+        key, salt = crypto.generate_key_from_password("password")
+        payload = crypto.Fernet(key).encrypt(b"__import__('os').getcwd()")
+        content = json.dumps({"encrypted": True, "data": base64.b64encode(payload).decode(),
+                              "salt": base64.b64encode(salt).decode()}).encode()
+        self.assertIsNone(decrypt_tokens(content, "password"))
+
+    def test_version1_migrates_on_first_unlock(self):
+        """Test that loading a version 1 vault rewrites it in the current format"""
+        self.write_version1(self.tokens, "password")
+        storage = JsonVaultStorage(self.tokens_path, "password")
+        self.assertEqual(storage.load(), self.tokens)
+
+        with open(self.tokens_path, "rb") as file:
+            self.assertTrue(file.read().startswith(b"WOTP"))
+        self.assertEqual(storage.generation, 1)
+        self.assertTrue(storage.is_current())
+        self.assertEqual(JsonVaultStorage(self.tokens_path, "password").load(), self.tokens)
+
+    def test_calibrate_kdf(self):
+        """Test that calibration scales Argon2id to the target time between the floor and the ceiling"""
+        clock = [0.0]
+
+        def calibrate(seconds_per_mib_pass, target_seconds=0.25):
+            def fake_argon2(secret, salt, time_cost, memory_cost, parallelism, hash_len, type):
+                clock[0] += time_cost * memory_cost / 1024 * seconds_per_mib_pass
+                return bytes(hash_len)
+            with mock.patch.object(crypto, "hash_secret_raw", fake_argon2):
+                return crypto.calibrate_kdf(target_seconds, timer=lambda: clock[0])
+
+        # Fast machine: memory grows until one derivation takes the target time
+        params = calibrate(0.001)
+        self.assertEqual(params["time_cost"], crypto.KDF_FLOOR_PARAMS["time_cost"])
+        self.assertEqual(params["memory_cost"], 125 * 1024)
+        # Very fast machine: memory stops at the ceiling and passes are added
+        params = calibrate(0.00001)
+        self.assertEqual(params["memory_cost"], 256 * 1024)
+        self.assertEqual(params["time_cost"], 10)
+        # Slow machine: the floor, even though it exceeds the target
+        self.assertEqual(calibrate(0.1), crypto.kdf_params(crypto.KDF_FLOOR_PARAMS))
+
+    def test_kdf_target(self):
+        """Test that new vault keys use the target parameters and older vaults are re-keyed on load"""
+        self.addCleanup(crypto.set_kdf_target, crypto.DEFAULT_KDF_PARAMS)
+        write_encrypted_tokens_file(self.tokens_path, self.tokens, "password")
+        with self.assertRaises(ValueError):
+            crypto.set_kdf_target(dict(crypto.KDF_FLOOR_PARAMS, memory_cost=1024))
+
+        crypto.set_kdf_target(crypto.KDF_FLOOR_PARAMS)
+        self.assertTrue(crypto.kdf_outdated(read_vault_header(self.tokens_path)))
+        vault_session.lock()
+        self.assertEqual(JsonVaultStorage(self.tokens_path, "password").load(), self.tokens)
+        header = read_vault_header(self.tokens_path)
+        self.assertFalse(crypto.kdf_outdated(header))
+        self.assertEqual(header["memory_cost"], crypto.KDF_FLOOR_PARAMS["memory_cost"])
+
+    def test_costly_kdf_headers_are_rejected(self):
+        """Test that KDF costs above the calibration ceiling are rejected before any derivation"""
+        def with_header(content, **changes):
+            header_end = crypto._VAULT_PREFIX.size + crypto._VAULT_PREFIX.unpack_from(content)[2]
+            magic, version, _ = crypto._VAULT_PREFIX.unpack_from(content)
+            header = json.dumps(dict(json.loads(content[crypto._VAULT_PREFIX.size:header_end]), **changes)).encode()
+            return crypto._VAULT_PREFIX.pack(magic, version, len(header)) + header + content[header_end:]
+
+        vault = encrypt_tokens(self.tokens, "password")
+        stream = b"".join(crypto.encrypt_stream([b"data"], "password", "records"))
+        vault_session.lock()
+        with self.count_derivations() as derive:
+            for changes in ({"memory_cost": 4 * 1024 * 1024}, {"time_cost": 100}, {"parallelism": 64}):
+                self.assertIsNone(decrypt_tokens(with_header(vault, **changes), "password"))
+                with self.assertRaises(ValueError):
+                    crypto.decrypt_stream(io.BytesIO(with_header(stream, **changes)), "password")
+            self.assertEqual(derive.call_count, 0)
+
+    def test_encrypted_stream(self):
+        """Test that an encrypted stream decrypts to its pieces and detects truncation at a chunk boundary"""
+        pieces = [os.urandom(1000) for _ in range(50)]
+        content = b"".join(crypto.encrypt_stream(iter(pieces), "password", "records", chunk_size=4096))
+        self.assertTrue(crypto.is_encrypted_stream(content))
+
+        content_type, chunks = crypto.decrypt_stream(io.BytesIO(content), "password")
+        self.assertEqual(content_type, "records")
+        self.assertEqual(b"".join(chunks), b"".join(pieces))
+
+        # Cut after the first chunk: every remaining chunk is intact, but none is final
+        header_end = crypto._VAULT_PREFIX.size + crypto._VAULT_PREFIX.unpack_from(content)[2]
+        first_end = header_end + 4 + crypto._STREAM_CHUNK_LENGTH.unpack_from(content, header_end)[0]
+        for damaged in (content[:first_end], content + content[header_end:first_end], content[:header_end]):
+            with self.assertRaises(ValueError):
+                b"".join(crypto.decrypt_stream(io.BytesIO(damaged), "password")[1])
+
+    def test_encrypted_stream_uses_session_key(self):
+        """Test that encrypting a stream after the unlock runs no key derivation"""
+        write_encrypted_tokens_file(self.tokens_path, self.tokens, "password")
+        with self.count_derivations() as derive:
+            content = b"".join(crypto.encrypt_stream([b"data"], "password", "records"))
+            self.assertEqual(b"".join(crypto.decrypt_stream(io.BytesIO(content), "password")[1]), b"data")
+            self.assertEqual(derive.call_count, 0)
+
+if __name__ == '__main__':
+    unittest.main()
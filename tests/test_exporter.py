@@ -0,0 +1,195 @@
+import unittest
+import io
+import os
+import json
+import shutil
+import tempfile
+import threading
+from utils import crypto
+from utils.crypto import vault_session
+from utils.exporters.stream_exporter import (
+    write_export, write_backup_file, read_encrypted_export, otpauth_uri, ExportCancelled
+)
+from utils.importers.winotp_importer import parse_winotp_json
+from utils.importers.twofas_importer import parse_2fas_json
+from utils.importers.authenticator_plugin import parse_authenticator_plugin_export
+
+class TestStreamExporter(unittest.TestCase):
+    """Test cases for the streaming token exporter"""
+
+    def setUp(self):
+        """Set up test fixtures"""
+        self.test_dir = tempfile.mkdtemp()
+        self.export_path = os.path.join(self.test_dir, "export")
+        self.tokens = {
+            "token1": {"issuer": "Test Issuer", "name": "user@example.com", "secret": "JBSWY3DPEHPK3PXP",
+                       "created": "2024-01-02T03:04:05"},
+            "token2": {"issuer": "Odd: Issuer & Co", "name": "name/with?chars", "secret": "HXDMVJECJJWSRB3HWIZR4IFUGFTMXBOZ",
+                       "created": "2024-05-06T07:08:09", "period": 60, "digits": 8, "algorithm": "SHA256"}
+        }
+
+    def tearDown(self):
+        """Tear down test fixtures"""
+        shutil.rmtree(self.test_dir)
+        vault_session.lock()
+
+    def export(self, export_format, tokens=None, **kwargs):
+        tokens = self.tokens if tokens is None else tokens
+        return write_export(iter(tokens.items()), len(tokens), self.export_path, export_format, **kwargs)
+
+    def read(self):
+        with open(self.export_path, "r") as file:
+            return file.read()
+
+    def imported(self, tokens):
+        return [(t["issuer"], t["name"], t["secret"], t["period"], t["digits"], t["algorithm"]) for t in tokens]
+
+    def expected(self):
+        return [(t["issuer"], t["name"], t["secret"], t.get("period", 30), t.get("digits", 6), t.get("algorithm", "SHA1"))
+                for t in self.tokens.values()]
+
+    def test_winotp_matches_json_dumps(self):
+        """Test that the WinOTP export is identical to the previous json.dumps output"""
+        self.assertEqual(self.export("winotp"), 2)
+        self.assertEqual(self.read(), json.dumps(self.tokens, indent=4))
+
+        self.export("winotp", tokens={})
+        self.assertEqual(self.read(), json.dumps({}, indent=4))
+
+    def test_winotp_round_trip(self):
+        """Test that a WinOTP export can be imported again"""
+        self.export("winotp")
+        result = parse_winotp_json(self.read())
+        self.assertEqual(self.imported(result["valid_tokens"]), self.expected())
+
+    def test_otpauth_round_trip(self):
+        """Test that an otpauth URI list can be imported again"""
+        self.export("otpauth")
+        self.assertEqual(len(self.read().splitlines()), 2)
+        result = parse_authenticator_plugin_export(self.read())
+        self.assertEqual(result["status"], "success")
+        self.assertEqual(self.imported(result["valid_tokens"]), self.expected())
+
+    def test_otpauth_uri(self):
+        """Test the URI built for a token"""
+        self.assertEqual(
+            otpauth_uri(self.tokens["token1"]),
+            "otpauth://totp/Test%20Issuer:user%40example.com?secret=JBSWY3DPEHPK3PXP"
+            "&issuer=Test%20Issuer&algorithm=SHA1&digits=6&period=30"
+        )
+
+    def test_2fas_round_trip(self):
+        """Test that a 2FAS export can be imported again"""
+        self.export("2fas")
+        data = json.loads(self.read())
+        self.assertEqual(len(data["services"]), 2)
+        result = parse_2fas_json(self.read())
+        self.assertEqual(self.imported(result["valid_tokens"]), self.expected())
+
+    def test_progress_reports(self):
+        """Test that progress is reported in steps and once at the end"""
+        tokens = {f"id{i}": dict(self.tokens["token1"]) for i in range(1000)}
+        progress = []
+        self.export("winotp", tokens=tokens, progress_callback=lambda current, total: progress.append((current, total)))
+        self.assertEqual(progress[-1], (1000, 1000))
+        self.assertTrue(100 <= len(progress) <= 102)
+        self.assertEqual(progress, sorted(progress))
+
+    def test_cancel_leaves_no_file(self):
+        """Test that a cancelled export leaves neither the file nor a temporary file"""
+        cancel = threading.Event()
+
+        def tokens():
+            for i in range(1000):
+                if i == 10:
+                    cancel.set()
+                yield f"id{i}", self.tokens["token1"]
+
+        with self.assertRaises(ExportCancelled):
+            write_export(tokens(), 1000, self.export_path, "winotp", cancel_event=cancel)
+        self.assertEqual(os.listdir(self.test_dir), [])
+
+    def test_cancel_keeps_existing_file(self):
+        """Test that cancelling doesn't touch a file being overwritten"""
+        with open(self.export_path, "w") as file:
+            file.write("previous")
+        cancel = threading.Event()
+        cancel.set()
+        with self.assertRaises(ExportCancelled):
+            self.export("winotp", cancel_event=cancel)
+        self.assertEqual(self.read(), "previous")
+
+    def test_unknown_format(self):
+        """Test that an unknown format is rejected"""
+        with self.assertRaises(ValueError):
+            self.export("csv")
+
+    def test_encrypted_round_trip(self):
+        """Test that an encrypted export spanning several chunks decrypts to the plain export"""
+        tokens = {f"id{i}": dict(self.tokens["token2"]) for i in range(2000)}
+        self.export("winotp", tokens=tokens)
+        plain = self.read()
+        self.export("winotp", tokens=tokens, password="export password")
+        with open(self.export_path, "rb") as file:
+            self.assertNotIn(b"HXDMVJECJJWSRB3HWIZR4IFUGFTMXBOZ", file.read())
+            file.seek(0)
+            content_format, chunks = read_encrypted_export(file, "export password")
+            self.assertEqual(content_format, "winotp")
+            self.assertEqual(b"".join(chunks).decode(), plain)
+
+    def test_encrypted_export_detects_tampering(self):
+        """Test that a wrong password, dropped chunks and truncation are detected"""
+        tokens = {f"id{i}": dict(self.tokens["token2"]) for i in range(2000)}
+        self.export("2fas", tokens=tokens, password="export password")
+        with open(self.export_path, "rb") as file:
+            content = file.read()
+        header, chunks = split_stream(content)
+        self.assertGreater(len(chunks), 2)
+
+        def decrypt(content, password="export password"):
+            _, chunks = read_encrypted_export(io.BytesIO(content), password)
+            return b"".join(chunks)
+
+        with self.assertRaises(ValueError):
+            decrypt(content, "wrong password")
+        with self.assertRaises(ValueError):
+            decrypt(header + b"".join(chunks[:1] + chunks[2:]))
+        with self.assertRaises(ValueError):
+            decrypt(header + b"".join(chunks[:-1]))
+        with self.assertRaises(ValueError):
+            decrypt(content[:-1])
+        with self.assertRaises(ValueError):
+            decrypt(b"not an export\n")
+
+    def test_backup_file(self):
+        """Test that backups are plain WinOTP JSON, or an encrypted stream of it with a password"""
+        backup_path = write_backup_file(iter(self.tokens.items()), len(self.tokens))
+        try:
+            with open(backup_path, "r") as file:
+                self.assertEqual(json.load(file), self.tokens)
+        finally:
+            os.remove(backup_path)
+
+        backup_path = write_backup_file(iter(self.tokens.items()), len(self.tokens), "secret")
+        try:
+            self.assertTrue(backup_path.endswith(".json.enc"))
+            with open(backup_path, "rb") as file:
+                content_format, chunks = read_encrypted_export(file, "secret")
+                self.assertEqual(json.loads(b"".join(chunks)), self.tokens)
+        finally:
+            os.remove(backup_path)
+
+
+def split_stream(content):
+    """Split an encrypted stream into its header and its chunks"""
+    header_end = crypto._VAULT_PREFIX.size + crypto._VAULT_PREFIX.unpack_from(content)[2]
+    chunks = []
+    offset = header_end
+    while offset < len(content):
+        end = offset + crypto._STREAM_CHUNK_LENGTH.size + crypto._STREAM_CHUNK_LENGTH.unpack_from(content, offset)[0]
+        chunks.append(content[offset:end])
+        offset = end
+    return content[:header_end], chunks
+
+if __name__ == '__main__':
+    unittest.main()
@@ -3,7 +3,8 @@ import os
 import json
 import tempfile
 import shutil
-from utils.file_io import read_json, write_json, enable_cache, clear_cache
+from utils import file_io
+from utils.file_io import read_json, write_json, enable_cache, clear_cache, invalidate_cache
 
 class TestFileIO(unittest.TestCase):
     """Test cases for file I/O operations"""
@@ -96,16 +97,20 @@ class TestFileIO(unittest.TestCase):
         # Read the data to cache it
         first_read = read_json(self.test_file)
         
-        # Get the file modification time
+        # Get the file modification time (in nanoseconds, as the cache compares it)
         original_mtime = os.path.getmtime(self.test_file)
+        original_mtime_ns = os.stat(self.test_file).st_mtime_ns
         
-        # Modify the file directly (bypassing the write_json function)
+        # Modify the file directly (bypassing the write_json function), keeping its size
+        # so only the modification time tells the versions apart
         modified_data = {"modified": True}
+        modified_text = json.dumps(modified_data)
+        modified_text += " " * (os.path.getsize(self.test_file) - len(modified_text))
         with open(self.test_file, 'w') as file:
-            json.dump(modified_data, file)
+            file.write(modified_text)
             
         # Ensure the modification time is different
-        os.utime(self.test_file, (original_mtime, original_mtime))
+        os.utime(self.test_file, ns=(original_mtime_ns, original_mtime_ns))
             
         # Read again with cache enabled - should get cached data
         second_read = read_json(self.test_file)
@@ -151,5 +156,79 @@ class TestFileIO(unittest.TestCase):
         second_read = read_json(self.test_file)
         self.assertEqual(second_read, modified_data)
 
+    def test_write_json_leaves_no_temp_files(self):
+        """Test that atomic writes replace the file without leaving temporary files"""
+        write_json(self.test_file, self.test_data)
+        write_json(self.test_file, {"replaced": True})
+
+        self.assertEqual(os.listdir(self.test_dir), ["test.json"])
+        with open(self.test_file, 'r') as file:
+            self.assertEqual(json.load(file), {"replaced": True})
+
+    def test_failed_write_keeps_original(self):
+        """Test that a failed write leaves the existing file untouched"""
+        write_json(self.test_file, self.test_data)
+
+        self.assertFalse(write_json(self.test_file, {"bad": object()}))
+
+        self.assertEqual(os.listdir(self.test_dir), ["test.json"])
+        with open(self.test_file, 'r') as file:
+            self.assertEqual(json.load(file), self.test_data)
+
+    def test_cache_detects_size_change(self):
+        """Test that a rewrite with the same mtime but a different size is not served from cache"""
+        write_json(self.test_file, self.test_data)
+        read_json(self.test_file)
+        original_mtime_ns = os.stat(self.test_file).st_mtime_ns
+
+        with open(self.test_file, 'w') as file:
+            json.dump({"modified": True}, file)
+        os.utime(self.test_file, ns=(original_mtime_ns, original_mtime_ns))
+
+        self.assertEqual(read_json(self.test_file), {"modified": True})
+
+    def test_one_entry_per_path(self):
+        """Test that rewriting a file replaces its cache entry instead of adding one"""
+        for i in range(5):
+            write_json(self.test_file, {"version": i})
+            self.assertEqual(read_json(self.test_file), {"version": i})
+        self.assertEqual(len(file_io._file_cache), 1)
+
+    def test_cache_is_bounded(self):
+        """Test that the least recently used files are evicted"""
+        paths = [os.path.join(self.test_dir, f"file{i}.json") for i in range(file_io._CACHE_MAX_ENTRIES + 3)]
+        for i, path in enumerate(paths):
+            write_json(path, {"index": i})
+        self.assertEqual(len(file_io._file_cache), file_io._CACHE_MAX_ENTRIES)
+        self.assertNotIn(os.path.abspath(paths[0]), file_io._file_cache)
+        self.assertIn(os.path.abspath(paths[-1]), file_io._file_cache)
+
+    def test_write_invalidates_only_its_path(self):
+        """Test that writing one file keeps other files cached"""
+        other_file = os.path.join(self.test_dir, "other.json")
+        write_json(other_file, {"other": True})
+        cached = read_json(other_file)
+
+        write_json(self.test_file, self.test_data)
+        self.assertIs(read_json(other_file), cached)
+
+        invalidate_cache(other_file)
+        self.assertNotIn(os.path.abspath(other_file), file_io._file_cache)
+
+    def test_cached_data_is_read_only(self):
+        """Test that cached data can't be modified and mutable reads are private copies"""
+        write_json(self.test_file, self.test_data)
+        data = read_json(self.test_file)
+
+        with self.assertRaises(TypeError):
+            data["token3"] = {}
+        with self.assertRaises(TypeError):
+            data["token1"]["issuer"] = "Changed"
+
+        copy = read_json(self.test_file, mutable=True)
+        copy["token1"]["issuer"] = "Changed"
+        self.assertEqual(read_json(self.test_file), self.test_data)
+        self.assertEqual(json.loads(json.dumps(data)), self.test_data)
+
 if __name__ == '__main__':
     unittest.main() 
\ No newline at end of file
@@ -0,0 +1,192 @@
+import unittest
+import os
+import time
+import shutil
+import sqlite3
+import tempfile
+import threading
+from utils.file_watch import FileWatcher
+from utils.file_io import write_json, write_file_atomic, clear_cache
+from utils.vault_storage import JsonVaultStorage
+from utils.journal_vault import JournalVault
+from utils.sqlite_vault import SqliteVault
+from utils.crypto import encrypt_tokens
+
+class FileWatcherTests:
+    """Test cases shared by the inotify and polling backends"""
+
+    use_inotify = True
+
+    def setUp(self):
+        """Set up test fixtures"""
+        self.test_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.test_dir, "tokens.json")
+        write_json(self.path, {})
+        self.changes = []
+        self.changed = threading.Event()
+        self.watcher = FileWatcher(interval=0.05, use_inotify=self.use_inotify)
+
+    def tearDown(self):
+        """Tear down test fixtures"""
+        self.watcher.stop()
+        shutil.rmtree(self.test_dir)
+        clear_cache()
+
+    def on_change(self, path):
+        self.changes.append(path)
+        self.changed.set()
+
+    def wait_for_change(self, timeout=2.0):
+        result = self.changed.wait(timeout)
+        self.changed.clear()
+        return result
+
+    def test_reports_atomic_replace(self):
+        """Test that replacing the file (as every vault save does) is reported"""
+        self.watcher.watch(self.path, self.on_change)
+        time.sleep(0.1)
+        write_file_atomic(self.path, '{"a": 1}')
+        self.assertTrue(self.wait_for_change())
+        self.assertEqual(self.changes[-1], os.path.abspath(self.path))
+
+    def test_reports_in_place_append(self):
+        """Test that appending to the file (journal records) is reported"""
+        self.watcher.watch(self.path, self.on_change)
+        time.sleep(0.1)
+        with open(self.path, "a") as file:
+            file.write("\n")
+        self.assertTrue(self.wait_for_change())
+
+    def test_ignores_other_files(self):
+        """Test that changes to other files in the directory are not reported"""
+        self.watcher.watch(self.path, self.on_change)
+        time.sleep(0.1)
+        write_json(os.path.join(self.test_dir, "app_settings.json"), {"x": 1})
+        self.assertFalse(self.wait_for_change(0.3))
+
+    def test_unwatch(self):
+        """Test that no change is reported after unwatch"""
+        self.watcher.watch(self.path, self.on_change)
+        self.watcher.unwatch(self.path, self.on_change)
+        write_file_atomic(self.path, '{"b": 2}')
+        self.assertFalse(self.wait_for_change(0.3))
+
+    def test_missing_file_is_reported_when_created(self):
+        """Test that a file that doesn't exist yet is reported once it is written"""
+        path = os.path.join(self.test_dir, "tokens.json.journal")
+        self.watcher.watch(path, self.on_change)
+        time.sleep(0.1)
+        write_file_atomic(path, "header\n")
+        self.assertTrue(self.wait_for_change())
+        self.assertIn(os.path.abspath(path), self.changes)
+
+
+@unittest.skipUnless(FileWatcher().backend == "inotify", "inotify is not available")
+class TestInotifyFileWatcher(FileWatcherTests, unittest.TestCase):
+    """Test cases for the inotify backend"""
+
+    use_inotify = True
+
+
+class TestPollingFileWatcher(FileWatcherTests, unittest.TestCase):
+    """Test cases for the polling fallback"""
+
+    use_inotify = False
+
+    def test_backend(self):
+        """Test that the fallback is used when inotify is disabled"""
+        self.assertEqual(self.watcher.backend, "polling")
+
+
+class TestOwnWriteDetection(unittest.TestCase):
+    """Test that vault storages tell their own writes from external ones"""
+
+    def setUp(self):
+        """Set up test fixtures"""
+        self.test_dir = tempfile.mkdtemp()
+        self.tokens_path = os.path.join(self.test_dir, "tokens.json")
+        self.tokens = {"token1": {"issuer": "Test Issuer", "name": "Test Account", "secret": "JBSWY3DPEHPK3PXP"}}
+        self.storages = []
+        clear_cache()
+
+    def tearDown(self):
+        """Tear down test fixtures"""
+        for storage in self.storages:
+            storage.close()
+        shutil.rmtree(self.test_dir)
+        clear_cache()
+
+    def open(self, storage):
+        self.storages.append(storage)
+        return storage
+
+    def test_plain_json(self):
+        """Test that a plain vault is current after its own save, not after an external one"""
+        storage = self.open(JsonVaultStorage(self.tokens_path))
+        self.assertFalse(storage.is_current())
+        storage.save_all(self.tokens)
+        self.assertTrue(storage.is_current())
+
+        write_json(self.tokens_path, {})
+        self.assertFalse(storage.is_current())
+        storage.load()
+        self.assertTrue(storage.is_current())
+
+    def test_encrypted_json_generation(self):
+        """Test that an encrypted vault is recognized by its generation without decrypting"""
+        storage = self.open(JsonVaultStorage(self.tokens_path, "secret"))
+        storage.save_all(self.tokens)
+        self.assertEqual(storage.generation, 1)
+        self.assertTrue(storage.is_current())
+
+        storage.save_all(self.tokens)
+        self.assertEqual(storage.generation, 2)
+        self.assertTrue(storage.is_current())
+
+        # Another writer (without a generation, like older versions)
+        write_file_atomic(self.tokens_path, encrypt_tokens(self.tokens, "secret"))
+        self.assertFalse(storage.is_current())
+
+        # A reload picks up the generation found in the file
+        other = self.open(JsonVaultStorage(self.tokens_path, "secret"))
+        other.save_all(self.tokens)
+        self.assertEqual(storage.load(), self.tokens)
+        self.assertEqual(storage.generation, other.generation)
+        self.assertTrue(storage.is_current())
+
+    def test_journal(self):
+        """Test that journal appends and compaction count as own writes"""
+        storage = self.open(JournalVault(self.tokens_path))
+        storage.save_all(self.tokens)
+        self.assertTrue(storage.is_current())
+        storage.put("token2", {"issuer": "B", "name": "b", "secret": "JBSWY3DPEHPK3PXP"})
+        self.assertTrue(storage.is_current())
+        storage.flush()
+        self.assertTrue(storage.is_current())
+
+        with open(storage.journal_path, "a") as file:
+            file.write("garbage\n")
+        self.assertFalse(storage.is_current())
+
+    def test_sqlite_data_version(self):
+        """Test that only commits from other connections make a SQLite vault stale"""
+        db_path = os.path.join(self.test_dir, "tokens.db")
+        storage = self.open(SqliteVault(db_path, self.tokens_path))
+        storage.save_all(self.tokens)
+        self.assertFalse(storage.is_current())  # Not loaded yet
+        storage.load()
+        storage.put("token2", {"issuer": "B", "name": "b", "secret": "JBSWY3DPEHPK3PXP"})
+        storage.delete("token1")
+        self.assertTrue(storage.is_current())
+
+        connection = sqlite3.connect(db_path, isolation_level=None)
+        try:
+            connection.execute("DELETE FROM tokens")
+        finally:
+            connection.close()
+        self.assertFalse(storage.is_current())
+        self.assertEqual(storage.load(), {})
+        self.assertTrue(storage.is_current())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,125 @@
+import unittest
+import os
+import json
+import tempfile
+import shutil
+from cryptography.fernet import Fernet, InvalidToken
+from utils import journal_vault
+from utils.journal_vault import JournalVault
+from utils.crypto import vault_session
+from utils.file_io import write_json, clear_cache
+
+class TestJournalVault(unittest.TestCase):
+    """Test cases for the snapshot + append-only journal vault storage"""
+
+    def setUp(self):
+        """Set up test fixtures"""
+        self.test_dir = tempfile.mkdtemp()
+        self.tokens_path = os.path.join(self.test_dir, "tokens.json")
+        self.tokens = {
+            "token1": {"issuer": "Test Issuer", "name": "Test Account", "secret": "JBSWY3DPEHPK3PXP"},
+            "token2": {"issuer": "Another Issuer", "name": "Another Account", "secret": "HXDMVJECJJWSRB3HWIZR4IFUGFTMXBOZ"}
+        }
+        write_json(self.tokens_path, self.tokens)
+        clear_cache()
+
+    def tearDown(self):
+        """Tear down test fixtures"""
+        shutil.rmtree(self.test_dir)
+        clear_cache()
+
+    def reopen(self, password=None):
+        vault = JournalVault(self.tokens_path, password)
+        return vault, vault.load()
+
+    def test_edits_append_without_rewriting_snapshot(self):
+        """Test that edits go to the journal and are replayed on load"""
+        vault, _ = self.reopen()
+        snapshot_mtime = os.path.getmtime(self.tokens_path)
+
+        vault.put("token3", {"issuer": "New", "name": "Account", "secret": "ABCDEFGHIJKLMNOPQRSTUVWXYZ234567"})
+        vault.delete("token1")
+
+        self.assertEqual(os.path.getmtime(self.tokens_path), snapshot_mtime)
+        _, tokens = self.reopen()
+        self.assertEqual(sorted(tokens), ["token2", "token3"])
+
+    def test_interrupted_append_is_truncated(self):
+        """Test that a torn last record is dropped and the journal stays usable"""
+        vault, _ = self.reopen()
+        vault.put("token3", {"issuer": "New", "name": "Account", "secret": "ABCDEFGHIJKLMNOPQRSTUVWXYZ234567"})
+        valid_size = os.path.getsize(vault.journal_path)
+        vault.delete("token1")
+        with open(vault.journal_path, "r+b") as file:
+            file.truncate(os.path.getsize(vault.journal_path) - 5)
+
+        vault, tokens = self.reopen()
+        self.assertEqual(sorted(tokens), ["token1", "token2", "token3"])
+        self.assertEqual(os.path.getsize(vault.journal_path), valid_size)
+
+        vault.delete("token2")
+        _, tokens = self.reopen()
+        self.assertEqual(sorted(tokens), ["token1", "token3"])
+
+    def test_corrupted_record_is_truncated(self):
+        """Test that a record failing its checksum ends the replay"""
+        vault, _ = self.reopen()
+        vault.delete("token1")
+        vault.delete("token2")
+        with open(vault.journal_path, "rb") as file:
+            lines = file.readlines()
+        lines[1] = lines[1][:10] + (b"A" if lines[1][10:11] != b"A" else b"B") + lines[1][11:]
+        with open(vault.journal_path, "wb") as file:
+            file.writelines(lines)
+
+        _, tokens = self.reopen()
+        self.assertEqual(tokens, self.tokens)
+
+    def test_journal_for_other_snapshot_is_ignored(self):
+        """Test that a journal left behind by an interrupted compaction is not replayed"""
+        vault, _ = self.reopen()
+        vault.delete("token1")
+        write_json(self.tokens_path, {"token9": self.tokens["token1"]})
+
+        _, tokens = self.reopen()
+        self.assertEqual(sorted(tokens), ["token9"])
+
+    def test_background_compaction(self):
+        """Test that the journal is folded into the snapshot past the threshold"""
+        vault = JournalVault(self.tokens_path, compact_threshold=1024)
+        vault.load()
+        for i in range(20):
+            vault.put(f"extra{i}", {"issuer": "I", "name": str(i), "secret": "JBSWY3DPEHPK3PXP"})
+        vault.flush()
+
+        self.assertEqual(vault.journal_size, 0)
+        self.assertFalse(os.path.exists(vault.journal_path))
+        with open(self.tokens_path) as file:
+            self.assertEqual(len(json.load(file)), 22)
+
+    def test_encrypted_journal(self):
+        """Test that records are encrypted and authenticated with a password"""
+        vault = JournalVault(self.tokens_path, "password")
+        vault.write_snapshot(self.tokens)
+        vault.put("token3", {"issuer": "New", "name": "Account", "secret": "ABCDEFGHIJKLMNOPQRSTUVWXYZ234567"})
+
+        with open(vault.journal_path, "rb") as file:
+            self.assertNotIn(b"ABCDEFGHIJKLMNOPQRSTUVWXYZ234567", file.read())
+        _, tokens = self.reopen("password")
+        self.assertEqual(sorted(tokens), ["token1", "token2", "token3"])
+
+    def test_journal_key_is_not_the_vault_key(self):
+        """Test that records are sealed with a key derived for the journal, not the vault key itself"""
+        vault = JournalVault(self.tokens_path, "password")
+        vault.write_snapshot(self.tokens)
+        vault.put("token3", {"issuer": "New", "name": "Account", "secret": "ABCDEFGHIJKLMNOPQRSTUVWXYZ234567"})
+
+        vault_key = vault_session.write_key("password")[0]
+        with open(vault.journal_path, "rb") as file:
+            record = file.read().splitlines()[1]
+        with self.assertRaises(InvalidToken):
+            Fernet(vault_key).decrypt(record)
+        self.assertIn(b"token3", Fernet(journal_vault._journal_key(vault_key)).decrypt(record))
+
+if __name__ == '__main__':
+    unittest.main()
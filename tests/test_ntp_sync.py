@@ -4,8 +4,9 @@ import time
 from utils.ntp_sync import (
     get_ntp_time, calculate_offset, get_accurate_time,
     get_accurate_timestamp_30s, start_ntp_sync, stop_ntp_sync,
-    get_sync_status
+    get_sync_status, set_base_clock, NtpClock
 )
+from utils.clock import SimulatedClock
 
 class TestNTPSync(unittest.TestCase):
     """Test cases for NTP synchronization functionality"""
@@ -165,5 +166,21 @@ class TestNTPSync(unittest.TestCase):
                     self.assertEqual(status['offset'], 5.0)
                     self.assertTrue(status['is_running'])
 
+    def test_ntp_clock_with_simulated_base(self):
+        """Test that the NTP clock applies the offset to an injected base clock"""
+        import utils.ntp_sync
+        base = SimulatedClock(start=1000.0)
+        set_base_clock(base)
+        try:
+            with patch('utils.ntp_sync._sync_initialized', True), \
+                 patch('utils.ntp_sync._last_sync', 1000.0), \
+                 patch('utils.ntp_sync._time_offset', 5.0):
+                self.assertEqual(NtpClock().time(), 1005.0)
+                base.advance(30)
+                self.assertEqual(NtpClock().time(), 1035.0)
+        finally:
+            set_base_clock(None)
+        self.assertNotIsInstance(utils.ntp_sync._base_clock, SimulatedClock)
+
 if __name__ == '__main__':
     unittest.main() 
\ No newline at end of file
@@ -0,0 +1,120 @@
+import unittest
+import os
+import sqlite3
+import tempfile
+import shutil
+from utils.sqlite_vault import SqliteVault, migrate_tokens_file
+from utils.vault_storage import open_vault_storage, sqlite_path_for, JsonVaultStorage, VaultStorage
+from utils.file_io import write_json, read_json, clear_cache
+
+class TestSqliteVault(unittest.TestCase):
+    """Test cases for the SQLite vault backend"""
+
+    def setUp(self):
+        """Set up test fixtures"""
+        self.test_dir = tempfile.mkdtemp()
+        self.tokens_path = os.path.join(self.test_dir, "tokens.json")
+        self.db_path = sqlite_path_for(self.tokens_path)
+        self.tokens = {
+            "token1": {"issuer": "Test Issuer", "name": "Test Account", "secret": "JBSWY3DPEHPK3PXP",
+                       "created": "2024-01-02T03:04:05"},
+            "token2": {"issuer": "Another Issuer", "name": "Another Account", "secret": "HXDMVJECJJWSRB3HWIZR4IFUGFTMXBOZ",
+                       "created": "2024-05-06T07:08:09", "period": 60, "digits": 8, "algorithm": "SHA256"}
+        }
+        self.vaults = []
+        clear_cache()
+
+    def tearDown(self):
+        """Tear down test fixtures"""
+        for vault in self.vaults:
+            vault.close()
+        shutil.rmtree(self.test_dir)
+        clear_cache()
+
+    def open(self, password=None):
+        vault = SqliteVault(self.db_path, self.tokens_path, password)
+        self.vaults.append(vault)
+        return vault
+
+    def test_round_trip_and_edits(self):
+        """Test saving, single-row edits and insertion order"""
+        vault = self.open()
+        vault.save_all(self.tokens)
+        vault.put("token3", {"issuer": "New", "name": "Account", "secret": "ABCDEFGHIJKLMNOPQRSTUVWXYZ234567"})
+        vault.put("token1", dict(self.tokens["token1"], name="Renamed"))
+        vault.delete("token2")
+
+        tokens = self.open().load()
+        self.assertEqual(list(tokens), ["token1", "token3"])
+        self.assertEqual(tokens["token1"]["name"], "Renamed")
+
+    def test_schema_uses_wal_and_indexes(self):
+        """Test that the database runs in WAL mode with issuer/name and created indexes"""
+        self.open().save_all(self.tokens)
+
+        connection = sqlite3.connect(self.db_path)
+        try:
+            self.assertEqual(connection.execute("PRAGMA journal_mode").fetchone()[0], "wal")
+            indexes = {row[1] for row in connection.execute("PRAGMA index_list(tokens)")}
+            self.assertTrue({"idx_tokens_issuer_name", "idx_tokens_created"} <= indexes)
+        finally:
+            connection.close()
+
+    def test_secrets_encrypted_per_row(self):
+        """Test that secrets are encrypted with a password and other columns are not"""
+        vault = self.open("password")
+        vault.save_all(self.tokens)
+
+        connection = sqlite3.connect(self.db_path)
+        try:
+            issuer, secret = connection.execute("SELECT issuer, secret FROM tokens WHERE id = 'token1'").fetchone()
+        finally:
+            connection.close()
+        self.assertEqual(issuer, "Test Issuer")
+        self.assertNotIn(b"JBSWY3DPEHPK3PXP", secret)
+
+        self.assertEqual(self.open("password").load(), self.tokens)
+        self.assertIsNone(self.open("wrong").load())
+
+    def test_flush_keeps_tokens_json(self):
+        """Test that flush leaves tokens.json alone and only an export rewrites it"""
+        vault = self.open("password")
+        vault.save_all(self.tokens)
+        vault.put("token3", self.tokens["token1"])
+        vault.flush()
+        self.assertFalse(os.path.exists(self.tokens_path))
+
+        vault.export_tokens_file()
+        self.assertEqual(JsonVaultStorage(self.tokens_path, "password").load(),
+                         dict(self.tokens, token3=self.tokens["token1"]))
+
+    def test_migration(self):
+        """Test migrating tokens.json into a new database"""
+        write_json(self.tokens_path, self.tokens)
+
+        self.assertEqual(migrate_tokens_file(self.tokens_path, self.db_path), 2)
+        self.assertEqual(self.open().load(), self.tokens)
+
+    def test_open_vault_storage_migrates(self):
+        """Test that opening the sqlite format migrates an existing tokens.json"""
+        write_json(self.tokens_path, self.tokens)
+
+        storage = open_vault_storage("sqlite", self.tokens_path)
+        self.vaults.append(storage)
+        self.assertEqual(storage.format, "sqlite")
+        self.assertEqual(storage.load(), self.tokens)
+        self.assertEqual(read_json(self.tokens_path), self.tokens)
+        with self.assertRaises(ValueError):
+            open_vault_storage("xml", self.tokens_path)
+
+    def test_storage_interface(self):
+        """Test that the storage base is abstract and single edits are only for incremental backends"""
+        with self.assertRaises(TypeError):
+            VaultStorage(self.tokens_path)
+        storage = JsonVaultStorage(self.tokens_path)
+        self.assertFalse(storage.incremental)
+        with self.assertRaises(TypeError):
+            storage.put("token1", self.tokens["token1"])
+
+if __name__ == '__main__':
+    unittest.main()
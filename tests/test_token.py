@@ -2,7 +2,8 @@ import unittest
 from unittest.mock import patch, MagicMock
 import pyotp
 import re
-from models.token import Token
+from models.token import Token, WindowCodeCache, forget_secret, _totp_cache, _code_cache, _code_cache_for
+from utils.clock import SimulatedClock
 
 class TestToken(unittest.TestCase):
     """Test cases for the Token class"""
@@ -101,5 +102,102 @@ class TestToken(unittest.TestCase):
         # Codes should be different
         self.assertNotEqual(code1, code2)
 
+    @patch('models.token.get_accurate_time')
+    def test_forget_secret(self, mock_get_accurate_time):
+        """Test that forgetting a secret drops its cached TOTP object and codes"""
+        mock_get_accurate_time.return_value = 0
+        
+        Token(self.issuer, self.valid_secret, self.name).get_code()
+        self.assertIn(self.valid_secret, _totp_cache)
+        self.assertIsNotNone(_code_cache.get(self.valid_secret, 0))
+        
+        forget_secret(self.valid_secret)
+        
+        self.assertNotIn(self.valid_secret, _totp_cache)
+        self.assertIsNone(_code_cache.get(self.valid_secret, 0))
+
+    def test_token_with_params(self):
+        """Test tokens with non-default period, digits and algorithm"""
+        token = Token("Issuer", self.valid_secret, "Name", period=60, digits=8, algorithm="SHA256")
+        code = token.get_code()
+
+        self.assertEqual(len(code), 8)
+        self.assertEqual(token.totp.interval, 60)
+        self.assertLessEqual(token.get_time_remaining(), 60)
+
+    def test_codes_cached_per_period(self):
+        """Test that codes of tokens with different periods are cached side by side"""
+        clock = SimulatedClock(start=1_000_000.0)
+        short = Token(self.issuer, self.valid_secret, self.name, clock=clock)
+        long = Token(self.issuer, self.valid_secret, self.name, period=60, clock=clock)
+        self.addCleanup(_code_cache_for(60).clear)
+        self.addCleanup(_code_cache.clear)
+        for _ in range(3):
+            short.get_code()
+            long.get_code()
+
+        self.assertIsNotNone(_code_cache.get(self.valid_secret, 1_000_000 // 30))
+        self.assertIsNotNone(_code_cache_for(60).get(long._cache_key, 1_000_000 // 60))
+
+        forget_secret(self.valid_secret)
+        self.assertIsNone(_code_cache_for(60).get(long._cache_key, 1_000_000 // 60))
+
+    def test_token_with_clock(self):
+        """Test that tokens read the time from an injected clock"""
+        clock = SimulatedClock(start=59.0)
+        token = Token(self.issuer, self.valid_secret, self.name, clock=clock)
+
+        self.assertEqual(token.get_code(), pyotp.TOTP(self.valid_secret).at(59))
+        self.assertEqual(token.get_time_remaining(), 1)
+
+        clock.advance(1.0)
+        self.assertEqual(token.get_code(), pyotp.TOTP(self.valid_secret).at(60))
+        self.assertEqual(token.get_time_remaining(), 30)
+
+class TestWindowCodeCache(unittest.TestCase):
+    """Test cases for the window-indexed code cache"""
+    
+    def test_get_put(self):
+        """Test storing and retrieving codes per window"""
+        cache = WindowCodeCache()
+        cache.put("SECRET", 10, "123456")
+        
+        self.assertEqual(cache.get("SECRET", 10), "123456")
+        self.assertIsNone(cache.get("SECRET", 11))
+        self.assertIsNone(cache.get("OTHER", 10))
+        
+    def test_expired_windows_evicted(self):
+        """Test that old windows are evicted as time moves on"""
+        cache = WindowCodeCache(max_windows=3)
+        for window in range(100):
+            cache.put("SECRET", window, str(window))
+            
+        # Only the most recent windows survive, regardless of secret ordering
+        self.assertEqual(len(cache), 3)
+        self.assertEqual(cache.get("SECRET", 99), "99")
+        self.assertIsNone(cache.get("SECRET", 96))
+        
+    def test_stale_window_not_cached(self):
+        """Test that codes for windows older than the limit are not stored"""
+        cache = WindowCodeCache(max_windows=3)
+        cache.put("SECRET", 100, "new")
+        cache.put("SECRET", 10, "old")
+        
+        self.assertIsNone(cache.get("SECRET", 10))
+        self.assertEqual(cache.get("SECRET", 100), "new")
+        
+    def test_forget(self):
+        """Test removing a secret from every window"""
+        cache = WindowCodeCache()
+        cache.put("SECRET", 1, "111111")
+        cache.put("SECRET", 2, "222222")
+        cache.put("OTHER", 2, "333333")
+        
+        cache.forget("SECRET")
+        
+        self.assertIsNone(cache.get("SECRET", 1))
+        self.assertIsNone(cache.get("SECRET", 2))
+        self.assertEqual(cache.get("OTHER", 2), "333333")
+
 if __name__ == '__main__':
     unittest.main() 
\ No newline at end of file
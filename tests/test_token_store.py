@@ -0,0 +1,209 @@
+import unittest
+from models.token_store import TokenStore
+from models.totp_engine import decode_secret
+
+class TestTokenStore(unittest.TestCase):
+    """Test cases for the compact token store"""
+
+    def setUp(self):
+        """Set up test fixtures"""
+        self.tokens = {
+            "token1": {
+                "issuer": "Test Issuer",
+                "name": "Test Account",
+                "secret": "JBSWY3DPEHPK3PXP",
+                "created": "2024-01-02T03:04:05.678901"
+            },
+            "token2": {
+                "issuer": "Test Issuer",
+                "name": "Another Account",
+                "secret": "HXDMVJECJJWSRB3HWIZR4IFUGFTMXBOZ",
+                "created": "2024-05-06T07:08:09"
+            }
+        }
+        self.store = TokenStore.from_dict(self.tokens)
+
+    def test_round_trip(self):
+        """Test that the store serializes back to the tokens.json format"""
+        self.assertEqual(self.store.to_dict(), self.tokens)
+
+    def test_iter_dicts(self):
+        """Test lazy iteration in the tokens.json format, skipping tokens removed meanwhile"""
+        self.assertEqual(dict(self.store.iter_dicts()), self.tokens)
+
+        pairs = self.store.iter_dicts()
+        self.assertEqual(next(pairs)[0], "token1")
+        self.store.remove("token2")
+        self.assertEqual(list(pairs), [])
+
+    def test_container_protocol(self):
+        """Test length, membership and insertion-ordered iteration"""
+        self.assertEqual(len(self.store), 2)
+        self.assertIn("token1", self.store)
+        self.assertNotIn("missing", self.store)
+        self.assertEqual([record.id for record in self.store], ["token1", "token2"])
+
+    def test_issuers_interned(self):
+        """Test that repeated issuers share one string object"""
+        first, second = list(self.store)
+        self.assertIs(first.issuer, second.issuer)
+
+    def test_keys_decoded_once(self):
+        """Test that decoded keys come from the shared buffer"""
+        record = self.store.get("token2")
+        self.assertEqual(self.store.key(record), decode_secret("HXDMVJECJJWSRB3HWIZR4IFUGFTMXBOZ"))
+
+    def test_update(self):
+        """Test updating display fields"""
+        self.store.update("token1", issuer="Updated Issuer", name="Updated Account")
+
+        record = self.store.get("token1")
+        self.assertEqual(record.issuer, "Updated Issuer")
+        self.assertEqual(record.name, "Updated Account")
+        self.assertIsNone(self.store.update("missing", issuer="x"))
+
+    def test_remove_and_handle_reuse(self):
+        """Test that removed handles are reused and secrets stay correct after compaction"""
+        removed = self.store.remove("token1")
+        self.assertEqual(removed.id, "token1")
+        self.assertNotIn("token1", self.store)
+        self.assertIsNone(self.store.remove("token1"))
+
+        record = self.store.add("token3", "New Issuer", "New Account", "ABCDEFGHIJKLMNOPQRSTUVWXYZ234567")
+        self.assertEqual(record.handle, removed.handle)
+        self.assertEqual(self.store.secret(record), "ABCDEFGHIJKLMNOPQRSTUVWXYZ234567")
+        self.assertEqual(self.store.secret(self.store.get("token2")), "HXDMVJECJJWSRB3HWIZR4IFUGFTMXBOZ")
+
+    def test_invalid_secret_preserved(self):
+        """Test that secrets that aren't valid base32 are kept verbatim"""
+        record = self.store.add("broken", "Issuer", "Name", "NOT-BASE32!")
+
+        self.assertIsNone(self.store.key(record))
+        self.assertEqual(self.store.secret(record), "NOT-BASE32!")
+        self.assertEqual(self.store.key_or_secret(record), "NOT-BASE32!")
+
+        record = self.store.add("spaced", "Issuer", "Name", "jbsw y3dp ehpk 3pxp")
+        self.assertEqual(self.store.secret(record), "jbsw y3dp ehpk 3pxp")
+        self.assertEqual(self.store.key(record), decode_secret("JBSWY3DPEHPK3PXP"))
+
+    def test_params_round_trip(self):
+        """Test that non-default TOTP parameters are stored and serialized"""
+        data = {"issuer": "I", "name": "N", "secret": "JBSWY3DPEHPK3PXP",
+                "created": "2024-01-01T00:00:00", "period": 60, "digits": 8, "algorithm": "SHA256"}
+        record = self.store.add_from_dict("token3", data)
+
+        self.assertEqual(record.params, (60, 8, "SHA256"))
+        self.assertEqual(self.store.record_to_dict(record), data)
+        self.assertNotIn("period", self.store.record_to_dict(self.store.get("token1")))
+        with self.assertRaises(ValueError):
+            self.store.add_from_dict("token4", dict(data, algorithm="MD5"))
+
+    def test_shares_secret(self):
+        """Test detection of duplicate secrets"""
+        record = self.store.get("token1")
+        self.assertFalse(self.store.shares_secret(record))
+
+        self.store.add("copy", "Issuer", "Name", "JBSWY3DPEHPK3PXP")
+        self.assertTrue(self.store.shares_secret(record))
+
+        # Replacing or removing the copy releases its reference
+        self.store.add("copy", "Issuer", "Name", "HXDMVJECJJWSRB3HWIZR4IFUGFTMXBOZ")
+        self.assertFalse(self.store.shares_secret(record))
+        self.assertTrue(self.store.shares_secret(self.store.get("token2")))
+        self.store.remove("copy")
+        self.assertFalse(self.store.shares_secret(self.store.get("token2")))
+
+        # Secrets that aren't valid base32 are counted by their raw string
+        invalid = self.store.add("bad1", "Issuer", "Name", "not base32!")
+        self.assertFalse(self.store.shares_secret(invalid))
+        self.store.add("bad2", "Issuer", "Name", "not base32!")
+        self.assertTrue(self.store.shares_secret(invalid))
+        self.store.clear()
+        self.assertFalse(self.store.shares_secret(self.store.add("token1", "Issuer", "Name", "JBSWY3DPEHPK3PXP")))
+
+    def test_sorted_records(self):
+        """Test that the sorted index follows adds, updates and removals"""
+        self.store.add("token3", "alpha", "zed", "JBSWY3DPEHPK3PXP")
+        self.store.add("token4", "Beta", "Account", "JBSWY3DPEHPK3PXP")
+
+        def order(ascending=True):
+            return [record.id for record in self.store.sorted_records(ascending)]
+
+        self.assertEqual(order(), ["token3", "token4", "token2", "token1"])
+        self.assertEqual(order(False), ["token1", "token2", "token4", "token3"])
+
+        self.store.update("token3", issuer="Zulu")
+        self.assertEqual(order(), ["token4", "token2", "token1", "token3"])
+
+        self.store.remove("token2")
+        self.assertEqual(order(), ["token4", "token1", "token3"])
+
+    def test_sorted_index_from_dict(self):
+        """Test that a store built in bulk has the same order as incremental inserts"""
+        incremental = TokenStore()
+        for token_id, data in reversed(list(self.tokens.items())):
+            incremental.add_from_dict(token_id, data)
+        self.assertEqual(
+            [record.id for record in self.store.sorted_records()],
+            [record.id for record in incremental.sorted_records()]
+        )
+
+    def test_changes_since(self):
+        """Test that changes_since reports only what changed after a version"""
+        version, reset, _, _, _ = self.store.changes_since(None)
+        self.assertTrue(reset)
+
+        self.store.add("token3", "New Issuer", "New Account", "ABCDEFGHIJKLMNOPQRSTUVWXYZ234567")
+        self.store.update("token1", name="Renamed")
+        self.store.remove("token2")
+
+        new_version, reset, added, changed, removed = self.store.changes_since(version)
+        self.assertFalse(reset)
+        self.assertEqual(new_version, version + 3)
+        self.assertEqual([record.id for record in added], ["token3"])
+        self.assertEqual([record.id for record in changed], ["token1"])
+        self.assertEqual(removed, ["token2"])
+
+        self.assertEqual(self.store.changes_since(new_version)[1:], (False, [], [], []))
+        self.assertTrue(self.store.changes_since(new_version + 1)[1])
+
+    def test_added_then_changed_is_added(self):
+        """Test that a token added and edited after a version is reported once as added"""
+        version = self.store.version
+        self.store.add("token3", "New Issuer", "New Account", "ABCDEFGHIJKLMNOPQRSTUVWXYZ234567")
+        self.store.update("token3", issuer="Other")
+
+        _, _, added, changed, removed = self.store.changes_since(version)
+        self.assertEqual([record.id for record in added], ["token3"])
+        self.assertEqual((changed, removed), ([], []))
+
+    def test_sync_from_dict(self):
+        """Test that syncing only versions tokens whose data changed"""
+        version = self.store.version
+        self.assertEqual(self.store.sync_from_dict(self.tokens), 0)
+        self.assertEqual(self.store.version, version)
+
+        tokens = dict(self.tokens)
+        tokens["token1"] = dict(tokens["token1"], name="Renamed")
+        del tokens["token2"]
+        tokens["token3"] = {"issuer": "I", "name": "N", "secret": "ABCDEFGHIJKLMNOPQRSTUVWXYZ234567"}
+        self.assertEqual(self.store.sync_from_dict(tokens), 3)
+
+        _, _, added, changed, removed = self.store.changes_since(version)
+        self.assertEqual([record.id for record in added], ["token3"])
+        self.assertEqual([record.id for record in changed], ["token1"])
+        self.assertEqual(removed, ["token2"])
+        self.assertEqual(self.store.get("token1").name, "Renamed")
+
+    def test_pruned_tombstones_force_reset(self):
+        """Test that versions older than the pruned tombstones require a reset"""
+        version = self.store.version
+        for i in range(TokenStore.MAX_TOMBSTONES + 1):
+            self.store.add(f"temp{i}", "Issuer", "Name", "JBSWY3DPEHPK3PXP")
+            self.store.remove(f"temp{i}")
+
+        self.assertTrue(self.store.changes_since(version)[1])
+        self.assertFalse(self.store.changes_since(self.store.version - 1)[1])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+import unittest
+import hashlib
+import pyotp
+from models.totp_engine import TotpBatchEngine, decode_secret, normalize_params, params_from_query, DEFAULT_PARAMS
+
+class TestTotpBatchEngine(unittest.TestCase):
+    """Test cases for the batched TOTP engine"""
+
+    def setUp(self):
+        """Set up test fixtures"""
+        self.secrets = [
+            "JBSWY3DPEHPK3PXP",
+            "HXDMVJECJJWSRB3HWIZR4IFUGFTMXBOZ",
+            "ABCDEFGHIJKLMNOPQRSTUVWXYZ234567"
+        ]
+        self.engine = TotpBatchEngine()
+
+    def test_codes_match_pyotp(self):
+        """Test that batch codes match pyotp for several timestamps"""
+        for timestamp in (0, 29, 30, 59, 1_700_000_000, 1_700_000_029.9):
+            expected = [pyotp.TOTP(s).at(timestamp) for s in self.secrets]
+            self.assertEqual(self.engine.codes_at(self.secrets, timestamp), expected)
+
+    def test_single_code_matches_pyotp(self):
+        """Test the single-secret helper"""
+        secret = self.secrets[0]
+        self.assertEqual(self.engine.code_at(secret, 1234567), pyotp.TOTP(secret).at(1234567))
+
+    def test_secret_decoded_once(self):
+        """Test that keys are cached after the first decode"""
+        key = self.engine.key_for(self.secrets[0])
+        self.assertIs(self.engine.key_for(self.secrets[0]), key)
+
+        self.engine.forget(self.secrets[0])
+        self.assertIsNot(self.engine.key_for(self.secrets[0]), key)
+
+    def test_decode_unpadded_lowercase_secret(self):
+        """Test that unpadded and lowercase secrets decode like pyotp"""
+        self.assertEqual(decode_secret("jbswy3dpehpk3pxp"), pyotp.TOTP("JBSWY3DPEHPK3PXP").byte_secret())
+
+    def test_invalid_secret_raises(self):
+        """Test that an invalid secret raises instead of producing a code"""
+        with self.assertRaises(Exception):
+            self.engine.key_for("NOT-BASE32!")
+
+    def test_normalize_params(self):
+        """Test otpauth parameter parsing and validation"""
+        self.assertEqual(normalize_params(), DEFAULT_PARAMS)
+        self.assertEqual(normalize_params("60", "8", "sha256"), (60, 8, "SHA256"))
+        self.assertIs(normalize_params(60, 8, "SHA256"), normalize_params("60", 8, "sha-256"))
+        self.assertEqual(params_from_query({"period": ["15"], "digits": ["7"]}), (15, 7, "SHA1"))
+        for bad in ({"period": 0}, {"digits": 4}, {"algorithm": "MD5"}, {"period": "abc"}):
+            with self.assertRaises(ValueError):
+                normalize_params(**bad)
+
+    def test_engine_for_params(self):
+        """Test that engines built from parameters match pyotp"""
+        params = normalize_params(60, 8, "SHA512")
+        engine = TotpBatchEngine.for_params(params)
+        totp = pyotp.TOTP(self.secrets[1], digits=8, digest=hashlib.sha512, interval=60)
+        self.assertEqual(engine.code_at(self.secrets[1], 1_700_000_000), totp.at(1_700_000_000))
+
+if __name__ == '__main__':
+    unittest.main()
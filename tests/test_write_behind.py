@@ -0,0 +1,64 @@
+import unittest
+import time
+from utils.write_behind import WriteBehind
+
+class TestWriteBehind(unittest.TestCase):
+    """Test cases for the debounced write-behind layer"""
+
+    def setUp(self):
+        """Set up test fixtures"""
+        self.saves = []
+        self.result = {"status": "success", "message": "Saved"}
+        self.writer = WriteBehind(self.save, delay=0.05, max_delay=0.5)
+
+    def tearDown(self):
+        """Tear down test fixtures"""
+        self.writer.close()
+
+    def save(self):
+        self.saves.append(time.monotonic())
+        return self.result
+
+    def test_changes_coalesce_into_one_write(self):
+        """Test that a burst of changes is written once after the debounce"""
+        for _ in range(50):
+            self.writer.mark_dirty()
+        self.assertTrue(self.writer.dirty)
+        self.assertEqual(self.saves, [])
+
+        time.sleep(0.3)
+        self.assertEqual(len(self.saves), 1)
+        self.assertFalse(self.writer.dirty)
+
+    def test_flush_is_a_barrier(self):
+        """Test that flush writes pending changes synchronously"""
+        self.writer.mark_dirty()
+        self.assertEqual(self.writer.flush()["status"], "success")
+        self.assertEqual(len(self.saves), 1)
+        self.assertFalse(self.writer.dirty)
+
+        # Nothing pending: no second write
+        self.writer.flush()
+        self.assertEqual(len(self.saves), 1)
+
+    def test_max_delay_bounds_continuous_changes(self):
+        """Test that a steady stream of changes is still written within max_delay"""
+        deadline = time.monotonic() + 0.8
+        while time.monotonic() < deadline and not self.saves:
+            self.writer.mark_dirty()
+            time.sleep(0.01)
+        self.assertEqual(len(self.saves), 1)
+
+    def test_failed_save_stays_dirty(self):
+        """Test that a failed save keeps the changes pending"""
+        self.result = {"status": "error", "message": "Disk full"}
+        self.writer.mark_dirty()
+        self.assertEqual(self.writer.flush()["status"], "error")
+        self.assertTrue(self.writer.dirty)
+
+        self.result = {"status": "success", "message": "Saved"}
+        self.assertEqual(self.writer.flush()["status"], "success")
+        self.assertFalse(self.writer.dirty)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -61,34 +61,101 @@ async function login() {
     const credential = document.getElementById('loginCredential').value;
     
     try {
-        const result = await window.pywebview.api.verify_authentication(credential);
-        if (result.status === 'success') {
-            document.getElementById('loginCredential').value = '';
-            isAuthenticated = true;
-            
-            // Ensure all icons are loaded before showing main page
-            await loadAllIcons();
-            
-            showMainPage();
-            startAuthCheck();
-
-            // Check for update info in the response
-            if (result.update_info && result.update_info.available) {
-                console.log("Update info found in auth response, showing update button...");
-                showUpdateNotification(result.update_info);
-            } else {
-                console.log("No update info found or update not available.");
-            }
-        } else {
-            // Use showNotification for login errors
-            showNotification(result.message, 'error'); 
+        // The credential is verified and the vault decrypted on a worker thread;
+        // progress and the result arrive through updateUnlockProgress and onUnlockComplete
+        const result = await window.pywebview.api.start_unlock(credential);
+        if (result.status !== 'success') {
+            showNotification(result.message, 'error');
+            return;
         }
+        document.getElementById('loginCredential').value = '';
+        showUnlockProgress();
+        
+        // Prepare the main page while the key is being derived
+        prepareMainPage();
     } catch (error) {
         console.error('Error during login:', error);
+        hideUnlockProgress();
         showNotification('Login failed', 'error');
     }
 }
 
+// Load icons and show placeholder cards so the main page is ready when the vault opens
+function prepareMainPage() {
+    loadAllIcons();
+    
+    const tokenList = document.getElementById('tokenList');
+    if (tokenList && !tokenList.querySelector('.token-card')) {
+        tokenList.innerHTML = '';
+        for (let i = 0; i < 3; i++) {
+            const skeleton = document.createElement('div');
+            skeleton.className = 'token-skeleton';
+            tokenList.appendChild(skeleton);
+        }
+    }
+}
+
+// Show the unlock progress on the login page
+function showUnlockProgress() {
+    document.getElementById('loginBtn').disabled = true;
+    document.getElementById('loginCredential').disabled = true;
+    document.getElementById('unlockProgressBar').style.width = '0%';
+    document.getElementById('unlockProgressStatus').textContent = 'Verifying...';
+    document.getElementById('unlockProgress').style.display = 'flex';
+}
+
+// Hide the unlock progress and re-enable the login form
+function hideUnlockProgress() {
+    document.getElementById('unlockProgress').style.display = 'none';
+    document.getElementById('loginBtn').disabled = false;
+    document.getElementById('loginCredential').disabled = false;
+}
+
+// Function called by Python backend at each unlock stage
+function updateUnlockProgress(stage, percentage) {
+    const labels = {
+        verifying: 'Verifying...',
+        calibrating: 'Tuning key derivation for this device...',
+        decrypting: 'Decrypting tokens...',
+        ready: 'Opening...'
+    };
+    document.getElementById('unlockProgressStatus').textContent = labels[stage] || stage;
+    document.getElementById('unlockProgressBar').style.width = percentage + '%';
+}
+
+// Function called by Python backend when the unlock finished, failed or was cancelled
+function onUnlockComplete(result) {
+    hideUnlockProgress();
+    if (result.status === 'success') {
+        isAuthenticated = true;
+        showMainPage();
+        startAuthCheck();
+
+        // Check for update info in the response
+        if (result.update_info && result.update_info.available) {
+            console.log("Update info found in auth response, showing update button...");
+            showUpdateNotification(result.update_info);
+        } else {
+            console.log("No update info found or update not available.");
+        }
+    } else if (result.status === 'cancelled') {
+        document.getElementById('loginCredential').focus();
+    } else {
+        // Use showNotification for login errors
+        showNotification(result.message, 'error');
+        document.getElementById('loginCredential').focus();
+    }
+}
+
+// Cancel the unlock in progress
+async function cancelUnlock() {
+    try {
+        await window.pywebview.api.cancel_unlock();
+    } catch (error) {
+        console.error('Error cancelling unlock:', error);
+    }
+}
+
 // Show or hide protection forms based on current status
 async function updateProtectionForms() {
     try {
@@ -1,5 +1,6 @@
 // Global variables
 let tokens = [];
+let tokenVersion = null; // Version of the token list held in `tokens` (see get_token_changes)
 let searchTerm = '';
 let sortAscending = true;
 let isAuthenticated = false;
@@ -9,6 +10,7 @@ let authCheckInterval;  // Interval for checking auth timeout
 let apiReady = false; // Flag to track API readiness
 let pagesLoaded = false; // Flag to track if pages are loaded
 let currentQRScanner = null; // QR scanner instance
+let nextCodePreviewEnabled = null; // Cached next code preview setting (null until loaded)
 
 // Initialize the application
 document.addEventListener('DOMContentLoaded', function() {
@@ -124,6 +126,11 @@ document.addEventListener('allPagesLoaded', function() {
     if (importFromGoogleAuthBtn) {
         importFromGoogleAuthBtn.addEventListener('click', importFromGoogleAuth);
     }
+
+    const importEncryptedExportBtn = document.getElementById('importEncryptedExportBtn');
+    if (importEncryptedExportBtn) {
+        importEncryptedExportBtn.addEventListener('click', importEncryptedExport);
+    }
     
     // App protection settings
     const appProtectionBtn = document.getElementById('appProtectionBtn');
@@ -157,6 +164,11 @@ document.addEventListener('allPagesLoaded', function() {
         loginBtn.addEventListener('click', login);
     }
     
+    const unlockCancelBtn = document.getElementById('unlockCancelBtn');
+    if (unlockCancelBtn) {
+        unlockCancelBtn.addEventListener('click', cancelUnlock);
+    }
+    
     const loginCredential = document.getElementById('loginCredential');
     if (loginCredential) {
         loginCredential.addEventListener('keypress', function(e) {
@@ -254,6 +266,11 @@ document.addEventListener('allPagesLoaded', function() {
     if (exportTokensBtn) {
         exportTokensBtn.addEventListener('click', exportTokens);
     }
+    
+    const exportCancelBtn = document.getElementById('exportCancelBtn');
+    if (exportCancelBtn) {
+        exportCancelBtn.addEventListener('click', cancelExport);
+    }
 
     // Load settings
     loadMinimizeToTraySetting();
@@ -7,10 +7,14 @@ async function exportTokens() {
             return;
         }
 
-        // Export tokens using native file dialog
-        const result = await window.pywebview.api.export_tokens_to_json();
+        // Export tokens using native file dialog (progress is pushed to updateExportProgress)
+        const exportFormat = document.getElementById('exportFormatSelect').value;
+        const passwordInput = document.getElementById('exportPasswordInput');
+        const result = await window.pywebview.api.export_tokens(exportFormat, passwordInput.value || null);
+        hideExportProgress();
         
         if (result.status === 'success') {
+            passwordInput.value = '';
             showNotification(result.message, 'success');
         } else if (result.status === 'cancelled') {
             // User cancelled the file dialog, no need to show notification
@@ -19,10 +23,20 @@ async function exportTokens() {
             showNotification(result.message, 'error');
         }
     } catch (error) {
+        hideExportProgress();
         showNotification('Error exporting tokens: ' + error, 'error');
     }
 }
 
+// Cancel the export in progress
+async function cancelExport() {
+    try {
+        await window.pywebview.api.cancel_export();
+    } catch (error) {
+        console.error('Error cancelling export:', error);
+    }
+}
+
 // Import from WinOTP
 function importFromWinOTP() {
     // Create a hidden file input element
@@ -244,6 +258,77 @@ function importFromAuthenticatorPlugin() {
     fileInput.click();
 }
 
+// Import from an encrypted export or cloud backup
+function importEncryptedExport() {
+    const passwordInput = document.getElementById('importPasswordInput');
+    if (!passwordInput.value) {
+        showNotification('Enter the password the export was encrypted with', 'error');
+        passwordInput.focus();
+        return;
+    }
+
+    // Create a hidden file input element
+    const fileInput = document.createElement('input');
+    fileInput.type = 'file';
+    fileInput.accept = '.enc'; // Accept encrypted exports and backups
+    fileInput.style.display = 'none';
+    document.body.appendChild(fileInput);
+
+    // Add event listener for file selection
+    fileInput.addEventListener('change', async function(event) {
+        const file = event.target.files[0];
+        if (!file) {
+            if (document.body.contains(fileInput)) {
+                document.body.removeChild(fileInput);
+            }
+            return;
+        }
+
+        const reader = new FileReader();
+        reader.onload = async function(e) {
+            // Show Progress UI
+            document.getElementById('importTokensPage').style.display = 'none';
+            const progressPage = document.getElementById('importProgressPage');
+            progressPage.style.display = 'block';
+            updateImportProgress(0, '?', 0);
+
+            try {
+                if (!window.pywebview || !window.pywebview.api) {
+                    console.error("pywebview API not available");
+                    throw new Error("API not available");
+                }
+
+                // The file is sent as a data URL; it is decrypted by the backend
+                const result = await window.pywebview.api.import_encrypted_export(e.target.result, passwordInput.value);
+                progressPage.style.display = 'none';
+                showNotification(result.message || 'Import finished', result.status === 'success' ? 'success' : (result.status === 'warning' ? 'warning' : 'error'));
+
+                if (result.status === 'success') {
+                    passwordInput.value = '';
+                    showMainPage();
+                    await forceReloadTokens();
+                } else {
+                    showImportTokensPage();
+                }
+            } catch (error) {
+                console.error("Error during encrypted export import:", error);
+                progressPage.style.display = 'none';
+                showNotification('Error importing encrypted export: ' + (error.message || error), 'error');
+                showImportTokensPage();
+            } finally {
+                if (document.body.contains(fileInput)) {
+                    document.body.removeChild(fileInput);
+                }
+            }
+        };
+
+        reader.readAsDataURL(file);
+    });
+
+    // Trigger file selection dialog
+    fileInput.click();
+}
+
 // Import from Google Authenticator
 function importFromGoogleAuth() {
     // Switch to Google Auth import page
@@ -324,6 +409,13 @@ function initializeGoogleAuthQrScanner() {
                                             <span class="success-icon">✔</span> <!-- Simple checkmark icon -->
                                             QR Code scanned successfully! ${result.tokens_count} tokens found.
                                         </div>`;
+                                    if (result.unsupported_count) {
+                                        // Entries the app can't generate codes for (MD5) were left out
+                                        const skippedNote = document.createElement('p');
+                                        skippedNote.className = 'error-message';
+                                        skippedNote.textContent = `${result.unsupported_count} tokens use MD5, which isn't supported, and were skipped.`;
+                                        qrScannerArea.appendChild(skippedNote);
+                                    }
                                     
                                     // Reset file input
                                     fileInput.value = '';
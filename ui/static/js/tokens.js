@@ -18,34 +18,36 @@ async function loadTokens() {
         }
         
         console.log('Loading all tokens from backend...');
-        const result = await window.pywebview.api.get_tokens();
-        console.log('API get_tokens result:', result);
-        tokens = result;
+        const result = await window.pywebview.api.get_token_changes(null);
+        console.log('API get_token_changes result:', result);
+        if (result.status !== 'success') {
+            throw new Error(result.message);
+        }
+        tokens = result.tokens;
+        tokenVersion = result.version;
         
         // Set the flag indicating tokens have been loaded
         tokensLoaded = true;
         
         // Clear next codes cache when loading all tokens
         Object.keys(nextCodes).forEach(key => delete nextCodes[key]);
+        tokens.forEach(token => {
+            if (token.nextCode) nextCodes[token.id] = token.nextCode;
+        });
         
-        // Prefetch next codes for all tokens
-        const nextCodePromises = tokens.map(async token => {
+        // The preview setting is read once and kept in sync by the settings page
+        if (nextCodePreviewEnabled === null) {
             try {
-                const nextCodeResult = await window.pywebview.api.get_next_code(token.id);
-                if (nextCodeResult.status === 'success' && nextCodeResult.code) {
-                    nextCodes[token.id] = nextCodeResult.code;
-                }
+                nextCodePreviewEnabled = !!(await window.pywebview.api.get_setting('next_code_preview_enabled'));
             } catch (error) {
-                console.error(`Failed to prefetch next code for token ${token.id}:`, error);
+                nextCodePreviewEnabled = false;
             }
-        });
-        
-        // Wait for all next codes to be prefetched
-        await Promise.all(nextCodePromises);
+        }
         
         await renderTokens();
         
-        // Start update interval if not already started
+        // Start the local countdown if not already started; new codes are pushed
+        // by the backend at each window boundary (see applyPushedCodes)
         if (!updateInterval) {
             updateInterval = setInterval(updateVisuals, 1000);
         }
@@ -59,7 +61,7 @@ async function loadTokens() {
         if (!cachedCrossIcon) loadCrossIcon();
         if (!cachedEditIcon) loadEditIcon();
         
-        return result;
+        return tokens;
     } catch (error) {
         console.error('Error loading tokens:', error);
         return [];
@@ -68,58 +70,148 @@ async function loadTokens() {
 
 // Force reload tokens (used when tokens have been modified)
 async function forceReloadTokens() {
+    // Only fetch what changed since the list we already have
+    if (tokensLoaded && tokenVersion !== null) {
+        try {
+            if (await applyTokenChanges()) {
+                return tokens;
+            }
+        } catch (error) {
+            console.error('Failed to apply token changes, reloading all tokens:', error);
+        }
+    }
+    
     // Reset the loaded flag to force a reload
     tokensLoaded = false;
     return await loadTokens();
 }
 
-// Update only visual elements (progress bar and timer) every second
+// Compare strings by code point, the way the backend (Python) compares them
+function compareCodePoints(a, b) {
+    const length = Math.min(a.length, b.length);
+    for (let i = 0; i < length; i++) {
+        if (a.charCodeAt(i) !== b.charCodeAt(i)) {
+            return a.codePointAt(i) - b.codePointAt(i);
+        }
+    }
+    return a.length - b.length;
+}
+
+// Order used for the token list: the key of the backend's sorted index
+// (casefolded issuer, casefolded name, insertion sequence)
+function compareTokens(a, b) {
+    const x = a.sortKey;
+    const y = b.sortKey;
+    const compareResult = compareCodePoints(x[0], y[0]) || compareCodePoints(x[1], y[1]) || x[2] - y[2];
+    return sortAscending ? compareResult : -compareResult;
+}
+
+// Apply the tokens added, changed and removed since tokenVersion, touching only their cards.
+// Returns false if the caller should fall back to a full reload.
+async function applyTokenChanges() {
+    const result = await window.pywebview.api.get_token_changes(tokenVersion);
+    if (result.status !== 'success') {
+        return false;
+    }
+    
+    if (result.reset) {
+        tokens = result.tokens;
+        tokenVersion = result.version;
+        Object.keys(nextCodes).forEach(key => delete nextCodes[key]);
+        tokens.forEach(token => {
+            if (token.nextCode) nextCodes[token.id] = token.nextCode;
+        });
+        await renderTokens();
+        return true;
+    }
+    
+    const tokenList = document.getElementById('tokenList');
+    const removedIds = new Set(result.removed);
+    result.changed.forEach(token => removedIds.add(token.id));
+    
+    if (removedIds.size > 0) {
+        tokens = tokens.filter(token => !removedIds.has(token.id));
+        result.removed.forEach(tokenId => delete nextCodes[tokenId]);
+    }
+    
+    // Cards are patched in place unless the list shows a placeholder or search results
+    const patchDom = !searchTerm && tokenList && !tokenList.querySelector('.welcome-message');
+    if (patchDom) {
+        removedIds.forEach(tokenId => {
+            const card = document.getElementById(`token-${tokenId}`);
+            if (card) card.remove();
+        });
+    }
+    
+    // Changed tokens are re-inserted because a new issuer or name may move them
+    for (const token of result.added.concat(result.changed)) {
+        let low = 0;
+        let high = tokens.length;
+        while (low < high) {
+            const mid = (low + high) >> 1;
+            if (compareTokens(tokens[mid], token) <= 0) {
+                low = mid + 1;
+            } else {
+                high = mid;
+            }
+        }
+        tokens.splice(low, 0, token);
+        if (token.nextCode) nextCodes[token.id] = token.nextCode;
+        
+        if (patchDom) {
+            const following = low + 1 < tokens.length
+                ? document.getElementById(`token-${tokens[low + 1].id}`)
+                : null;
+            tokenList.insertBefore(createTokenCard(token), following);
+        }
+    }
+    
+    tokenVersion = result.version;
+    if (!patchDom || tokens.length === 0) {
+        await renderTokens();
+    }
+    return true;
+}
+
+// Update only visual elements (progress bar and timer) every second.
+// This makes no bridge calls: the backend pushes new codes at each boundary.
 function updateVisuals() {
     // Skip if no tokens
     if (!tokens || tokens.length === 0) return;
     
-    // Track expired tokens for batch refresh
-    let expiredTokens = [];
+    let hasExpired = false;
     
     // Update each token's remaining time
     tokens.forEach(token => {
         if (token.timeRemaining > 0) {
             token.timeRemaining -= 1;
-            
-            // Always update the display for tokens with positive time
             updateTokenDisplay(token);
-            
-            // If time is about to expire (0 seconds left), add to expired tokens
-            if (token.timeRemaining <= 0) {
-                expiredTokens.push(token);
-            } 
-            // If the token is close to expiring (5 seconds), make sure we have the next code ready
-            else if (token.timeRemaining === 5) {
-                // Clear any cached next code to ensure we get a fresh one
-                delete nextCodes[token.id];
-                // Pre-fetch the next code
-                fetchAndUpdateNextCode(token.id);
-            }
-        } else if (token.timeRemaining <= 0 && !expiredTokens.includes(token)) {
-            // Add any already expired tokens that haven't been refreshed yet
-            expiredTokens.push(token);
+        }
+        if (token.timeRemaining <= 0) {
+            hasExpired = true;
         }
     });
     
-    // If we have expired tokens, trigger a refresh
-    if (expiredTokens.length > 0) {
-        // If more than 50% of tokens are expiring at once, there's likely a synchronization
-        // where all tokens refresh at the same time - this is when CPU spikes occur
-        if (expiredTokens.length > Math.max(1, tokens.length * 0.5)) {
-            console.log(`Batch refreshing ${expiredTokens.length} tokens (${Math.round(expiredTokens.length/tokens.length*100)}% of total)`);
+    // Only ask the backend ourselves if a pushed rollover didn't arrive in time
+    if (hasExpired) {
+        expiredSeconds += 1;
+        if (expiredSeconds >= PUSH_GRACE_SECONDS) {
+            console.log('No code push received after rollover, requesting a snapshot');
+            expiredSeconds = 0;
+            refreshTokens();
         }
-        refreshTokens();
+    } else {
+        expiredSeconds = 0;
     }
 }
 
 // Store next codes for each token
 const nextCodes = {};
 
+// Seconds tokens have been expired without a pushed rollover
+let expiredSeconds = 0;
+const PUSH_GRACE_SECONDS = 3;
+
 // Last batch refresh timestamp to prevent frequent API calls
 let lastBatchRefreshTime = 0;
 const MIN_BATCH_REFRESH_INTERVAL = 500; // Minimum milliseconds between refreshes
@@ -152,63 +244,16 @@ async function refreshTokens() {
         // Update refresh timestamp
         lastBatchRefreshTime = now;
         
-        // Extract token IDs for batch refresh
-        const tokenIds = expiredTokens.map(token => token.id);
-        console.log(`Refreshing ${tokenIds.length} tokens in batch`);
-        
-        // Use the new batch API endpoint
-        const batchResult = await window.pywebview.api.batch_get_token_codes(tokenIds);
-        
-        if (batchResult.status === 'success') {
-            // Process batch results
-            for (const tokenId in batchResult.results) {
-                const result = batchResult.results[tokenId];
-                if (result.status === 'success') {
-                    // Find the token in our array and update it
-                    const tokenIndex = tokens.findIndex(t => t.id === result.id);
-                    if (tokenIndex !== -1) {
-                        // Important: Clear the nextCodes cache for this token when a code refreshes
-                        // because the current code becomes the old "next code"
-                        delete nextCodes[tokenId];
-                        
-                        tokens[tokenIndex].code = result.code;
-                        tokens[tokenIndex].timeRemaining = result.timeRemaining;
-                        
-                        // Store the next code from the batch result
-                        if (result.nextCode) {
-                            nextCodes[tokenId] = result.nextCode;
-                        } else {
-                            // If nextCode isn't provided in batch result, fetch it separately
-                            fetchAndUpdateNextCode(tokenId);
-                        }
-                    }
-                } else {
-                    console.error(`Error refreshing token ${tokenId}:`, result.message);
-                }
-            }
-            
-            // Check if we have a search filter active
-            const isSearchActive = searchTerm && searchTerm.length > 0;
-            
-            // Only update existing tokens, full render if token collection changed
-            if (!isSearchActive) {
-                // Just update the dynamic content for all tokens
-                tokens.forEach(updateTokenDisplay);
-            } else {
-                // When search is active, only update the currently displayed tokens
-                // to avoid flickering and maintain search results
-                const displayedTokenCards = document.querySelectorAll('.token-card');
-                const displayedTokenIds = Array.from(displayedTokenCards).map(card => card.id.replace('token-', ''));
-                
-                displayedTokenIds.forEach(id => {
-                    const token = tokens.find(t => t.id === id);
-                    if (token) {
-                        updateTokenDisplay(token);
-                    }
-                });
-            }
+        console.log(`Refreshing ${expiredTokens.length} expired tokens from a code snapshot`);
+        
+        // One columnar snapshot for the whole vault, read at a single instant
+        const snapshot = await window.pywebview.api.get_code_snapshot();
+        
+        if (snapshot.status === 'success') {
+            applyCodeSnapshot(snapshot);
+            updateDisplayedTokens();
         } else {
-            console.error('Error in batch token refresh:', batchResult.message);
+            console.error('Error in code snapshot refresh:', snapshot.message);
             
             // Fallback to old method if batch fails
             fallbackRefreshTokens(expiredTokens);
@@ -226,15 +271,61 @@ async function refreshTokens() {
     }
 }
 
-// Helper function to fetch and update next code
-async function fetchAndUpdateNextCode(tokenId) {
-    try {
-        const nextCodeResult = await window.pywebview.api.get_next_code(tokenId);
-        if (nextCodeResult.status === 'success' && nextCodeResult.code) {
-            nextCodes[tokenId] = nextCodeResult.code;
+// Apply a columnar code snapshot (from get_code_snapshot) to the in-memory tokens
+function applyCodeSnapshot(snapshot) {
+    const byId = new Map(tokens.map(token => [token.id, token]));
+    
+    for (let i = 0; i < snapshot.ids.length; i++) {
+        const token = byId.get(snapshot.ids[i]);
+        if (!token) continue;
+        
+        // With several periods each token's window ends with its period's window
+        const windowEnd = snapshot.periods
+            ? snapshot.windowEnds[snapshot.periods[i]]
+            : snapshot.windowEnd;
+        
+        token.code = snapshot.codes[i];
+        token.timeRemaining = Math.floor(windowEnd - snapshot.time);
+        
+        // The current code replaces the old "next code"
+        nextCodes[token.id] = snapshot.nextCodes[i];
+    }
+    
+    if (snapshot.errors) {
+        for (const tokenId in snapshot.errors) {
+            console.error(`Error refreshing token ${tokenId}:`, snapshot.errors[tokenId]);
         }
-    } catch (error) {
-        console.error(`Failed to fetch next code for token ${tokenId}:`, error);
+    }
+}
+
+// Called by the backend (evaluate_js) with a new snapshot at each window boundary
+function applyPushedCodes(snapshot) {
+    if (!tokens || tokens.length === 0) return;
+    applyCodeSnapshot(snapshot);
+    expiredSeconds = 0;
+    updateDisplayedTokens();
+}
+
+// Update the dynamic content of the tokens currently on screen
+function updateDisplayedTokens() {
+    // Check if we have a search filter active
+    const isSearchActive = searchTerm && searchTerm.length > 0;
+    
+    if (!isSearchActive) {
+        // Just update the dynamic content for all tokens
+        tokens.forEach(updateTokenDisplay);
+    } else {
+        // When search is active, only update the currently displayed tokens
+        // to avoid flickering and maintain search results
+        const displayedTokenCards = document.querySelectorAll('.token-card');
+        const displayedTokenIds = Array.from(displayedTokenCards).map(card => card.id.replace('token-', ''));
+        
+        displayedTokenIds.forEach(id => {
+            const token = tokens.find(t => t.id === id);
+            if (token) {
+                updateTokenDisplay(token);
+            }
+        });
     }
 }
 
@@ -321,7 +412,7 @@ async function updateTokenDisplay(token) {
         
         // Update progress bar and timer
         const timeRemaining = token.timeRemaining;
-        const progressPercentage = (timeRemaining / 30) * 100;
+        const progressPercentage = (timeRemaining / (token.period || 30)) * 100;
         
         progressElement.style.width = `${progressPercentage}%`;
         progressElement.className = `token-progress-bar${timeRemaining <= 5 ? ' warning' : ''}`;
@@ -331,26 +422,10 @@ async function updateTokenDisplay(token) {
         
         // We'll only check for next code preview when time remaining is 5 seconds or less
         if (timeRemaining <= 5) {
-            // Get the next code preview setting
-            const nextCodePreviewEnabled = await window.pywebview.api.get_setting('next_code_preview_enabled');
-
             // Only show next code preview if enabled
             if (nextCodePreviewEnabled) {
-                let nextCode;
-                
-                // Check if we already have the next code for this token
-                // OR fetch a new one if it's very close to expiration (more accurate)
-                if (nextCodes[token.id] && timeRemaining > 2) {
-                    nextCode = nextCodes[token.id];
-                } else {
-                    // When very close to expiration, always fetch the latest next code
-                    const nextCodeResult = await window.pywebview.api.get_next_code(token.id);
-                    if (nextCodeResult.status === 'success' && nextCodeResult.code) {
-                        nextCode = nextCodeResult.code;
-                        // Store for future use
-                        nextCodes[token.id] = nextCode;
-                    }
-                }
+                // Next codes arrive with every snapshot, so no bridge call is needed here
+                const nextCode = nextCodes[token.id];
                 
                 // If we have a next code, display it
                 if (nextCode) {
@@ -394,6 +469,62 @@ async function updateTokenDisplay(token) {
     }
 }
 
+// Build the card element for one token
+function createTokenCard(token) {
+    const tokenCard = document.createElement('div');
+    tokenCard.className = 'token-card';
+    tokenCard.id = `token-${token.id}`;
+    
+    tokenCard.innerHTML = `
+        <div class="token-header">
+            <div class="token-info">
+                <div class="token-issuer">${escapeHtml(token.issuer)}</div>
+                <div class="token-name">${escapeHtml(token.name)}</div>
+            </div>
+            <div class="token-actions">
+                <button class="btn btn-icon" onclick="toggleEditMode('${token.id}')">
+                    ${cachedEditIcon ? `<img src="data:image/png;base64,${cachedEditIcon}" alt="Edit token" width="20" height="20">` : '✏️'}
+                </button>
+                <button class="btn btn-icon" onclick="deleteToken('${token.id}')">
+                    ${cachedCrossIcon ? `<img src="data:image/png;base64,${cachedCrossIcon}" alt="Delete token" width="20" height="20">` : '🗑️'}
+                </button>
+            </div>
+        </div>
+        <div class="token-edit-form" id="edit-form-${token.id}" style="display: none;">
+            <div class="form-group">
+                <label for="editTokenIssuer-${token.id}">Issuer:</label>
+                <input type="text" id="editTokenIssuer-${token.id}" value="${escapeHtml(token.issuer)}" />
+            </div>
+            <div class="form-group">
+                <label for="editTokenName-${token.id}">Account Name:</label>
+                <input type="text" id="editTokenName-${token.id}" value="${escapeHtml(token.name)}" />
+            </div>
+            <div class="form-actions">
+                <button class="btn" onclick="saveTokenEdit('${token.id}')">Save</button>
+                <button class="btn btn-secondary" onclick="toggleEditMode('${token.id}')">Cancel</button>
+            </div>
+        </div>
+        <div class="token-code" id="code-${token.id}">
+            <div class="codes-container">
+                <div class="code-line">
+                    <span class="current-code">${formatCode(token.code)}</span>
+                    <button class="copy-button" onclick="copyCode('${token.id}')">
+                        ${cachedCopyIcon ? `<img src="data:image/png;base64,${cachedCopyIcon}" alt="Copy" width="16" height="16">` : '📋'}
+                    </button>
+                </div>
+            </div>
+        </div>
+        <div class="token-footer">
+            <div class="token-progress-container">
+                <div class="token-progress-bar" id="progress-${token.id}" style="width: ${(token.timeRemaining / (token.period || 30)) * 100}%"></div>
+            </div>
+            <div class="time-remaining" id="timer-${token.id}">${Math.ceil(token.timeRemaining)}s</div>
+        </div>
+    `;
+    
+    return tokenCard;
+}
+
 // Render tokens to the DOM
 async function renderTokens() {
     const tokenList = document.getElementById('tokenList');
@@ -426,10 +557,7 @@ async function renderTokens() {
         token.name.toLowerCase().includes(searchTerm)
     );
 
-    filteredTokens.sort((a, b) => {
-        const compareResult = a.issuer.localeCompare(b.issuer);
-        return sortAscending ? compareResult : -compareResult;
-    });
+    filteredTokens.sort(compareTokens);
 
     // Check if there are no tokens to display
     if (filteredTokens.length === 0) {
@@ -463,57 +591,7 @@ async function renderTokens() {
     }
 
     filteredTokens.forEach(token => {
-        const tokenCard = document.createElement('div');
-        tokenCard.className = 'token-card';
-        tokenCard.id = `token-${token.id}`;
-        
-        tokenCard.innerHTML = `
-            <div class="token-header">
-                <div class="token-info">
-                    <div class="token-issuer">${escapeHtml(token.issuer)}</div>
-                    <div class="token-name">${escapeHtml(token.name)}</div>
-                </div>
-                <div class="token-actions">
-                    <button class="btn btn-icon" onclick="toggleEditMode('${token.id}')">
-                        ${cachedEditIcon ? `<img src="data:image/png;base64,${cachedEditIcon}" alt="Edit token" width="20" height="20">` : '✏️'}
-                    </button>
-                    <button class="btn btn-icon" onclick="deleteToken('${token.id}')">
-                        ${cachedCrossIcon ? `<img src="data:image/png;base64,${cachedCrossIcon}" alt="Delete token" width="20" height="20">` : '🗑️'}
-                    </button>
-                </div>
-            </div>
-            <div class="token-edit-form" id="edit-form-${token.id}" style="display: none;">
-                <div class="form-group">
-                    <label for="editTokenIssuer-${token.id}">Issuer:</label>
-                    <input type="text" id="editTokenIssuer-${token.id}" value="${escapeHtml(token.issuer)}" />
-                </div>
-                <div class="form-group">
-                    <label for="editTokenName-${token.id}">Account Name:</label>
-                    <input type="text" id="editTokenName-${token.id}" value="${escapeHtml(token.name)}" />
-                </div>
-                <div class="form-actions">
-                    <button class="btn" onclick="saveTokenEdit('${token.id}')">Save</button>
-                    <button class="btn btn-secondary" onclick="toggleEditMode('${token.id}')">Cancel</button>
-                </div>
-            </div>
-            <div class="token-code" id="code-${token.id}">
-                <div class="codes-container">
-                    <div class="code-line">
-                        <span class="current-code">${formatCode(token.code)}</span>
-                        <button class="copy-button" onclick="copyCode('${token.id}')">
-                            ${cachedCopyIcon ? `<img src="data:image/png;base64,${cachedCopyIcon}" alt="Copy" width="16" height="16">` : '📋'}
-                        </button>
-                    </div>
-                </div>
-            </div>
-            <div class="token-footer">
-                <div class="token-progress-container">
-                    <div class="token-progress-bar" id="progress-${token.id}" style="width: ${(token.timeRemaining / 30) * 100}%"></div>
-                </div>
-                <div class="time-remaining" id="timer-${token.id}">${Math.ceil(token.timeRemaining)}s</div>
-            </div>
-        `;
-        
+        const tokenCard = createTokenCard(token);
         tokenList.appendChild(tokenCard);
         
         // Restore animation states if available
@@ -585,7 +663,6 @@ async function copyCode(tokenId) {
             
             // Only check for next code if the timer is almost expired
             if (token.timeRemaining <= 5) {
-                const nextCodePreviewEnabled = await window.pywebview.api.get_setting('next_code_preview_enabled');
                 if (nextCodePreviewEnabled) {
                     // Use cached next code if available
                     if (nextCodes[token.id]) {
@@ -821,17 +898,8 @@ async function saveTokenEdit(tokenId) {
             showNotification(result.message, 'success');
             toggleEditMode(tokenId); // Hide edit form
             
-            // Update the token in our local array
-            const tokenIndex = tokens.findIndex(t => t.id === tokenId);
-            if (tokenIndex !== -1) {
-                tokens[tokenIndex].issuer = issuer || 'Unknown';
-                tokens[tokenIndex].name = name || 'Unknown';
-                // Re-render the tokens to show changes
-                await renderTokens();
-            } else {
-                // If token not found in local array, force reload all tokens
-                await forceReloadTokens();
-            }
+            // The changed token comes back with its new sort key and is moved into place
+            await forceReloadTokens();
         } else {
             showNotification(result.message, 'error');
         }
@@ -100,7 +100,7 @@ async function showSettingsPage() {
             authStatusResult,
             minimizeResult,
             updateCheckEnabled,
-            nextCodePreviewEnabled,
+            nextCodePreviewSetting,
             runAtStartupEnabled,
             backupToGoogleDriveEnabled,
             backupToOneDriveEnabled,
@@ -150,7 +150,7 @@ async function showSettingsPage() {
         document.getElementById('updateCheckerToggle').checked = updateCheckEnabled !== undefined ? updateCheckEnabled : true;
 
         // Apply next code preview setting
-        document.getElementById('nextCodePreviewToggle').checked = nextCodePreviewEnabled !== undefined ? nextCodePreviewEnabled : false;
+        document.getElementById('nextCodePreviewToggle').checked = nextCodePreviewSetting !== undefined ? nextCodePreviewSetting : false;
 
         // Apply run at startup setting
         const runAtStartupToggleElement = document.getElementById('runAtStartupToggle');
@@ -328,6 +328,7 @@ async function showSettingsPage() {
                     await waitForPywebviewApi();
                     const result = await window.pywebview.api.set_next_code_preview(e.target.checked);
                     if (result.status === 'success') {
+                        nextCodePreviewEnabled = e.target.checked;
                         showNotification(result.message, 'success');
                     } else {
                         showNotification(result.message, 'error');
@@ -579,6 +580,31 @@ function updateImportProgress(current, total, percentage) {
     document.getElementById('importProgressCount').textContent = `(${current}/${total})`;
 }
 
+// Function called by Python backend while an export is written
+function updateExportProgress(current, total, percentage) {
+    const progressPage = document.getElementById('importProgressPage');
+    if (progressPage.style.display !== 'block') {
+        document.getElementById('settingsPage').style.display = 'none';
+        document.getElementById('importProgressTitle').textContent = 'Exporting Tokens...';
+        document.getElementById('importProgressStatus').textContent = 'Writing export file...';
+        document.getElementById('exportCancelBtn').style.display = 'inline-block';
+        progressPage.style.display = 'block';
+    }
+    updateImportProgress(current, total, percentage);
+}
+
+// Hide the export progress page and restore it for imports
+function hideExportProgress() {
+    const progressPage = document.getElementById('importProgressPage');
+    if (progressPage.style.display === 'block') {
+        progressPage.style.display = 'none';
+        document.getElementById('settingsPage').style.display = 'block';
+    }
+    document.getElementById('importProgressTitle').textContent = 'Importing Tokens...';
+    document.getElementById('importProgressStatus').textContent = 'Starting import...';
+    document.getElementById('exportCancelBtn').style.display = 'none';
+}
+
 // Function called by Python backend to update progress
 function updateProgress(data) {
     if (!data) return;
@@ -1,7 +1,14 @@
 import os
+import hmac
 import json
+import base64
 import hashlib
-from .file_io import read_json, write_json
+import threading
+from .file_io import read_json, write_json, file_signature, _freeze
+from .crypto import (
+    DEFAULT_KDF_PARAMS, derive_credential_keys, kdf_params, new_salt, vault_session,
+    KDF_TARGET_SECONDS, calibrate_kdf, set_kdf_target, kdf_target, kdf_outdated
+)
 from argon2 import PasswordHasher
 from argon2.exceptions import VerifyMismatchError
 
@@ -10,49 +17,207 @@ from argon2.exceptions import VerifyMismatchError
 _current_auth_path = None
 _password_hasher = PasswordHasher()
 
+# Hashes made with the vault key derivation start with this; older ones are plain Argon2 hashes
+_CREDENTIAL_HASH_PREFIX = "$winotp-argon2id-hkdf$"
+
+class AuthState:
+    """
+    The auth config, kept in memory until the file changes
+    
+    Whether protection is enabled, its type and the timeout are checked by every
+    auth status poll and before every vault access, so they are answered from
+    this snapshot rather than the file. It is loaded on first use and replaced
+    by the setters with the config they wrote. Changes made by anything else
+    are picked up on the next access: with a file watcher attached (see
+    ``attach``), its notification marks the snapshot stale, so unchanged
+    checks touch no file at all; without one, a single ``os.stat`` compares
+    the file signature.
+    """
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._path = None
+        self._config = None     # read-only config, None until loaded or after a change
+        self._signature = None  # file signature the config was read at
+        self._changes = 0       # bumped by every invalidation, so a load racing one isn't kept
+        self._watcher = None
+    
+    @property
+    def path(self):
+        """The auth config path, or None if it hasn't been set"""
+        return self._path
+    
+    def set_path(self, path):
+        """Use another auth config file (the snapshot is loaded from it on next use)"""
+        with self._lock:
+            previous, self._path = self._path, path
+            watcher = self._watcher
+            self._invalidate()
+        if watcher is not None:
+            if previous is not None:
+                watcher.unwatch(previous, self._on_changed)
+            if path is not None:
+                watcher.watch(path, self._on_changed)
+    
+    def attach(self, watcher):
+        """Rely on ``watcher`` (a FileWatcher, or None to detach) to report changes to the file"""
+        with self._lock:
+            previous, self._watcher = self._watcher, watcher
+            path = self._path
+            self._invalidate()
+        if path is not None:
+            if previous is not None:
+                previous.unwatch(path, self._on_changed)
+            if watcher is not None:
+                watcher.watch(path, self._on_changed)
+    
+    def detach(self, watcher):
+        """Stop relying on ``watcher`` if it is the attached one (its owner is shutting down)"""
+        with self._lock:
+            if self._watcher is not watcher:
+                return
+        self.attach(None)
+    
+    @property
+    def config(self) -> dict:
+        """
+        The auth config (read-only, empty if the file is missing or invalid)
+        
+        Raises:
+            RuntimeError: If the path hasn't been set
+        """
+        with self._lock:
+            path = self._path
+            if path is None:
+                raise RuntimeError("Authentication configuration path has not been set.")
+            config = self._config
+            if config is not None and (self._watcher is not None or file_signature(path) == self._signature):
+                return config
+            changes = self._changes
+        signature = file_signature(path)
+        config = read_json(path) or _freeze({})
+        with self._lock:
+            if self._path == path and self._changes == changes:
+                self._config, self._signature = config, signature
+        return config
+    
+    def store(self, config):
+        """Replace the snapshot with a config that was just written to the file"""
+        with self._lock:
+            self._changes += 1
+            self._config = _freeze(config)
+            self._signature = file_signature(self._path) if self._path is not None else None
+    
+    def invalidate(self):
+        """Load the config from the file on next use"""
+        with self._lock:
+            self._invalidate()
+    
+    def _invalidate(self):
+        self._changes += 1
+        self._config = None
+    
+    def _on_changed(self, path):
+        """File-watch callback: the auth config changed on disk"""
+        self.invalidate()
+
+# Shared by every auth check; set_auth_path points it at the config file
+auth_state = AuthState()
+
 def set_auth_path(path):
     """Sets the path for the authentication configuration file.
     This should be called by the main application entry point.
     """
     global _current_auth_path
     _current_auth_path = path
+    auth_state.set_path(path)
     print(f"Auth module path set to: {_current_auth_path}") # Debug print
 
 def _get_auth_path():
     """Helper to get the auth path, ensuring it's set."""
     if _current_auth_path is None:
-        print("Error: Authentication configuration path has not been set.")
         raise RuntimeError("Authentication configuration path has not been set.")
-    print(f"Getting auth path: {_current_auth_path}")
-    print(f"Absolute path: {os.path.abspath(_current_auth_path)}")
-    print(f"Path exists: {os.path.exists(_current_auth_path)}")
     return _current_auth_path
 
+def _write_config(auth_path, config):
+    """Write the auth config and keep it as the in-memory state"""
+    if not write_json(auth_path, config):
+        return False
+    auth_state.store(config)
+    return True
+
 def hash_password(password):
     """
-    Hash a password using Argon2.
+    Hash a password with the vault key derivation (Argon2id + HKDF).
+    
+    The hash stores the Argon2id parameters (calibrated for this machine, see
+    ``calibrate_kdf_params``), the salt and the verifier half of
+    ``derive_credential_keys``. The vault key derived in the same run is kept
+    in the vault session, so the vault can be encrypted right away.
     
     Args:
         password (str): The password to hash
         
     Returns:
-        str: The Argon2 hash string
+        str: The hash string
     """
-    return _password_hasher.hash(password)
+    salt = new_salt()
+    params = kdf_target()
+    verifier, key = derive_credential_keys(password, salt, params)
+    vault_session.remember(password, salt, key, params, current=True)
+    return (f"{_CREDENTIAL_HASH_PREFIX}m={params['memory_cost']},t={params['time_cost']},p={params['parallelism']}"
+            f"${base64.b64encode(salt).decode()}${base64.b64encode(verifier).decode()}")
+
+def is_legacy_hash(password_hash):
+    """Check whether a hash predates the vault key derivation (and should be upgraded)"""
+    return not password_hash.startswith(_CREDENTIAL_HASH_PREFIX)
+
+def needs_rehash(password_hash):
+    """Check whether a hash is legacy or was made with other KDF parameters than the current ones"""
+    if is_legacy_hash(password_hash):
+        return True
+    try:
+        return kdf_outdated(_parse_credential_hash(password_hash)[1])
+    except ValueError:
+        return True
+
+def _parse_credential_hash(password_hash):
+    """Split a hash made by ``hash_password`` into (salt, KDF parameters, verifier)"""
+    cost, salt, verifier = password_hash[len(_CREDENTIAL_HASH_PREFIX):].split("$")
+    values = dict(item.split("=", 1) for item in cost.split(","))
+    params = kdf_params({
+        "kdf": DEFAULT_KDF_PARAMS["kdf"],
+        "memory_cost": int(values["m"]),
+        "time_cost": int(values["t"]),
+        "parallelism": int(values["p"])
+    })
+    return base64.b64decode(salt), params, base64.b64decode(verifier)
 
 def verify_password_hash(password_hash, password):
     """
-    Verify a password against an Argon2 hash.
+    Verify a password against a stored hash.
+    
+    A hash made by ``hash_password`` is checked with one run of the vault key
+    derivation; on success the vault key from that run is kept in the vault
+    session, so unlocking the vault doesn't derive it again. Older Argon2
+    hashes are verified with ``argon2.PasswordHasher``.
     
     Args:
-        password_hash (str): The stored Argon2 hash
+        password_hash (str): The stored hash
         password (str): The password to verify
         
     Returns:
         bool: True if the password matches the hash, False otherwise.
     """
     try:
-        _password_hasher.verify(password_hash, password)
+        if is_legacy_hash(password_hash):
+            _password_hasher.verify(password_hash, password)
+            return True
+        salt, params, verifier = _parse_credential_hash(password_hash)
+        expected, key = derive_credential_keys(password, salt, params)
+        if not hmac.compare_digest(expected, verifier):
+            return False
+        vault_session.remember(password, salt, key, params, current=True)
         return True
     except VerifyMismatchError:
         return False
@@ -60,6 +225,70 @@ def verify_password_hash(password_hash, password):
         print(f"Error during password verification: {e}")
         return False
 
+def _upgrade_hash(auth_path, hash_field, password):
+    """Replace a verified legacy or outdated hash with one made by ``hash_password``
+    
+    The new hash's vault key becomes the session's current key, so the vault is
+    re-keyed with the new parameters when it is opened next.
+    """
+    try:
+        config = read_json(auth_path, mutable=True) or {}
+        config[hash_field] = hash_password(password)
+        if _write_config(auth_path, config):
+            print(f"Upgraded {hash_field} to the current key derivation parameters")
+    except Exception as e:
+        print(f"Error upgrading {hash_field}: {e}")
+
+def _apply_kdf_params(config):
+    """Use the KDF parameters calibrated for this machine, if the config has them"""
+    params = config.get("kdf_params")
+    if params is None:
+        return
+    try:
+        set_kdf_target(params)
+    except ValueError as e:
+        print(f"Ignoring stored KDF parameters: {e}")
+
+def is_kdf_calibrated():
+    """
+    Check whether KDF parameters were calibrated on this machine
+    
+    Returns:
+        bool: True if the auth config has calibrated parameters
+    """
+    try:
+        return "kdf_params" in auth_state.config
+    except Exception as e:
+        print(f"Error checking KDF calibration: {e}")
+        return False
+
+def calibrate_kdf_params(target_seconds=KDF_TARGET_SECONDS):
+    """
+    Measure this machine and store the KDF parameters for the target unlock time
+    
+    The parameters are kept in the auth config and used from the next time a
+    credential is set or verified: hashes made with other parameters are
+    rehashed at the next successful unlock, which re-keys the vault as well.
+    
+    Args:
+        target_seconds (float, optional): Unlock time to aim for
+        
+    Returns:
+        dict: The calibrated parameters, or None if they couldn't be stored
+    """
+    try:
+        params = calibrate_kdf(target_seconds)
+        auth_path = _get_auth_path()
+        config = read_json(auth_path, mutable=True) or {}
+        config["kdf_params"] = params
+        if not _write_config(auth_path, config):
+            return None
+        print(f"Calibrated key derivation: {params}")
+        return params
+    except Exception as e:
+        print(f"Error calibrating key derivation: {e}")
+        return None
+
 def set_pin(pin):
     """
     Set a PIN for app protection
@@ -72,18 +301,19 @@ def set_pin(pin):
     """
     try:
         auth_path = _get_auth_path()
+        # Read existing config or create new one
+        config = read_json(auth_path, mutable=True) or {}
+        _apply_kdf_params(config)
+        
         # Hash the PIN
         hashed_pin = hash_password(pin)
         
-        # Read existing config or create new one
-        config = read_json(auth_path) or {}
-        
         # Update the config
         config["pin_hash"] = hashed_pin
         config["auth_type"] = "pin"
         
         # Write the config
-        write_json(auth_path, config)
+        _write_config(auth_path, config)
         return True
     except Exception as e:
         print(f"Error setting PIN: {e}")
@@ -101,18 +331,19 @@ def set_password(password):
     """
     try:
         auth_path = _get_auth_path()
+        # Read existing config or create new one
+        config = read_json(auth_path, mutable=True) or {}
+        _apply_kdf_params(config)
+        
         # Hash the password
         hashed_password = hash_password(password)
         
-        # Read existing config or create new one
-        config = read_json(auth_path) or {}
-        
         # Update the config
         config["password_hash"] = hashed_password
         config["auth_type"] = "password"
         
         # Write the config
-        write_json(auth_path, config)
+        _write_config(auth_path, config)
         return True
     except Exception as e:
         print(f"Error setting password: {e}")
@@ -128,7 +359,7 @@ def clear_auth():
     try:
         auth_path = _get_auth_path()
         # Read existing config
-        config = read_json(auth_path) or {}
+        config = read_json(auth_path, mutable=True) or {}
         
         # Remove auth settings
         if "pin_hash" in config:
@@ -139,7 +370,7 @@ def clear_auth():
             del config["auth_type"]
         
         # Write the config
-        write_json(auth_path, config)
+        _write_config(auth_path, config)
         return True
     except Exception as e:
         print(f"Error clearing authentication: {e}")
@@ -157,8 +388,7 @@ def verify_pin(pin):
     """
     try:
         auth_path = _get_auth_path()
-        # Read config
-        config = read_json(auth_path) or {}
+        config = auth_state.config
         
         # Check if PIN is set
         if "pin_hash" not in config or config.get("auth_type") != "pin":
@@ -170,7 +400,12 @@ def verify_pin(pin):
             print("Error: PIN hash not found in config during verification.")
             return False # Should not happen if auth_type is pin, but good practice
         
-        return verify_password_hash(stored_hash, pin)
+        if not verify_password_hash(stored_hash, pin):
+            return False
+        _apply_kdf_params(config)
+        if needs_rehash(stored_hash):
+            _upgrade_hash(auth_path, "pin_hash", pin)
+        return True
     except Exception as e:
         print(f"Error verifying PIN: {e}")
         return False
@@ -187,8 +422,7 @@ def verify_password(password):
     """
     try:
         auth_path = _get_auth_path()
-        # Read config
-        config = read_json(auth_path) or {}
+        config = auth_state.config
         
         # Check if password is set
         if "password_hash" not in config or config.get("auth_type") != "password":
@@ -200,7 +434,12 @@ def verify_password(password):
             print("Error: Password hash not found in config during verification.")
             return False # Should not happen if auth_type is password
         
-        return verify_password_hash(stored_hash, password)
+        if not verify_password_hash(stored_hash, password):
+            return False
+        _apply_kdf_params(config)
+        if needs_rehash(stored_hash):
+            _upgrade_hash(auth_path, "password_hash", password)
+        return True
     except Exception as e:
         print(f"Error verifying password: {e}")
         return False
@@ -213,18 +452,13 @@ def is_auth_enabled():
         bool: True if authentication is enabled, False otherwise
     """
     try:
-        auth_path = _get_auth_path()
-        # Read config
-        config = read_json(auth_path) or {}
+        config = auth_state.config
         
         # Check if auth is enabled
-        has_auth = "auth_type" in config and (
+        return "auth_type" in config and (
             ("pin_hash" in config and config["auth_type"] == "pin") or
             ("password_hash" in config and config["auth_type"] == "password")
         )
-        
-        print(f"Auth enabled check (using {_current_auth_path}): {has_auth}, config: {config}") # Updated log
-        return has_auth
     except Exception as e:
         print(f"Error checking auth status: {e}")
         return False
@@ -237,12 +471,8 @@ def get_auth_type():
         str: "pin", "password", or None if not set
     """
     try:
-        auth_path = _get_auth_path()
-        # Read config
-        config = read_json(auth_path) or {}
-        
         # Return auth type
-        return config.get("auth_type")
+        return auth_state.config.get("auth_type")
     except Exception as e:
         print(f"Error getting auth type: {e}")
         return None
@@ -277,8 +507,7 @@ def set_timeout(timeout_minutes):
                 print(f"Error creating directory {directory}: {e}")
         
         # Read existing config
-        config = read_json(auth_path) or {}
-        print(f"Current config before update: {config}")
+        config = read_json(auth_path, mutable=True) or {}
         
         # Create an empty file if it doesn't exist
         if not os.path.exists(auth_path):
@@ -287,9 +516,10 @@ def set_timeout(timeout_minutes):
                     json.dump({"timeout_minutes": timeout_minutes}, f, indent=4)
                 print(f"Created new auth config file with timeout {timeout_minutes}")
                 
-                # Clear the file cache to ensure fresh reads
-                from .file_io import clear_cache
-                clear_cache()
+                # Clear the cached config to ensure fresh reads
+                from .file_io import invalidate_cache
+                invalidate_cache(auth_path)
+                auth_state.store({"timeout_minutes": timeout_minutes})
                 
                 return True
             except Exception as e:
@@ -299,7 +529,6 @@ def set_timeout(timeout_minutes):
         # Update the config
         old_timeout = config.get("timeout_minutes", 0)
         config["timeout_minutes"] = timeout_minutes
-        print(f"Updated config: {config}")
         print(f"Changed timeout from {old_timeout} to {timeout_minutes}")
         
         # Try regular file writing first
@@ -347,20 +576,20 @@ def set_timeout(timeout_minutes):
                 print(f"Error during direct file writing: {e}")
                 return False
         
-        # Clear the file cache to ensure fresh reads
-        from .file_io import clear_cache
-        clear_cache()
+        # Clear the cached config to ensure fresh reads
+        from .file_io import invalidate_cache
+        invalidate_cache(auth_path)
         print("File cache cleared")
         
         # Verify the write by reading it back
         try:
             new_config = read_json(auth_path)
-            print(f"Config after write: {new_config}")
             
             new_timeout = new_config.get("timeout_minutes")
             if new_timeout != timeout_minutes:
                 print(f"Verification failed: timeout value mismatch. Got {new_timeout}, expected {timeout_minutes}")
                 return False
+            auth_state.store(new_config)
         except Exception as e:
             print(f"Error during verification: {e}")
             return False
@@ -382,12 +611,8 @@ def get_timeout():
         int: Number of minutes until re-authentication is required, 0 for never
     """
     try:
-        auth_path = _get_auth_path()
-        # Read config
-        config = read_json(auth_path) or {}
-        
         # Return timeout setting
-        return config.get("timeout_minutes", 0)
+        return auth_state.config.get("timeout_minutes", 0)
     except Exception as e:
         print(f"Error getting timeout: {e}")
         return 0
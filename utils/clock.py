@@ -0,0 +1,101 @@
+import abc
+import time
+import threading
+
+
+class Clock(abc.ABC):
+    """Source of "now" for TOTP code generation.
+
+    Everything that needs the current time (tokens, the code table, the API)
+    takes a Clock instead of calling a module-level time function, so the same
+    code can run against the system clock, the NTP-corrected clock or a
+    simulated clock that runs faster than real time.
+    """
+
+    @abc.abstractmethod
+    def time(self):
+        """Return the current unix time in seconds"""
+
+    def wait(self, event, timeout):
+        """Wait until ``event`` is set or ``timeout`` clock seconds have passed.
+
+        Returns:
+            bool: True if the event was set, False on timeout
+        """
+        return event.wait(max(0.0, timeout))
+
+    def sleep(self, seconds):
+        """Sleep for a number of clock seconds"""
+        self.wait(threading.Event(), seconds)
+
+
+class SystemClock(Clock):
+    """The plain system clock (``time.time``)"""
+
+    def time(self):
+        return time.time()
+
+
+class SimulatedClock(Clock):
+    """Clock for tests and benchmarks.
+
+    Simulated time starts at ``start`` and moves ``speed`` times faster than
+    real time; with ``speed=0`` it only moves when ``advance`` or ``set_time``
+    is called. Waits are measured in simulated seconds, so a background thread
+    waiting for the next 30-second boundary wakes after 30 / speed real seconds
+    (or as soon as the clock is advanced past the boundary).
+    """
+
+    # Upper bound on a single real-time wait so manual advances are noticed promptly
+    _POLL_INTERVAL = 0.01
+
+    def __init__(self, start=None, speed=0.0):
+        self._lock = threading.Condition()
+        self._base = time.time() if start is None else float(start)
+        self._real_base = time.monotonic()
+        self._speed = float(speed)
+
+    def time(self):
+        with self._lock:
+            return self._base + (time.monotonic() - self._real_base) * self._speed
+
+    @property
+    def speed(self):
+        return self._speed
+
+    def set_speed(self, speed):
+        """Change the acceleration factor without jumping in time"""
+        with self._lock:
+            self._rebase()
+            self._speed = float(speed)
+            self._lock.notify_all()
+
+    def advance(self, seconds):
+        """Move simulated time forward by ``seconds``"""
+        with self._lock:
+            self._rebase()
+            self._base += seconds
+            self._lock.notify_all()
+
+    def set_time(self, timestamp):
+        """Jump simulated time to ``timestamp``"""
+        with self._lock:
+            self._rebase()
+            self._base = float(timestamp)
+            self._lock.notify_all()
+
+    def _rebase(self):
+        now = time.monotonic()
+        self._base += (now - self._real_base) * self._speed
+        self._real_base = now
+
+    def wait(self, event, timeout):
+        deadline = self.time() + timeout
+        while not event.is_set():
+            remaining = deadline - self.time()
+            if remaining <= 0:
+                return False
+            with self._lock:
+                real_timeout = remaining / self._speed if self._speed > 0 else remaining
+                self._lock.wait(min(real_timeout, self._POLL_INTERVAL))
+        return True
@@ -1,37 +1,352 @@
 import os
+import ast
+import hmac
+import json
 import base64
+import binascii
+import struct
+import hashlib
+import threading
+import time
+from argon2 import DEFAULT_TIME_COST, DEFAULT_MEMORY_COST, DEFAULT_PARALLELISM
+from argon2.exceptions import HashingError
+from argon2.low_level import Type, hash_secret_raw
 from cryptography.fernet import Fernet
+from cryptography.exceptions import InvalidTag
 from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
 from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
-from .file_io import read_json, write_json
+from .file_io import write_file_atomic, invalidate_cache
 
-def generate_key_from_password(password: str, salt: bytes = None) -> tuple[bytes, bytes]:
+# High number of iterations for better security
+PBKDF2_ITERATIONS = 480000
+
+# Key derivation functions named in vault headers and credential hashes
+KDF_PBKDF2 = "pbkdf2-sha256"
+KDF_ARGON2ID = "argon2id-hkdf"
+
+# One Argon2id run (at the cost the PIN/password hashes always used) yields both
+# the credential verifier and the vault key; used until the machine is calibrated
+DEFAULT_KDF_PARAMS = {
+    "kdf": KDF_ARGON2ID,
+    "time_cost": DEFAULT_TIME_COST,
+    "memory_cost": DEFAULT_MEMORY_COST,
+    "parallelism": DEFAULT_PARALLELISM
+}
+# Vaults written before the unified key derivation
+LEGACY_KDF_PARAMS = {"kdf": KDF_PBKDF2, "iterations": PBKDF2_ITERATIONS}
+
+# Calibration (see calibrate_kdf): Argon2id costs are chosen for this unlock time on
+# the machine, but never below the floor (OWASP's minimum) nor above the ceiling
+KDF_TARGET_SECONDS = 0.25
+KDF_FLOOR_PARAMS = {
+    "kdf": KDF_ARGON2ID,
+    "time_cost": 2,
+    "memory_cost": 19 * 1024,
+    "parallelism": DEFAULT_PARALLELISM
+}
+_KDF_CALIBRATION_MAX = {"time_cost": 10, "memory_cost": 256 * 1024}
+
+# Upper bounds accepted from headers, so a crafted file can't stall the unlock: no
+# more than calibration ever picks (vaults, credential hashes and exports are all
+# derived with calibrated or default costs)
+_KDF_LIMITS = {
+    KDF_ARGON2ID: dict(_KDF_CALIBRATION_MAX, parallelism=2 * DEFAULT_PARALLELISM),
+    KDF_PBKDF2: {"iterations": PBKDF2_ITERATIONS}
+}
+_VERIFIER_INFO = b"WinOTP credential verifier"
+_VAULT_KEY_INFO = b"WinOTP vault key"
+_SALT_SIZE = 16
+
+# Encrypted tokens file: b"WOTP", version byte, header length, then the JSON header,
+# one sealed record per token and an HMAC (see VaultEnvelope).
+VAULT_MAGIC = b"WOTP"
+VAULT_VERSION = 3
+_VAULT_PREFIX = struct.Struct(">4sBI")
+_NONCE_SIZE = 12
+_MAX_HEADER_SIZE = 64 * 1024
+_RECORD_HEADER = struct.Struct(">HI")  # token id length, sealed record length
+_INDEX_MAC_SIZE = 32
+_DATA_KEY_AAD = b"WinOTP data key"
+_encode_record = json.JSONEncoder(separators=(",", ":")).encode  # Reused: json.dumps builds an encoder per call
+_INDEX_MAC_INFO = b"WinOTP vault index"
+
+# Encrypted streams (exports and backups): b"WOTS", version, header length, the JSON
+# header, then chunks of a 4-byte length and AES-GCM ciphertext (see StreamEncryptor)
+STREAM_MAGIC = b"WOTS"
+STREAM_VERSION = 1
+STREAM_CHUNK_SIZE = 64 * 1024
+_STREAM_CHUNK_LENGTH = struct.Struct(">I")
+_STREAM_NONCE = struct.Struct(">7sIB")  # per-stream prefix, chunk counter, final flag
+_STREAM_KEY_INFO = b"WinOTP stream"
+_STREAM_TAG_SIZE = 16
+
+def generate_key_from_password(password: str, salt: bytes = None, iterations: int = PBKDF2_ITERATIONS) -> tuple[bytes, bytes]:
     """
     Generate a Fernet key from a password using PBKDF2
     
     Args:
         password (str): The password to derive the key from
         salt (bytes, optional): Salt for key derivation. If None, generates new salt.
+        iterations (int, optional): PBKDF2-SHA256 iterations
         
     Returns:
         tuple[bytes, bytes]: (key, salt) tuple
     """
     if salt is None:
-        salt = os.urandom(16)
+        salt = os.urandom(_SALT_SIZE)
         
     kdf = PBKDF2HMAC(
         algorithm=hashes.SHA256(),
         length=32,
         salt=salt,
-        iterations=480000,  # High number of iterations for better security
+        iterations=iterations,
     )
     
     key = base64.urlsafe_b64encode(kdf.derive(password.encode()))
     return key, salt
 
+def kdf_params(params: dict) -> dict:
+    """
+    Extract and validate the KDF parameters of a vault header or credential hash
+    
+    Args:
+        params (dict): Dict with a "kdf" id and that KDF's parameters (other keys are ignored)
+        
+    Returns:
+        dict: Only the KDF id and its parameters
+        
+    Raises:
+        ValueError: If the KDF is unknown or a parameter is missing or out of range
+    """
+    kdf = params.get("kdf")
+    if kdf not in _KDF_LIMITS:
+        raise ValueError(f"Unsupported KDF: {kdf}")
+    result = {"kdf": kdf}
+    for name, limit in _KDF_LIMITS[kdf].items():
+        value = params.get(name)
+        if not isinstance(value, int) or isinstance(value, bool) or not 0 < value <= limit:
+            raise ValueError(f"Invalid {kdf} parameter {name}: {value!r}")
+        result[name] = value
+    return result
+
+def derive_credential_keys(password: str, salt: bytes, params: dict = None) -> tuple[bytes, bytes]:
+    """
+    Derive the credential verifier and the vault key with a single KDF run
+    
+    Argon2id turns the PIN or password into a master secret, which HKDF-SHA256
+    expands into two independent keys: a verifier, stored in the auth config to
+    check the credential, and the key the vault is encrypted with. Checking the
+    credential therefore already yields the vault key, and the verifier reveals
+    nothing about it. Vaults keyed with PBKDF2 (before this scheme) have no verifier.
+    
+    Args:
+        password (str): The PIN or password
+        salt (bytes): Salt shared by the credential hash and the vault
+        params (dict, optional): KDF parameters (default: ``DEFAULT_KDF_PARAMS``)
+        
+    Returns:
+        tuple[bytes, bytes]: (verifier, key) where the key is urlsafe base64 like
+            a Fernet key, and the verifier is None for PBKDF2
+        
+    Raises:
+        ValueError: If the parameters are invalid
+    """
+    params = kdf_params(params or DEFAULT_KDF_PARAMS)
+    if params["kdf"] == KDF_PBKDF2:
+        return None, generate_key_from_password(password, salt, params["iterations"])[0]
+    try:
+        master = hash_secret_raw(password.encode(), salt, params["time_cost"], params["memory_cost"],
+                                 params["parallelism"], 32, Type.ID)
+    except HashingError as e:
+        raise ValueError(f"Argon2 key derivation failed: {e}")
+    
+    def expand(info):
+        return HKDF(algorithm=hashes.SHA256(), length=32, salt=None, info=info).derive(master)
+    
+    return expand(_VERIFIER_INFO), base64.urlsafe_b64encode(expand(_VAULT_KEY_INFO))
+
+def calibrate_kdf(target_seconds: float = KDF_TARGET_SECONDS, timer=time.perf_counter) -> dict:
+    """
+    Measure Argon2id on this machine and pick parameters for an unlock time
+    
+    Argon2id's running time grows linearly with memory_cost * time_cost, so
+    one run at the floor gives the budget for the target time. It is spent on
+    memory first (what makes GPU attacks expensive), then on passes. The
+    result is checked with one run and memory is scaled back if it overshoots.
+    Slow machines get the floor even if it takes longer than the target.
+    
+    Args:
+        target_seconds (float): Wanted duration of one key derivation
+        timer (callable, optional): Clock returning seconds (for tests)
+        
+    Returns:
+        dict: KDF parameters for ``derive_credential_keys``
+    """
+    def measure(params):
+        start = timer()
+        hash_secret_raw(b"WinOTP calibration", new_salt(), params["time_cost"], params["memory_cost"],
+                        params["parallelism"], 32, Type.ID)
+        return max(timer() - start, 1e-6)
+    
+    floor = KDF_FLOOR_PARAMS
+    budget = floor["memory_cost"] * floor["time_cost"] * target_seconds / measure(floor)
+    memory = min(_KDF_CALIBRATION_MAX["memory_cost"], int(budget / floor["time_cost"]))
+    params = dict(floor, memory_cost=max(floor["memory_cost"], memory // 1024 * 1024))
+    params["time_cost"] = max(floor["time_cost"],
+                              min(_KDF_CALIBRATION_MAX["time_cost"], int(budget / params["memory_cost"])))
+    
+    if params != floor:
+        elapsed = measure(params)
+        if elapsed > target_seconds * 1.25:
+            memory = int(params["memory_cost"] * target_seconds / elapsed) // 1024 * 1024
+            params["memory_cost"] = max(floor["memory_cost"], memory)
+    return kdf_params(params)
+
+def set_kdf_target(params: dict):
+    """
+    Set the KDF parameters new credential hashes and vault keys are made with
+    
+    Args:
+        params (dict): Argon2id parameters, e.g. from ``calibrate_kdf``
+        
+    Raises:
+        ValueError: If the parameters are invalid or below the floor
+    """
+    global _kdf_target
+    params = kdf_params(params)
+    if params["kdf"] != KDF_ARGON2ID or any(params[name] < KDF_FLOOR_PARAMS[name]
+                                            for name in ("time_cost", "memory_cost")):
+        raise ValueError(f"KDF parameters below the floor: {params}")
+    _kdf_target = params
+
+def kdf_target() -> dict:
+    """Return the KDF parameters new credential hashes and vault keys are made with"""
+    return dict(_kdf_target)
+
+def kdf_outdated(params: dict) -> bool:
+    """Check whether a vault header or credential hash names other KDF parameters than the target"""
+    try:
+        return kdf_params(params) != _kdf_target
+    except ValueError:
+        return True
+
+def new_salt() -> bytes:
+    """Return a fresh random salt for a credential or vault"""
+    return os.urandom(_SALT_SIZE)
+
+class VaultSession:
+    """
+    The vault keys of the unlocked session, derived once per unlock
+    
+    Key derivation is deliberately slow, so instead of running it for every
+    load and save, keys are kept in memory from the unlock (or the first
+    successful decryption) until ``lock`` is called on timeout or when the
+    credentials change. Verifying the PIN or password derives the vault key as
+    well (see ``derive_credential_keys``) and remembers it here, so opening the
+    vault right after doesn't run a KDF again.
+    
+    Saves use the password's current key and salt, so the salt only rotates
+    when the password does. Keys of older vaults (PBKDF2, or Argon2id costs
+    other than the target) are only used to read them: the first save after
+    reading one writes it with the current key.
+    Passwords are recognized by their SHA-256 digest; they aren't kept.
+    """
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._keys = {}     # (password digest, salt, KDF parameters) -> key
+        self._current = {}  # password digest -> (salt, KDF parameters) saves are encrypted with
+    
+    @property
+    def unlocked(self) -> bool:
+        """True while a key is cached"""
+        with self._lock:
+            return bool(self._keys)
+    
+    def key_for(self, password: str, salt: bytes, params: dict = None) -> bytes:
+        """
+        Return the key for data encrypted with a salt and KDF, deriving it only if it isn't cached
+        
+        Args:
+            password (str): The password
+            salt (bytes): Salt the data was encrypted with
+            params (dict, optional): KDF parameters the data was encrypted with
+                (default: ``DEFAULT_KDF_PARAMS``)
+            
+        Returns:
+            bytes: The key
+        """
+        params = kdf_params(params or DEFAULT_KDF_PARAMS)
+        with self._lock:
+            key = self._keys.get((_digest(password), salt, _params_key(params)))
+        if key is not None:
+            return key
+        return derive_credential_keys(password, salt, params)[1]
+    
+    def write_key(self, password: str) -> tuple[bytes, bytes, dict]:
+        """
+        Return the key to encrypt with: the password's current key, or a new one
+        
+        Args:
+            password (str): The password
+            
+        Returns:
+            tuple[bytes, bytes, dict]: (key, salt, KDF parameters)
+        """
+        digest = _digest(password)
+        with self._lock:
+            current = self._current.get(digest)
+            if current is not None:
+                salt, params = current
+                return self._keys[(digest, salt, params)], salt, dict(params)
+        salt = new_salt()
+        params = kdf_target()
+        key = derive_credential_keys(password, salt, params)[1]
+        self.remember(password, salt, key, params, current=True)
+        return key, salt, params
+    
+    def remember(self, password: str, salt: bytes, key: bytes, params: dict = None, current: bool = False):
+        """
+        Keep a key that was just used successfully for the rest of the session
+        
+        Args:
+            password (str): The password
+            salt (bytes): Salt of the key
+            key (bytes): The key
+            params (dict, optional): KDF parameters of the key (default: ``DEFAULT_KDF_PARAMS``)
+            current (bool): Encrypt saves with this key (the unlocked credential's key).
+                The password's first key with the target parameters becomes current anyway.
+        """
+        params = kdf_params(params or DEFAULT_KDF_PARAMS)
+        digest = _digest(password)
+        with self._lock:
+            self._keys[(digest, salt, _params_key(params))] = key
+            if current or (digest not in self._current and params == _kdf_target):
+                self._current[digest] = (salt, _params_key(params))
+    
+    def lock(self):
+        """Forget the cached keys (the next load or save derives them again)"""
+        with self._lock:
+            self._keys = {}
+            self._current = {}
+
+def _digest(password: str) -> bytes:
+    return hashlib.sha256(password.encode()).digest()
+
+def _params_key(params: dict) -> tuple:
+    """Hashable form of KDF parameters"""
+    return tuple(sorted(params.items()))
+
+# Shared by every load and save of the vault
+vault_session = VaultSession()
+# Parameters for new keys (see set_kdf_target); the defaults until calibrated
+_kdf_target = dict(DEFAULT_KDF_PARAMS)
+
 def encrypt_data(data: dict, password: str, salt: bytes = None) -> tuple[bytes, bytes]:
     """
-    Encrypt dictionary data using a password
+    Encrypt dictionary data using a password (version 1 format, kept for compatibility)
     
     Args:
         data (dict): The data to encrypt
@@ -41,8 +356,12 @@ def encrypt_data(data: dict, password: str, salt: bytes = None) -> tuple[bytes,
     Returns:
         tuple[bytes, bytes]: (encrypted_data, salt) tuple
     """
-    # Generate key from password
-    key, salt = generate_key_from_password(password, salt)
+    if salt is None:
+        salt = new_salt()
+    
+    # Reuse the session key (derived once per unlock) or derive it
+    key = vault_session.key_for(password, salt, LEGACY_KDF_PARAMS)
+    vault_session.remember(password, salt, key, LEGACY_KDF_PARAMS)
     
     # Create Fernet cipher
     f = Fernet(key)
@@ -57,7 +376,7 @@ def encrypt_data(data: dict, password: str, salt: bytes = None) -> tuple[bytes,
 
 def decrypt_data(encrypted_data: bytes, password: str, salt: bytes) -> dict:
     """
-    Decrypt data using a password
+    Decrypt data using a password (version 1 format, read when migrating old files)
     
     Args:
         encrypted_data (bytes): The encrypted data
@@ -67,8 +386,8 @@ def decrypt_data(encrypted_data: bytes, password: str, salt: bytes) -> dict:
     Returns:
         dict: The decrypted data
     """
-    # Generate key from password
-    key, _ = generate_key_from_password(password, salt)
+    # Reuse the session key (derived once per unlock) or derive it
+    key = vault_session.key_for(password, salt, LEGACY_KDF_PARAMS)
     
     # Create Fernet cipher
     f = Fernet(key)
@@ -76,47 +395,345 @@ def decrypt_data(encrypted_data: bytes, password: str, salt: bytes) -> dict:
     try:
         # Decrypt the data
         decrypted_data = f.decrypt(encrypted_data)
+        # Only a key that decrypted the vault is kept for the session
+        vault_session.remember(password, salt, key, LEGACY_KDF_PARAMS)
         
-        # Convert from string representation back to dict
-        # Using eval since we stored the dict as a string representation
-        # This is safe since we control the data format
-        return eval(decrypted_data.decode())
+        # Version 1 stored the dict's Python representation; parse it as a literal, never eval
+        return ast.literal_eval(decrypted_data.decode())
     except Exception as e:
         print(f"Error decrypting data: {e}")
         return None
 
-def encrypt_tokens_file(tokens_path: str, password: str) -> bool:
+class VaultEnvelope:
     """
-    Encrypt the tokens file using the provided password
+    Per-record encryption of the tokens file (version 3)
+    
+    A random data key encrypts each token on its own with AES-256-GCM (the
+    token id is the associated data). The header holds the data key wrapped
+    by the session's vault key, and an HMAC over the whole file, keyed from
+    the data key, detects records that were dropped, swapped or rolled back.
+    
+    The envelope keeps the records it last sealed or opened, so a save only
+    encrypts tokens whose data changed, reopening the file after another save
+    only decrypts records that differ, and a new password only rewraps the
+    data key. Storages keep one envelope per vault.
+    """
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._data_key = None
+        self._index_key = None
+        self._wrapped = None   # (vault key, wrapped data key)
+        self._records = {}     # token id -> (token data, encoded record: header, id and sealed data)
+        self.encrypted_records = 0  # Records the last seal had to encrypt
+        self.decrypted_records = 0  # Records the last open had to decrypt
+    
+    def _use_data_key(self, data_key: bytes):
+        """Switch to a data key, forgetting records sealed with another one (lock held)"""
+        if data_key != self._data_key:
+            self._data_key = data_key
+            self._index_key = HKDF(algorithm=hashes.SHA256(), length=32, salt=None,
+                                   info=_INDEX_MAC_INFO).derive(data_key)
+            self._wrapped = None
+            self._records = {}
+    
+    def seal(self, tokens: dict, password: str, generation: int = None) -> bytes:
+        """
+        Encrypt tokens into the contents of a version 3 tokens file
+        
+        Args:
+            tokens (dict): Tokens to encrypt
+            password (str): Password whose session key wraps the data key
+            generation (int, optional): Save counter stored in the header
+            
+        Returns:
+            bytes: Encrypted tokens file contents
+        """
+        # The session key (derived at unlock), or a new key under the target KDF
+        key, salt, params = vault_session.write_key(password)
+        with self._lock:
+            if self._data_key is None:
+                self._use_data_key(AESGCM.generate_key(bit_length=256))
+            if self._wrapped is None or self._wrapped[0] != key:
+                nonce = os.urandom(_NONCE_SIZE)
+                wrapped = nonce + AESGCM(base64.urlsafe_b64decode(key)).encrypt(nonce, self._data_key, _DATA_KEY_AAD)
+                self._wrapped = (key, wrapped)
+            
+            header = dict(params, salt=base64.b64encode(salt).decode(), cipher="aes-256-gcm",
+                          data_key=base64.b64encode(self._wrapped[1]).decode())
+            if generation is not None:
+                header["generation"] = generation
+            header_bytes = json.dumps(header, separators=(",", ":")).encode()
+            parts = [_VAULT_PREFIX.pack(VAULT_MAGIC, VAULT_VERSION, len(header_bytes)), header_bytes]
+            
+            aead = AESGCM(self._data_key)
+            previous = self._records
+            records = {}
+            encrypted = 0
+            for token_id, token_data in tokens.items():
+                record = previous.get(token_id)
+                if record is None or record[0] != token_data:
+                    id_bytes = token_id.encode()
+                    nonce = os.urandom(_NONCE_SIZE)
+                    sealed = nonce + aead.encrypt(nonce, _encode_record(token_data).encode(), id_bytes)
+                    record = (dict(token_data), _RECORD_HEADER.pack(len(id_bytes), len(sealed)) + id_bytes + sealed)
+                    encrypted += 1
+                records[token_id] = record
+                parts.append(record[1])
+            
+            body = b"".join(parts)
+            self._records = records
+            self.encrypted_records = encrypted
+            return body + hmac.new(self._index_key, body, hashlib.sha256).digest()
+    
+    def open(self, content: bytes, password: str) -> dict:
+        """
+        Decrypt the contents of a version 3 tokens file
+        
+        Args:
+            content (bytes): Contents of the tokens file
+            password (str): Password whose key wraps the data key
+            
+        Returns:
+            dict: Decrypted tokens
+            
+        Raises:
+            ValueError: If the password is wrong or the file is not a valid version 3 vault
+        """
+        header, offset = parse_vault_header(content)
+        if header is None:
+            raise ValueError("Not a version 3 vault")
+        params = kdf_params(header)
+        if header.get("cipher") != "aes-256-gcm":
+            raise ValueError(f"Unsupported cipher: {header.get('cipher')}")
+        try:
+            salt = base64.b64decode(header["salt"])
+            wrapped = base64.b64decode(header["data_key"])
+        except (KeyError, TypeError, binascii.Error):
+            raise ValueError("Vault header has no valid salt or data key")
+        
+        key = vault_session.key_for(password, salt, params)
+        try:
+            data_key = AESGCM(base64.urlsafe_b64decode(key)).decrypt(wrapped[:_NONCE_SIZE], wrapped[_NONCE_SIZE:], _DATA_KEY_AAD)
+        except InvalidTag:
+            raise ValueError("Incorrect password or corrupted vault")
+        # Only a key that decrypted the vault is kept for the session
+        vault_session.remember(password, salt, key, params)
+        
+        with self._lock:
+            self._use_data_key(data_key)
+            end = len(content) - _INDEX_MAC_SIZE
+            mac = hmac.new(self._index_key, content[:end], hashlib.sha256).digest()
+            if end < offset or not hmac.compare_digest(mac, content[end:]):
+                raise ValueError("Vault was modified or truncated")
+            
+            aead = AESGCM(data_key)
+            previous = self._records
+            records = {}
+            changed = []  # (token id, encoded record, JSON payload) of records to decrypt
+            header_size = _RECORD_HEADER.size
+            while offset < end:
+                if offset + header_size > end:
+                    raise ValueError("Vault record is truncated")
+                id_size, sealed_size = _RECORD_HEADER.unpack_from(content, offset)
+                start, id_end = offset, offset + header_size + id_size
+                offset = id_end + sealed_size
+                if offset > end:
+                    raise ValueError("Vault record is truncated")
+                id_bytes = content[start + header_size:id_end]
+                token_id = id_bytes.decode()
+                encoded = content[start:offset]
+                
+                # Records this envelope sealed or opened before aren't decrypted again
+                record = previous.get(token_id)
+                if record is not None and record[1] == encoded:
+                    records[token_id] = record
+                    continue
+                try:
+                    payload = aead.decrypt(content[id_end:id_end + _NONCE_SIZE], content[id_end + _NONCE_SIZE:offset], id_bytes)
+                except InvalidTag:
+                    raise ValueError(f"Vault record {token_id} is corrupted")
+                records[token_id] = None
+                changed.append((token_id, encoded, payload))
+            
+            if changed:
+                # One JSON parse for all decrypted records
+                values = json.loads(b"[" + b",".join(payload for _, _, payload in changed) + b"]")
+                for (token_id, encoded, _), token_data in zip(changed, values):
+                    records[token_id] = (token_data, encoded)
+            tokens = {token_id: dict(record[0]) for token_id, record in records.items()}
+            
+            self._records = records
+            self._wrapped = (key, wrapped)
+            self.decrypted_records = len(changed)
+            return tokens
+
+def encrypt_tokens(tokens: dict, password: str, generation: int = None, envelope: VaultEnvelope = None) -> bytes:
+    """
+    Encrypt tokens into the contents of an encrypted tokens file (version 3)
     
     Args:
-        tokens_path (str): Path to the tokens file
+        tokens (dict): Tokens to encrypt
         password (str): Password to encrypt with
+        generation (int, optional): Save counter stored in the header, so a
+            writer can recognize its own file without decrypting it
+        envelope (VaultEnvelope, optional): Envelope of the vault, so only
+            changed tokens are encrypted again
         
     Returns:
-        bool: True if successful, False otherwise
+        bytes: Encrypted tokens file contents
+    """
+    return (envelope or VaultEnvelope()).seal(tokens, password, generation)
+
+def parse_vault_header(content: bytes) -> tuple[dict, int]:
+    """
+    Parse the header of encrypted tokens file contents
+    
+    Args:
+        content (bytes): Contents of the tokens file (at least the header)
+        
+    Returns:
+        tuple[dict, int]: (header, header end offset), or (None, 0) if the
+            contents are not a version 3 encrypted file
     """
+    if len(content) < _VAULT_PREFIX.size or not content.startswith(VAULT_MAGIC):
+        return None, 0
+    _, version, header_size = _VAULT_PREFIX.unpack_from(content)
+    end = _VAULT_PREFIX.size + header_size
+    if version != VAULT_VERSION or header_size > _MAX_HEADER_SIZE or len(content) < end:
+        return None, 0
     try:
-        # Read the current tokens
-        tokens = read_json(tokens_path)
+        header = json.loads(content[_VAULT_PREFIX.size:end])
+    except ValueError:
+        return None, 0
+    return (header, end) if isinstance(header, dict) else (None, 0)
+
+def read_vault_header(tokens_path: str) -> dict:
+    """
+    Read only the header of an encrypted tokens file
+    
+    Args:
+        tokens_path (str): Path to the tokens file
         
-        # Encrypt the tokens
-        encrypted_data, salt = encrypt_data(tokens, password)
+    Returns:
+        dict: The version 3 header, or None if the file is missing, plain or version 1
+    """
+    try:
+        with open(tokens_path, "rb") as file:
+            prefix = file.read(_VAULT_PREFIX.size)
+            if len(prefix) < _VAULT_PREFIX.size or not prefix.startswith(VAULT_MAGIC):
+                return None
+            header_size = _VAULT_PREFIX.unpack(prefix)[2]
+            content = prefix + file.read(min(header_size, _MAX_HEADER_SIZE))
+    except OSError:
+        return None
+    return parse_vault_header(content)[0]
+
+def vault_version(content: bytes) -> int:
+    """Return the format version of encrypted tokens file contents, or None if they are plain"""
+    if content.startswith(VAULT_MAGIC):
+        return content[len(VAULT_MAGIC)] if len(content) > len(VAULT_MAGIC) else None
+    return 1 if is_legacy_vault(content) else None
+
+def is_encrypted_vault(content: bytes) -> bool:
+    """Check whether tokens file contents are encrypted (version 3 or version 1)"""
+    return content.startswith(VAULT_MAGIC) or is_legacy_vault(content)
+
+def is_legacy_vault(content: bytes) -> bool:
+    """Check whether tokens file contents use the version 1 encrypted format (JSON envelope, Fernet)"""
+    if not content.lstrip().startswith(b"{") or b'"encrypted"' not in content:
+        return False
+    try:
+        data = json.loads(content)
+    except ValueError:
+        return False
+    return isinstance(data, dict) and data.get("encrypted", False) is True
+
+def is_encrypted_tokens_file(tokens_path: str) -> bool:
+    """Check whether the tokens file is encrypted"""
+    try:
+        with open(tokens_path, "rb") as file:
+            return is_encrypted_vault(file.read())
+    except OSError:
+        return False
+
+def decrypt_tokens(content: bytes, password: str, envelope: VaultEnvelope = None) -> dict:
+    """
+    Decrypt the contents of a tokens file
+    
+    Args:
+        content (bytes): Contents of the tokens file: version 3, 1 or
+            plain JSON (returned as is)
+        password (str): Password to decrypt with
+        envelope (VaultEnvelope, optional): Envelope of the vault, so records it
+            already knows aren't decrypted again
         
-        # Create encrypted tokens file structure
-        encrypted_tokens = {
-            "encrypted": True,
-            "data": base64.b64encode(encrypted_data).decode(),
-            "salt": base64.b64encode(salt).decode()
-        }
+    Returns:
+        dict: Decrypted tokens or None if decryption fails
+    """
+    if parse_vault_header(content)[0] is not None:
+        try:
+            return (envelope or VaultEnvelope()).open(content, password)
+        except ValueError as e:
+            print(f"Error decrypting tokens: {e}")
+            return None
+    if content.startswith(VAULT_MAGIC):
+        print("Error decrypting tokens: unsupported vault header")
+        return None
+    
+    # Plain JSON, or a version 1 envelope
+    data = json.loads(content) if content.strip() else {}
+    if not isinstance(data, dict) or not data.get("encrypted", False):
+        return data
+    return decrypt_data(base64.b64decode(data["data"]), password, base64.b64decode(data["salt"]))
+
+def write_encrypted_tokens_file(tokens_path: str, tokens: dict, password: str, generation: int = None,
+                                envelope: VaultEnvelope = None) -> bool:
+    """
+    Encrypt tokens in memory and write them to the tokens file in one atomic write
+    
+    The plaintext never touches the disk, and the file is replaced atomically
+    (see ``write_file_atomic``), so a crash cannot leave a truncated vault.
+    
+    Args:
+        tokens_path (str): Path to the tokens file
+        tokens (dict): Tokens to encrypt and save
+        password (str): Password to encrypt with
+        generation (int, optional): Save counter to store in the header
+        envelope (VaultEnvelope, optional): Envelope of the vault (see ``encrypt_tokens``)
         
-        # Write the encrypted data
-        write_json(tokens_path, encrypted_tokens)
+    Returns:
+        bool: True if successful, False otherwise
+    """
+    try:
+        invalidate_cache(tokens_path)
+        write_file_atomic(tokens_path, encrypt_tokens(tokens, password, generation, envelope))
         return True
     except Exception as e:
         print(f"Error encrypting tokens file: {e}")
         return False
 
+def encrypt_tokens_file(tokens_path: str, password: str) -> bool:
+    """
+    Encrypt the tokens file using the provided password
+    
+    Args:
+        tokens_path (str): Path to the tokens file
+        password (str): Password to encrypt with
+        
+    Returns:
+        bool: True if successful, False otherwise
+    """
+    try:
+        # Read the current tokens and replace them with the encrypted version
+        tokens = decrypt_tokens_file(tokens_path, password)
+        if tokens is None:
+            return False
+        return write_encrypted_tokens_file(tokens_path, tokens, password)
+    except Exception as e:
+        print(f"Error encrypting tokens file: {e}")
+        return False
+
 def decrypt_tokens_file(tokens_path: str, password: str) -> dict:
     """
     Decrypt the tokens file using the provided password
@@ -126,22 +743,181 @@ def decrypt_tokens_file(tokens_path: str, password: str) -> dict:
         password (str): Password to decrypt with
         
     Returns:
-        dict: Decrypted tokens or None if decryption fails
+        dict: Decrypted tokens (empty if the file doesn't exist) or None if decryption fails
     """
     try:
         # Read the encrypted file
-        encrypted_tokens = read_json(tokens_path)
+        with open(tokens_path, "rb") as file:
+            content = file.read()
+    except FileNotFoundError:
+        return {}
+    try:
+        return decrypt_tokens(content, password)
+    except Exception as e:
+        print(f"Error decrypting tokens file: {e}")
+        return None
+
+class StreamEncryptor:
+    """
+    Encrypts a byte stream in fixed-size chunks with AES-256-GCM as it is written
+    
+    Each stream gets its own key, expanded with HKDF from the password's session
+    key and a random salt in the header, so nothing is derived per export or
+    backup after the unlock. Chunk nonces are the stream's nonce prefix, the
+    chunk counter and a final flag, and every chunk is authenticated together
+    with the header: reordered, dropped or modified chunks fail to decrypt, and
+    a stream cut at a chunk boundary is detected because its last chunk isn't
+    marked final. Only the chunk being filled is held in memory.
+    """
+    
+    def __init__(self, password: str, content_type: str, chunk_size: int = STREAM_CHUNK_SIZE):
+        """
+        Args:
+            password (str): Password whose session key the stream key is expanded from
+            content_type (str): What the plaintext is (e.g. an export format), stored in the header
+            chunk_size (int, optional): Plaintext bytes per chunk
+        """
+        key, salt, params = vault_session.write_key(password)
+        stream_salt = new_salt()
+        nonce_prefix = os.urandom(_STREAM_NONCE.size - 5)
+        header = dict(params, salt=base64.b64encode(salt).decode(), cipher="aes-256-gcm",
+                      stream_salt=base64.b64encode(stream_salt).decode(),
+                      nonce_prefix=base64.b64encode(nonce_prefix).decode(),
+                      content=content_type, chunk_size=chunk_size)
+        header_bytes = json.dumps(header, separators=(",", ":")).encode()
+        self.header = _VAULT_PREFIX.pack(STREAM_MAGIC, STREAM_VERSION, len(header_bytes)) + header_bytes
+        self._aead = AESGCM(_stream_key(key, stream_salt))
+        self._nonce_prefix = nonce_prefix
+        self._chunk_size = chunk_size
+        self._pending = bytearray()
+        self._index = 0
+    
+    def update(self, data: bytes) -> list[bytes]:
+        """
+        Add plaintext and return the chunks it completed
         
-        # Check if file is encrypted
-        if not encrypted_tokens.get("encrypted", False):
-            return encrypted_tokens
+        Args:
+            data (bytes): Next part of the plaintext
+            
+        Returns:
+            list[bytes]: Encrypted chunks ready to be written (often none)
+        """
+        self._pending += data
+        chunks = []
+        start = 0
+        # A full chunk is only sealed once more data follows: the last one must be marked final
+        while len(self._pending) - start > self._chunk_size:
+            chunks.append(self._seal(self._pending[start:start + self._chunk_size], final=False))
+            start += self._chunk_size
+        if start:
+            del self._pending[:start]
+        return chunks
+    
+    def finalize(self) -> bytes:
+        """Seal the remaining plaintext as the final chunk and return it"""
+        chunk = self._seal(self._pending, final=True)
+        self._pending = bytearray()
+        return chunk
+    
+    def _seal(self, plaintext, final):
+        nonce = _STREAM_NONCE.pack(self._nonce_prefix, self._index, 1 if final else 0)
+        sealed = self._aead.encrypt(nonce, bytes(plaintext), self.header)
+        self._index += 1
+        return _STREAM_CHUNK_LENGTH.pack(len(sealed)) + sealed
+
+def _stream_key(key: bytes, stream_salt: bytes) -> bytes:
+    """Expand a session key into the key of one stream"""
+    return HKDF(algorithm=hashes.SHA256(), length=32, salt=stream_salt,
+                info=_STREAM_KEY_INFO).derive(base64.urlsafe_b64decode(key))
+
+def encrypt_stream(pieces, password: str, content_type: str, chunk_size: int = STREAM_CHUNK_SIZE):
+    """
+    Encrypt plaintext pieces (e.g. serialized records) into an encrypted stream
+    
+    Args:
+        pieces: Iterable of plaintext bytes
+        password (str): Password to encrypt with
+        content_type (str): What the plaintext is, stored in the header
+        chunk_size (int, optional): Plaintext bytes per chunk
+        
+    Yields:
+        bytes: The header, then encrypted chunks, to be written to a file or
+            sent as an upload body in order
+    """
+    encryptor = StreamEncryptor(password, content_type, chunk_size)
+    yield encryptor.header
+    for piece in pieces:
+        yield from encryptor.update(piece)
+    yield encryptor.finalize()
+
+def is_encrypted_stream(prefix: bytes) -> bool:
+    """Check whether data (at least its first bytes) starts an encrypted stream"""
+    return prefix.startswith(STREAM_MAGIC)
+
+def decrypt_stream(file, password: str):
+    """
+    Decrypt an encrypted stream chunk by chunk
+    
+    Args:
+        file: Binary file object positioned at the start of the stream
+        password (str): Password the stream was encrypted with
         
-        # Get encrypted data and salt
-        encrypted_data = base64.b64decode(encrypted_tokens["data"])
-        salt = base64.b64decode(encrypted_tokens["salt"])
+    Returns:
+        tuple: ``(content_type, chunks)`` where ``chunks`` yields the plaintext bytes
         
-        # Decrypt the data
-        return decrypt_data(encrypted_data, password, salt)
-    except Exception as e:
-        print(f"Error decrypting tokens file: {e}")
-        return None 
\ No newline at end of file
+    Raises:
+        ValueError: If the data isn't an encrypted stream, or (while iterating)
+            the password is wrong or the stream was modified or truncated
+    """
+    prefix = file.read(_VAULT_PREFIX.size)
+    if len(prefix) < _VAULT_PREFIX.size or not is_encrypted_stream(prefix):
+        raise ValueError("Not an encrypted WinOTP stream")
+    _, version, header_size = _VAULT_PREFIX.unpack(prefix)
+    if version != STREAM_VERSION or header_size > _MAX_HEADER_SIZE:
+        raise ValueError(f"Unsupported encrypted stream version: {version}")
+    header_bytes = file.read(header_size)
+    try:
+        header = json.loads(header_bytes)
+        params = kdf_params(header)
+        salt = base64.b64decode(header["salt"])
+        stream_salt = base64.b64decode(header["stream_salt"])
+        nonce_prefix = base64.b64decode(header["nonce_prefix"])
+        chunk_size = header["chunk_size"]
+    except (ValueError, KeyError, TypeError, AttributeError, binascii.Error):
+        raise ValueError("Invalid encrypted stream header")
+    if len(nonce_prefix) != _STREAM_NONCE.size - 5 or not isinstance(chunk_size, int) or chunk_size <= 0:
+        raise ValueError("Invalid encrypted stream header")
+    aead = AESGCM(_stream_key(vault_session.key_for(password, salt, params), stream_salt))
+    associated_data = prefix + header_bytes
+    
+    def read_chunk():
+        length = file.read(_STREAM_CHUNK_LENGTH.size)
+        if not length:
+            return None
+        if len(length) < _STREAM_CHUNK_LENGTH.size:
+            raise ValueError("Encrypted stream is truncated")
+        size = _STREAM_CHUNK_LENGTH.unpack(length)[0]
+        if size > chunk_size + _STREAM_TAG_SIZE:
+            raise ValueError("Encrypted stream is corrupted")
+        sealed = file.read(size)
+        if len(sealed) < size:
+            raise ValueError("Encrypted stream is truncated")
+        return sealed
+    
+    def chunks():
+        index = 0
+        sealed = read_chunk()
+        if sealed is None:
+            raise ValueError("Encrypted stream is truncated")
+        while sealed is not None:
+            # Reading one chunk ahead tells whether this one has to be the final chunk
+            following = read_chunk()
+            nonce = _STREAM_NONCE.pack(nonce_prefix, index, 0 if following is not None else 1)
+            try:
+                yield aead.decrypt(nonce, sealed, associated_data)
+            except InvalidTag:
+                raise ValueError("Incorrect password, or the encrypted stream was modified or truncated")
+            sealed = following
+            index += 1
+    
+    return header.get("content"), chunks()
@@ -1,22 +1,16 @@
 import os
 import pickle
-import json
-import tempfile
 from datetime import datetime
 from google_auth_oauthlib.flow import InstalledAppFlow
 from google.auth.transport.requests import Request
 from googleapiclient.discovery import build
 from googleapiclient.http import MediaFileUpload
 
-# Import utilities for decryption
-from utils.auth import get_auth_type
-from utils.crypto import decrypt_tokens_file
-from utils.file_io import read_json
+from utils.exporters.stream_exporter import ENCRYPTED_EXTENSION
 
 SCOPES = ['https://www.googleapis.com/auth/drive.file']
 TOKEN_PATH = os.path.join(os.path.expandvars('%APPDATA%'), 'WinOTP', 'token_drive.pickle')
 CREDS_PATH = os.path.join(os.path.dirname(__file__), 'drive_secret.json')
-AUTH_CONFIG_PATH = os.path.join(os.path.expandvars('%APPDATA%'), 'WinOTP', 'auth_config.json')
 
 
 def authenticate_google_drive():
@@ -84,21 +78,22 @@ def authenticate_google_drive():
         return None
 
 
-def get_backup_filename():
+def get_backup_filename(encrypted=False):
     """
     Returns the backup filename for today's date.
+    Encrypted backups (of a protected vault) get the encrypted export extension.
     """
     current_date = datetime.now().strftime("%Y-%m-%d")
-    return f"tokens_backup_{current_date}.json"
+    return f"tokens_backup_{current_date}.json" + (ENCRYPTED_EXTENSION if encrypted else "")
 
-def check_backup_exists(drive_folder_name='WinOTP Backups'):
+def check_backup_exists(drive_folder_name='WinOTP Backups', encrypted=False):
     """
     Checks if today's backup file exists on Google Drive.
     Returns True if the file exists, False otherwise.
     """
     try:
         # Get today's backup filename
-        backup_filename = get_backup_filename()
+        backup_filename = get_backup_filename(encrypted)
         
         # Authenticate and get service
         service = authenticate_google_drive()
@@ -127,46 +122,18 @@ def check_backup_exists(drive_folder_name='WinOTP Backups'):
         # If there's an error, assume the backup doesn't exist to be safe
         return False
 
-def upload_tokens_json_to_drive(local_file_path='tokens.json', drive_folder_name='WinOTP Backups'):
+def upload_tokens_json_to_drive(local_file_path, drive_folder_name='WinOTP Backups'):
     """
-    Uploads tokens.json to Google Drive in a specific folder. Creates/updates the file as needed.
-    The backup file will be decrypted and include the current date in the filename.
+    Uploads a backup file to Google Drive in a specific folder. Creates/updates the file as needed.
+    The backup is written by ``write_backup_file`` (an encrypted stream for protected vaults)
+    and is uploaded from disk in chunks; the filename includes the current date.
     """
     try:
         print(f"Starting backup process for {local_file_path}")
-        
-        # Read the tokens file
-        tokens_data = read_json(local_file_path)
-
-        print("Preparing data for Google Drive backup...")
-        decrypted_tokens = {}
-        if isinstance(tokens_data, dict) and tokens_data.get("encrypted", False):
-            print("File is encrypted, attempting to decrypt backup payload...")
-            try:
-                auth_type = get_auth_type()
-                auth_config = read_json(AUTH_CONFIG_PATH) or {}
-                if auth_type == "pin":
-                    decrypted_tokens = decrypt_tokens_file(local_file_path, auth_config.get("pin_hash", "")) or {}
-                elif auth_type == "password":
-                    decrypted_tokens = decrypt_tokens_file(local_file_path, auth_config.get("password_hash", "")) or {}
-                else:
-                    decrypted_tokens = {}
-            except Exception as decrypt_error:
-                print(f"Error decrypting tokens for backup: {decrypt_error}")
-                decrypted_tokens = {}
-        elif isinstance(tokens_data, dict):
-            print("File is not encrypted, using as is")
-            decrypted_tokens = tokens_data
-        else:
-            decrypted_tokens = {}
-        
-        # Create a temporary file with the tokens
-        with tempfile.NamedTemporaryFile(mode='w', delete=False, suffix='.json') as temp_file:
-            json.dump(decrypted_tokens, temp_file, indent=4)
-            temp_file_path = temp_file.name
+        encrypted = local_file_path.endswith(ENCRYPTED_EXTENSION)
         
         # Get backup filename using the shared function
-        backup_filename = get_backup_filename()
+        backup_filename = get_backup_filename(encrypted)
         
         # Authenticate and get service
         service = authenticate_google_drive()
@@ -194,8 +161,9 @@ def upload_tokens_json_to_drive(local_file_path='tokens.json', drive_folder_name
             'parents': [folder_id]
         }
         
-        # Upload the decrypted file
-        media = MediaFileUpload(temp_file_path, mimetype='application/json')
+        # Upload the backup file in chunks
+        media = MediaFileUpload(local_file_path, mimetype='application/octet-stream' if encrypted else 'application/json',
+                                resumable=True)
         
         if files:
             # Update existing file if it exists
@@ -205,12 +173,6 @@ def upload_tokens_json_to_drive(local_file_path='tokens.json', drive_folder_name
             # Create new file if it doesn't exist
             service.files().create(body=file_metadata, media_body=media, fields='id').execute()
         
-        # Clean up the temporary file
-        try:
-            os.unlink(temp_file_path)
-        except Exception as e:
-            print(f"Warning: Could not delete temporary file {temp_file_path}: {e}")
-        
         print(f"Backup to Google Drive complete: {backup_filename}")
         return True
     except Exception as e:
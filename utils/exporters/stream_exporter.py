@@ -0,0 +1,241 @@
+import os
+import json
+import time
+import tempfile
+import urllib.parse
+from models.totp_engine import params_from_dict
+from utils.crypto import StreamEncryptor, decrypt_stream
+
+# Export formats: file extension and file dialog filter
+EXPORT_FORMATS = {
+    "winotp": (".json", "JSON Files (*.json)"),
+    "otpauth": (".txt", "Text Files (*.txt)"),
+    "2fas": (".2fas", "2FAS Backup (*.2fas)"),
+}
+
+ENCRYPTED_EXTENSION = ".enc"
+
+_CHUNK_SIZE = 64 * 1024        # Plaintext bytes per encrypted chunk
+_WRITE_BUFFER = 1024 * 1024    # Bytes buffered before each write to disk
+
+
+class ExportCancelled(Exception):
+    """Raised inside the export when the caller cancels it"""
+
+
+def otpauth_uri(token_data):
+    """Build the otpauth:// URI for a token (the format the Authenticator plugin importer reads)"""
+    issuer = token_data.get("issuer", "Unknown")
+    name = token_data.get("name", "Unknown")
+    params = params_from_dict(token_data)
+    label = f"{urllib.parse.quote(issuer, safe='')}:{urllib.parse.quote(name, safe='')}"
+    query = urllib.parse.urlencode({
+        "secret": token_data["secret"],
+        "issuer": issuer,
+        "algorithm": params.algorithm,
+        "digits": params.digits,
+        "period": params.period,
+    }, quote_via=urllib.parse.quote)
+    return f"otpauth://totp/{label}?{query}"
+
+
+class _WinOtpEncoder:
+    """WinOTP JSON, byte-for-byte what ``json.dumps(tokens, indent=4)`` produces"""
+
+    def begin(self):
+        return "{"
+
+    def record(self, index, token_id, token_data):
+        body = json.dumps(token_data, indent=4).replace("\n", "\n    ")
+        return ("," if index else "") + f"\n    {json.dumps(token_id)}: {body}"
+
+    def end(self, count):
+        return "\n}" if count else "}"
+
+
+class _OtpauthEncoder:
+    """One otpauth:// URI per line"""
+
+    def begin(self):
+        return ""
+
+    def record(self, index, token_id, token_data):
+        return otpauth_uri(token_data) + "\n"
+
+    def end(self, count):
+        return ""
+
+
+class _TwoFasEncoder:
+    """2FAS backup JSON (services list, as read by ``parse_2fas_json``)"""
+
+    def __init__(self):
+        self.updated_at = int(time.time() * 1000)
+
+    def begin(self):
+        return '{"services": ['
+
+    def record(self, index, token_id, token_data):
+        params = params_from_dict(token_data)
+        issuer = token_data.get("issuer", "Unknown")
+        name = token_data.get("name", "Unknown")
+        service = {
+            "name": issuer,
+            "secret": token_data["secret"],
+            "updatedAt": self.updated_at,
+            "otp": {
+                "label": name,
+                "account": name,
+                "issuer": issuer,
+                "digits": params.digits,
+                "period": params.period,
+                "algorithm": params.algorithm,
+                "tokenType": "TOTP",
+                "source": "Link"
+            },
+            "order": {"position": index}
+        }
+        return ("," if index else "") + json.dumps(service)
+
+    def end(self, count):
+        return (f'], "groups": [], "updatedAt": {self.updated_at}, '
+                f'"schemaVersion": 4, "appOrigin": "WinOTP"}}')
+
+
+_ENCODERS = {
+    "winotp": _WinOtpEncoder,
+    "otpauth": _OtpauthEncoder,
+    "2fas": _TwoFasEncoder,
+}
+
+
+class _EncryptedSink:
+    """Encrypts a byte stream as it is written (see ``utils.crypto.StreamEncryptor``).
+
+    Only the chunk being filled is kept in memory; sealed chunks go straight
+    to the file.
+    """
+
+    def __init__(self, file, password, content_format):
+        self._file = file
+        self._encryptor = StreamEncryptor(password, content_format, _CHUNK_SIZE)
+        file.write(self._encryptor.header)
+
+    def write(self, data):
+        for chunk in self._encryptor.update(data):
+            self._file.write(chunk)
+
+    def close(self):
+        self._file.write(self._encryptor.finalize())
+
+
+def read_encrypted_export(file, password):
+    """Decrypt an encrypted export chunk by chunk
+
+    Exports are encrypted streams (see ``utils.crypto.decrypt_stream``).
+
+    Args:
+        file: Binary file object positioned at the start of the export
+        password (str): Password the export was encrypted with
+
+    Returns:
+        tuple: ``(content_format, chunks)`` where ``chunks`` yields the plaintext bytes
+
+    Raises:
+        ValueError: If the file isn't an encrypted export, the password is wrong,
+            or the export was modified or truncated (raised while iterating)
+    """
+    return decrypt_stream(file, password)
+
+
+def write_export(tokens, total, file_path, export_format="winotp", password=None,
+                 progress_callback=None, cancel_event=None):
+    """Stream tokens to an export file
+
+    Records are encoded and written one at a time through a fixed-size buffer,
+    so memory stays bounded however large the vault is. The export is written
+    to a temporary file that replaces ``file_path`` only once it is complete;
+    a cancelled or failed export leaves nothing behind.
+
+    Args:
+        tokens: Iterable of ``(token_id, token_data)`` pairs
+        total (int): Number of tokens, for progress reporting
+        file_path (str): Destination file
+        export_format (str): One of ``EXPORT_FORMATS``
+        password (str, optional): Encrypt the export with this password
+        progress_callback (callable, optional): Called with ``(current, total)``
+            about every 1% of the tokens and once at the end
+        cancel_event (threading.Event, optional): Set to cancel the export
+
+    Returns:
+        int: Number of tokens exported
+
+    Raises:
+        ValueError: If the format is unknown
+        ExportCancelled: If ``cancel_event`` was set
+    """
+    if export_format not in _ENCODERS:
+        raise ValueError(f"Unknown export format: {export_format}")
+    encoder = _ENCODERS[export_format]()
+    report_every = max(1, total // 100)
+
+    directory = os.path.dirname(os.path.abspath(file_path))
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(file_path)}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb", buffering=_WRITE_BUFFER) as file:
+            sink = _EncryptedSink(file, password, export_format) if password else file
+            sink.write(encoder.begin().encode())
+
+            count = 0
+            for token_id, token_data in tokens:
+                if cancel_event is not None and cancel_event.is_set():
+                    raise ExportCancelled()
+                sink.write(encoder.record(count, token_id, token_data).encode())
+                count += 1
+                if progress_callback and count % report_every == 0:
+                    progress_callback(count, total)
+
+            sink.write(encoder.end(count).encode())
+            if password:
+                sink.close()
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp_path, file_path)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
+
+    if progress_callback:
+        progress_callback(count, total)
+    return count
+
+
+def write_backup_file(tokens, total, password=None):
+    """Stream tokens into a temporary backup file for the cloud uploaders
+
+    The backup is a WinOTP JSON export, written as an encrypted stream when a
+    password is given (the PIN or password of a protected vault), so neither the
+    plaintext nor the encrypted backup is ever held in memory as a whole.
+
+    Args:
+        tokens: Iterable of ``(token_id, token_data)`` pairs
+        total (int): Number of tokens
+        password (str, optional): Encrypt the backup with this password
+
+    Returns:
+        str: Path of the backup file; the caller deletes it after the upload
+    """
+    fd, backup_path = tempfile.mkstemp(prefix="winotp_backup_", suffix=".json" + (ENCRYPTED_EXTENSION if password else ""))
+    os.close(fd)
+    try:
+        write_export(tokens, total, backup_path, "winotp", password=password)
+    except BaseException:
+        try:
+            os.remove(backup_path)
+        except OSError:
+            pass
+        raise
+    return backup_path
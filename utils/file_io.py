@@ -1,11 +1,100 @@
 import json
 import os
+import tempfile
 import threading
+from collections import OrderedDict
 
-# Cache for file contents
-_file_cache = {}
+# Cache for file contents: path -> (stat signature, read-only data), least recently used first
+_file_cache = OrderedDict()
 _cache_lock = threading.Lock()
 _cache_enabled = True
+_CACHE_MAX_ENTRIES = 16
+
+
+class ReadOnlyDict(dict):
+    """A dict that refuses modification, handed out by the file cache.
+
+    Cached data is shared between callers, so it must not be changed in
+    place. ``copy()`` returns an ordinary (deep) mutable copy.
+    """
+
+    def _read_only(self, *args, **kwargs):
+        raise TypeError("Cached JSON data is read-only; use read_json(..., mutable=True) or copy()")
+
+    __setitem__ = __delitem__ = __ior__ = _read_only
+    clear = pop = popitem = setdefault = update = _read_only
+
+    def copy(self):
+        return thaw(self)
+
+    def __copy__(self):
+        return thaw(self)
+
+    def __deepcopy__(self, memo):
+        return thaw(self)
+
+    def __reduce__(self):
+        return (dict, (thaw(self),))
+
+
+class ReadOnlyList(list):
+    """A list that refuses modification (see ReadOnlyDict)"""
+
+    def _read_only(self, *args, **kwargs):
+        raise TypeError("Cached JSON data is read-only; use read_json(..., mutable=True) or copy()")
+
+    __setitem__ = __delitem__ = __iadd__ = __imul__ = _read_only
+    append = extend = insert = pop = remove = clear = sort = reverse = _read_only
+
+    def copy(self):
+        return thaw(self)
+
+    def __copy__(self):
+        return thaw(self)
+
+    def __deepcopy__(self, memo):
+        return thaw(self)
+
+    def __reduce__(self):
+        return (list, (thaw(self),))
+
+
+def _freeze(data):
+    """Return a read-only deep copy of parsed JSON data"""
+    if isinstance(data, dict):
+        frozen = ReadOnlyDict()
+        for key, value in data.items():
+            dict.__setitem__(frozen, key, _freeze(value))
+        return frozen
+    if isinstance(data, list):
+        frozen = ReadOnlyList()
+        for value in data:
+            list.append(frozen, _freeze(value))
+        return frozen
+    return data
+
+
+def thaw(data):
+    """Return an ordinary mutable deep copy of (possibly read-only) JSON data"""
+    if isinstance(data, dict):
+        return {key: thaw(value) for key, value in data.items()}
+    if isinstance(data, list):
+        return [thaw(value) for value in data]
+    return data
+
+
+def _stat_signature(stat_result):
+    """Identify a file version: a rewrite changes the mtime, size or (atomic replace) inode"""
+    return (stat_result.st_mtime_ns, stat_result.st_size, stat_result.st_ino)
+
+
+def file_signature(file_path):
+    """Return a value that changes whenever a file is rewritten, or None if it doesn't exist"""
+    try:
+        return _stat_signature(os.stat(file_path))
+    except OSError:
+        return None
+
 
 def enable_cache(enabled=True):
     """Enable or disable the file cache
@@ -18,53 +107,107 @@ def enable_cache(enabled=True):
 
 def clear_cache():
     """Clear the file cache"""
-    global _file_cache
     with _cache_lock:
         _file_cache.clear()
 
-def read_json(file_path):
+def invalidate_cache(file_path):
+    """Drop the cached entry for one file"""
+    with _cache_lock:
+        _file_cache.pop(os.path.abspath(file_path), None)
+
+def _cache_store(path, signature, data):
+    """Cache read-only data for a path, evicting the least recently used entries (lock held)"""
+    _file_cache[path] = (signature, data)
+    _file_cache.move_to_end(path)
+    while len(_file_cache) > _CACHE_MAX_ENTRIES:
+        _file_cache.popitem(last=False)
+
+def read_json(file_path, mutable=False):
     """Read and parse a JSON file
     
+    Files are cached per path and revalidated with a single ``os.stat``, so
+    repeated reads of an unchanged file come from memory. Cached data is shared,
+    so it is returned as a read-only view unless ``mutable`` is set.
+    
     Args:
         file_path (str): Path to the JSON file
+        mutable (bool): Return a private copy the caller may modify
         
     Returns:
         dict: The parsed JSON data or an empty dict if file not found or invalid
     """
-    global _file_cache, _cache_enabled
-    
-    # Check if file exists
-    if not os.path.exists(file_path):
+    path = os.path.abspath(file_path)
+    try:
+        signature = _stat_signature(os.stat(path))
+    except FileNotFoundError:
         print(f"File not found: {file_path}, creating empty token storage")
         return {}
+    except OSError as e:
+        print(f"Error accessing {file_path}: {e}")
+        return {}
     
     # Check cache first if enabled
     if _cache_enabled:
         with _cache_lock:
-            cache_key = f"{file_path}:{os.path.getmtime(file_path)}"
-            if cache_key in _file_cache:
-                # print(f"Using cached data for {file_path}") # Commented out to reduce log noise
-                return _file_cache[cache_key]
+            entry = _file_cache.get(path)
+            if entry is not None and entry[0] == signature:
+                _file_cache.move_to_end(path)
+                return thaw(entry[1]) if mutable else entry[1]
     
     try:
-        with open(file_path, 'r') as file:
+        with open(path, 'r') as file:
             data = json.load(file)
-            
-            # Cache the result if enabled
-            if _cache_enabled:
-                with _cache_lock:
-                    cache_key = f"{file_path}:{os.path.getmtime(file_path)}"
-                    _file_cache[cache_key] = data
-            
-            # Use a more generic log message
-            print(f"Successfully read JSON data ({len(data)} items) from {file_path}")
-            return data
     except FileNotFoundError:
         print(f"File not found: {file_path}, returning empty dict")
         return {}
     except json.JSONDecodeError as e:
         print(f"Error parsing JSON from {file_path}: {e}")
         return {}
+    
+    # Use a more generic log message
+    print(f"Successfully read JSON data ({len(data)} items) from {file_path}")
+    if mutable:
+        if _cache_enabled:
+            with _cache_lock:
+                _cache_store(path, signature, _freeze(data))
+        return data
+    
+    data = _freeze(data)
+    if _cache_enabled:
+        with _cache_lock:
+            _cache_store(path, signature, data)
+    return data
+
+def write_file_atomic(file_path, content):
+    """Atomically replace a file with new content
+    
+    The content is written to a temporary file in the same directory, flushed
+    to disk and then moved over the original with ``os.replace``, so a crash
+    leaves either the old file or the new one, never a truncated file.
+    
+    Args:
+        file_path (str): Path to the file
+        content (str | bytes): Content to write
+    """
+    directory = os.path.dirname(file_path)
+    if directory and not os.path.exists(directory):
+        os.makedirs(directory, exist_ok=True)
+        print(f"Created directory: {directory}")
+    
+    mode = 'wb' if isinstance(content, (bytes, bytearray)) else 'w'
+    fd, temp_path = tempfile.mkstemp(dir=directory or None, prefix=f".{os.path.basename(file_path)}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, mode) as file:
+            file.write(content)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp_path, file_path)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
 
 def write_json(file_path, data):
     """Write data to a JSON file
@@ -79,34 +222,22 @@ def write_json(file_path, data):
     print(f"Writing JSON data to {file_path}")
     
     try:
-        # Clear the cache to ensure we don't have stale data
-        clear_cache()
-        print(f"Cache cleared before writing to {file_path}")
+        # Only this file's cached entry can become stale
+        invalidate_cache(file_path)
         
-        # Create directory if it doesn't exist
-        directory = os.path.dirname(file_path)
-        if directory and not os.path.exists(directory):
-            os.makedirs(directory, exist_ok=True)
-            print(f"Created directory: {directory}")
-        
-        # Write the file using JSON formatting
-        with open(file_path, 'w') as file:
-            json.dump(data, file, indent=4)
-            file.flush()
-            os.fsync(file.fileno())
+        # Serialize first so a failure never touches the existing file, then write atomically
+        write_file_atomic(file_path, json.dumps(data, indent=4))
         print("Data written and flushed to file")
         
-        # Update cache if enabled
+        # Update cache if enabled (a read-only copy, so later changes by the caller don't leak in)
         if _cache_enabled:
-            with _cache_lock:
-                try:
-                    cache_key = f"{file_path}:{os.path.getmtime(file_path)}"
-                    _file_cache[cache_key] = data
-                    print(f"Cache updated with key: {cache_key}")
-                except Exception as e:
-                    print(f"Error updating cache: {e}")
-        else:
-            print("Cache is disabled, skipping cache update")
+            path = os.path.abspath(file_path)
+            try:
+                signature = _stat_signature(os.stat(path))
+                with _cache_lock:
+                    _cache_store(path, signature, _freeze(data))
+            except Exception as e:
+                print(f"Error updating cache: {e}")
             
         return True
     except Exception as e:
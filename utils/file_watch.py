@@ -0,0 +1,269 @@
+import os
+import sys
+import ctypes
+import ctypes.util
+import errno
+import struct
+import select
+import threading
+
+from .file_io import file_signature
+
+# inotify(7) constants
+_IN_MODIFY = 0x00000002
+_IN_ATTRIB = 0x00000004
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_FROM = 0x00000040
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_DELETE = 0x00000200
+_IN_Q_OVERFLOW = 0x00004000
+_IN_IGNORED = 0x00008000
+_IN_NONBLOCK = 0o4000
+_IN_CLOEXEC = 0o2000000
+
+_WATCH_MASK = (_IN_MODIFY | _IN_ATTRIB | _IN_CLOSE_WRITE | _IN_MOVED_FROM
+               | _IN_MOVED_TO | _IN_CREATE | _IN_DELETE)
+_EVENT_HEADER = struct.Struct("iIII")  # wd, mask, cookie, len
+
+
+def _load_inotify():
+    """Return libc if it provides inotify, otherwise None"""
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        libc.inotify_init1.argtypes = [ctypes.c_int]
+        libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        libc.inotify_rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+        return libc
+    except (OSError, AttributeError):
+        return None
+
+
+class FileWatcher:
+    """Tell callers when watched files change on disk.
+
+    The directory of each file is watched rather than the file itself, so an
+    atomic replace (a new file moved over the old name) is seen like any other
+    write. On Linux the kernel reports changes through inotify and the watcher
+    thread sleeps until it does; elsewhere, or for directories inotify can't
+    watch, each file is polled with one ``os.stat`` per ``interval``.
+
+    Callbacks run on the watcher thread with the path that changed. Changes
+    reported together are collapsed, so a burst of writes to one file calls its
+    callbacks once.
+    """
+
+    def __init__(self, interval=1.0, use_inotify=True):
+        """
+        Args:
+            interval (float): Seconds between polls of files inotify doesn't cover
+            use_inotify (bool): Use inotify when available (False forces polling)
+        """
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._callbacks = {}    # path -> [callback]
+        self._polled = {}       # path -> last stat signature, for files without an inotify watch
+        self._directories = {}  # directory -> inotify watch descriptor
+        self._watch_dirs = {}   # watch descriptor -> directory
+
+        self._libc = _load_inotify() if use_inotify else None
+        self._inotify_fd = None
+        self._wake_fds = None
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    @property
+    def backend(self):
+        """"inotify" or "polling" """
+        return "inotify" if self._libc is not None else "polling"
+
+    def watch(self, path, callback):
+        """Call ``callback(path)`` whenever ``path`` changes (starts the watcher thread)"""
+        path = os.path.abspath(path)
+        self.start()
+        with self._lock:
+            callbacks = self._callbacks.setdefault(path, [])
+            if callback not in callbacks:
+                callbacks.append(callback)
+            if len(callbacks) == 1 and not self._add_directory_watch(os.path.dirname(path)):
+                self._polled[path] = file_signature(path)
+                self._wake()
+
+    def unwatch(self, path, callback=None):
+        """Stop reporting changes to ``path`` (to one callback, or to all of them)"""
+        path = os.path.abspath(path)
+        with self._lock:
+            callbacks = self._callbacks.get(path)
+            if callbacks is None:
+                return
+            if callback is not None and callback in callbacks:
+                callbacks.remove(callback)
+            if callback is None or not callbacks:
+                del self._callbacks[path]
+                self._polled.pop(path, None)
+                self._remove_directory_watch(os.path.dirname(path))
+
+    def start(self):
+        """Start the watcher thread if it isn't running"""
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._stop_event.clear()
+            if self._libc is not None and self._inotify_fd is None:
+                fd = self._libc.inotify_init1(_IN_NONBLOCK | _IN_CLOEXEC)
+                if fd < 0:
+                    print(f"inotify unavailable ({os.strerror(ctypes.get_errno())}), polling files instead")
+                    self._libc = None
+                else:
+                    self._inotify_fd = fd
+                    self._wake_fds = os.pipe()
+            target = self._run_inotify if self._inotify_fd is not None else self._run_polling
+            self._thread = threading.Thread(target=target, daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Stop the watcher thread and release the inotify descriptor"""
+        with self._lock:
+            thread, self._thread = self._thread, None
+            self._stop_event.set()
+            self._wake()
+        if thread is not None and thread is not threading.current_thread():
+            thread.join()
+        with self._lock:
+            if self._inotify_fd is not None:
+                os.close(self._inotify_fd)
+                self._inotify_fd = None
+                self._directories.clear()
+                self._watch_dirs.clear()
+                # Files left without a watch fall back to polling if the watcher is restarted
+                for path in self._callbacks:
+                    self._polled.setdefault(path, file_signature(path))
+            if self._wake_fds is not None:
+                for fd in self._wake_fds:
+                    os.close(fd)
+                self._wake_fds = None
+
+    # --- inotify ----------------------------------------------------------
+
+    def _add_directory_watch(self, directory):
+        """Watch a directory with inotify; returns False if it can't be (lock held)"""
+        if self._inotify_fd is None:
+            return False
+        if directory in self._directories:
+            return True
+        wd = self._libc.inotify_add_watch(self._inotify_fd, os.fsencode(directory), _WATCH_MASK)
+        if wd < 0:
+            print(f"Cannot watch {directory} with inotify ({os.strerror(ctypes.get_errno())}), polling instead")
+            return False
+        self._directories[directory] = wd
+        self._watch_dirs[wd] = directory
+        return True
+
+    def _remove_directory_watch(self, directory):
+        """Drop a directory's inotify watch once no watched file is left in it (lock held)"""
+        if directory not in self._directories:
+            return
+        if any(os.path.dirname(path) == directory for path in self._callbacks if path not in self._polled):
+            return
+        wd = self._directories.pop(directory)
+        self._watch_dirs.pop(wd, None)
+        self._libc.inotify_rm_watch(self._inotify_fd, wd)
+
+    def _wake(self):
+        """Interrupt the inotify thread's wait (lock held)"""
+        if self._wake_fds is not None:
+            os.write(self._wake_fds[1], b"x")
+
+    def _run_inotify(self):
+        inotify_fd, wake_fd = self._inotify_fd, self._wake_fds[0]
+        while not self._stop_event.is_set():
+            with self._lock:
+                timeout = self.interval if self._polled else None
+            try:
+                readable, _, _ = select.select([inotify_fd, wake_fd], [], [], timeout)
+            except InterruptedError:
+                continue
+            if wake_fd in readable:
+                # Woken to stop, or to start polling a newly watched file
+                os.read(wake_fd, 512)
+                continue
+            changed = self._read_events(inotify_fd) if inotify_fd in readable else set()
+            changed |= self._poll()
+            self._notify(changed)
+
+    def _read_events(self, inotify_fd):
+        """Read pending inotify events and return the watched paths they touched"""
+        changed = set()
+        while True:
+            try:
+                buffer = os.read(inotify_fd, 64 * 1024)
+            except BlockingIOError:
+                break
+            except OSError as e:
+                if e.errno == errno.EINTR:
+                    continue
+                raise
+            if not buffer:
+                break
+
+            with self._lock:
+                offset = 0
+                while offset + _EVENT_HEADER.size <= len(buffer):
+                    wd, mask, _, length = _EVENT_HEADER.unpack_from(buffer, offset)
+                    name = buffer[offset + _EVENT_HEADER.size:offset + _EVENT_HEADER.size + length].rstrip(b"\0")
+                    offset += _EVENT_HEADER.size + length
+
+                    if mask & _IN_Q_OVERFLOW:
+                        # Events were dropped: assume every watched file changed
+                        changed.update(self._callbacks)
+                        continue
+                    directory = self._watch_dirs.get(wd)
+                    if directory is None:
+                        continue
+                    if mask & _IN_IGNORED:
+                        # The directory went away: poll its files from now on
+                        self._watch_dirs.pop(wd, None)
+                        self._directories.pop(directory, None)
+                        for path in self._callbacks:
+                            if os.path.dirname(path) == directory:
+                                self._polled.setdefault(path, file_signature(path))
+                                changed.add(path)
+                        continue
+                    if not name:
+                        continue
+                    path = os.path.join(directory, os.fsdecode(name))
+                    if path in self._callbacks:
+                        changed.add(path)
+        return changed
+
+    # --- Polling ----------------------------------------------------------
+
+    def _run_polling(self):
+        while not self._stop_event.wait(self.interval):
+            self._notify(self._poll())
+
+    def _poll(self):
+        """Stat polled files and return the ones whose signature changed"""
+        with self._lock:
+            paths = list(self._polled)
+        changed = set()
+        for path in paths:
+            signature = file_signature(path)
+            with self._lock:
+                if path in self._polled and self._polled[path] != signature:
+                    self._polled[path] = signature
+                    changed.add(path)
+        return changed
+
+    def _notify(self, paths):
+        for path in paths:
+            with self._lock:
+                callbacks = list(self._callbacks.get(path, ()))
+            for callback in callbacks:
+                try:
+                    callback(path)
+                except Exception as e:
+                    print(f"File watch callback for {path} failed: {e}")
+
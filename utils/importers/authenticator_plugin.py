@@ -1,6 +1,7 @@
 import urllib.parse
 import base64
 import pyotp # Assuming pyotp is used for validation, add to requirements if needed
+from models.totp_engine import params_from_query
 
 def is_valid_base32(s):
     """Check if a string is valid base32."""
@@ -96,6 +97,14 @@ def parse_authenticator_plugin_export(file_content, progress_callback=None):
                  failed_validation += 1
                  continue
 
+            # period/digits/algorithm, defaulting to 30s/6/SHA1
+            try:
+                otp_params = params_from_query(params)
+            except ValueError as e:
+                print(f"Skipping line {i+1}: {e}")
+                failed_validation += 1
+                continue
+
             # Use pyotp to further validate secret (optional but good)
             try:
                 pyotp.TOTP(secret).now() 
@@ -111,7 +120,10 @@ def parse_authenticator_plugin_export(file_content, progress_callback=None):
             valid_tokens.append({
                 'issuer': issuer,
                 'name': name,
-                'secret': secret.upper() # Store secrets consistently
+                'secret': secret.upper(), # Store secrets consistently
+                'period': otp_params.period,
+                'digits': otp_params.digits,
+                'algorithm': otp_params.algorithm
             })
             
         except Exception as e:
@@ -2,6 +2,7 @@ import json
 from datetime import datetime
 import base64 # Needed for base32 validation check via Token model
 from models.token import Token  # Import Token for validation
+from models.totp_engine import normalize_params
 
 def parse_2fas_json(file_content, progress_callback=None):
     """
@@ -53,11 +54,22 @@ def parse_2fas_json(file_content, progress_callback=None):
                     print(f"Skipping 2FAS token due to invalid base32 secret. Issuer: {issuer}, Name: {account_name}")
                     continue
 
+                # Validate the TOTP parameters (2FAS stores them alongside the account)
+                try:
+                    params = normalize_params(otp_details.get("period"), otp_details.get("digits"), otp_details.get("algorithm"))
+                except ValueError as e:
+                    failed_validation += 1
+                    print(f"Skipping 2FAS token due to unsupported parameters ({e}). Issuer: {issuer}, Name: {account_name}")
+                    continue
+
                 # Add validated token data to list
                 valid_tokens.append({
                     "issuer": issuer,
                     "name": account_name,
-                    "secret": secret
+                    "secret": secret,
+                    "period": params.period,
+                    "digits": params.digits,
+                    "algorithm": params.algorithm
                     # "created" timestamp will be added when adding to the main dict
                 })
 
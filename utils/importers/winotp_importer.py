@@ -2,6 +2,7 @@ import json
 from datetime import datetime
 import base64 # Needed for base32 validation check via Token model
 from models.token import Token  # Import Token for validation
+from models.totp_engine import params_from_dict
 
 def parse_winotp_json(json_str):
     """
@@ -33,10 +34,19 @@ def parse_winotp_json(json_str):
                     print(f"Skipping token '{token_id}' due to invalid base32 secret.")
                     continue # Skip invalid secrets silently
 
+                try:
+                    params = params_from_dict(token_data)
+                except ValueError as e:
+                    print(f"Skipping token '{token_id}' due to unsupported parameters: {e}")
+                    continue
+
                 valid_tokens.append({
                     "issuer": token_data.get("issuer", "Unknown"),
                     "name": token_data.get("name", "Unknown"),
-                    "secret": secret
+                    "secret": secret,
+                    "period": params.period,
+                    "digits": params.digits,
+                    "algorithm": params.algorithm
                     # "created" timestamp will be added when adding to the main dict
                 })
                 processed_ids.add(token_id)
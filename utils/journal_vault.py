@@ -0,0 +1,340 @@
+import os
+import json
+import base64
+import hashlib
+import threading
+from cryptography.fernet import Fernet, InvalidToken
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+from .crypto import (
+    LEGACY_KDF_PARAMS, VaultEnvelope, vault_session, kdf_params, encrypt_tokens, decrypt_tokens,
+    is_encrypted_vault
+)
+from .file_io import write_file_atomic, invalidate_cache
+from .vault_storage import VaultStorage
+
+JOURNAL_FORMAT = "winotp-journal"
+JOURNAL_VERSION = 1
+_JOURNAL_KEY_INFO = b"WinOTP journal"
+
+
+def _journal_key(key):
+    """Expand a session key into the Fernet key of journal records
+
+    The session key is an AES-GCM key for the vault; Fernet gets its own key
+    rather than reusing it under a second cipher.
+    """
+    return base64.urlsafe_b64encode(HKDF(algorithm=hashes.SHA256(), length=32, salt=None,
+                                         info=_JOURNAL_KEY_INFO).derive(base64.urlsafe_b64decode(key)))
+
+
+class JournalVault(VaultStorage):
+    """Vault storage made of a snapshot plus an append-only journal.
+
+    The snapshot is the regular ``tokens.json`` (plain or encrypted, in the
+    same format ``save_tokens`` writes), so other readers keep working. Every
+    edit appends one record to ``tokens.json.journal`` instead of rewriting
+    the whole vault, so an edit costs O(1) in the vault size:
+
+    - With a password, each record is a Fernet token (AES-CBC + HMAC) under the
+      session's vault key, so records are encrypted and authenticated.
+    - Without one, each record carries a SHA-256 checksum, which detects torn
+      or corrupted writes.
+
+    The journal header names the SHA-256 of the snapshot it applies to. Loading
+    replays the journal over the snapshot; a journal written for another
+    snapshot (e.g. a crash right after compaction) is ignored because its
+    records are already in the newer snapshot. A record that is incomplete,
+    fails verification or is out of sequence marks an interrupted append: it
+    and everything after it are truncated.
+
+    Once the journal passes ``compact_threshold`` bytes it is folded into a new
+    snapshot on a background thread.
+    """
+
+    format = "journal"
+    incremental = True
+
+    def __init__(self, snapshot_path, password=None, compact_threshold=64 * 1024):
+        """
+        Args:
+            snapshot_path (str): Path to tokens.json
+            password (str): Password for an encrypted vault, or None for a plain one
+            compact_threshold (int): Journal size in bytes that triggers compaction
+        """
+        super().__init__(snapshot_path, password)
+        self.snapshot_path = snapshot_path
+        self.journal_path = snapshot_path + ".journal"
+        self.compact_threshold = compact_threshold
+
+        self._lock = threading.RLock()
+        self._tokens = {}
+        self._snapshot_digest = None
+        self._salt = None
+        self._kdf = None
+        self._fernet = None
+        self._envelope = VaultEnvelope()  # Snapshot records, so compaction only encrypts what changed
+        self._sequence = 0
+        self._edits = 0  # Bumped by every change to the in-memory tokens
+        self._journal_size = 0
+        self._compaction_thread = None
+
+    # --- Loading ----------------------------------------------------------
+
+    def load(self):
+        """Load the snapshot and replay the journal over it
+
+        Returns:
+            dict: Tokens in the ``{token_id: token_data}`` format, or None if the
+                snapshot could not be decrypted
+        """
+        with self._lock:
+            content = b""
+            if os.path.exists(self.snapshot_path):
+                with open(self.snapshot_path, "rb") as file:
+                    content = file.read()
+            tokens = self._parse_snapshot(content)
+            if tokens is None:
+                return None
+
+            self._tokens = tokens
+            self._edits += 1
+            self._snapshot_digest = hashlib.sha256(content).hexdigest()
+            self._sequence = 0
+            self._journal_size = 0
+            self._replay()
+            self._remember_files()
+            return dict(self._tokens)
+
+    def _parse_snapshot(self, content):
+        if self.password is None and is_encrypted_vault(content):
+            print("Journal vault: snapshot is encrypted but no password was given")
+            return None
+        return decrypt_tokens(content, self.password, self._envelope)
+
+    def _replay(self):
+        """Apply journal records to the loaded snapshot, truncating a torn tail"""
+        if not os.path.exists(self.journal_path):
+            return
+
+        with open(self.journal_path, "rb") as file:
+            header_line = file.readline()
+            try:
+                header = json.loads(header_line)
+                valid = (header.get("format") == JOURNAL_FORMAT
+                         and header.get("version") == JOURNAL_VERSION
+                         and header.get("snapshot") == self._snapshot_digest)
+            except (ValueError, AttributeError):
+                valid = False
+            if not valid or not header_line.endswith(b"\n"):
+                # Written for an older snapshot (already folded in) or unreadable
+                print("Journal vault: ignoring journal that does not match the snapshot")
+                return
+
+            try:
+                # Journals from before the unified key derivation name no KDF
+                self._use_salt(header.get("salt"), kdf_params(header) if "kdf" in header else LEGACY_KDF_PARAMS)
+            except ValueError as e:
+                print(f"Journal vault: ignoring journal with unusable key parameters ({e})")
+                return
+            offset = len(header_line)
+            applied = 0
+            for line in file:
+                payload = self._verify(line) if line.endswith(b"\n") else None
+                if payload is None or payload.get("seq") != self._sequence + 1:
+                    break
+                self._apply(payload)
+                self._sequence = payload["seq"]
+                offset += len(line)
+                applied += 1
+            else:
+                self._journal_size = offset
+                print(f"Journal vault: replayed {applied} journal records")
+                return
+
+        # Interrupted append or corruption: keep only the verified prefix
+        print(f"Journal vault: truncating journal after {applied} valid records")
+        with open(self.journal_path, "r+b") as file:
+            file.truncate(offset)
+            file.flush()
+            os.fsync(file.fileno())
+        self._journal_size = offset
+
+    def _apply(self, payload):
+        if payload["op"] == "put":
+            self._tokens[payload["id"]] = payload["data"]
+        elif payload["op"] == "delete":
+            self._tokens.pop(payload["id"], None)
+
+    # --- Record encoding --------------------------------------------------
+
+    def _use_salt(self, salt, params=None):
+        """Set up the record cipher for a journal's salt and KDF, or for a new journal if salt is None (lock held)"""
+        if self.password is None:
+            self._salt, self._kdf, self._fernet = None, None, None
+            return
+        if salt is None:
+            # New journals use the session key, derived when the vault was unlocked
+            key, self._salt, self._kdf = vault_session.write_key(self.password)
+        else:
+            salt = base64.b64decode(salt) if isinstance(salt, str) else salt
+            if self._fernet is not None and salt == self._salt and params == self._kdf:
+                return
+            key = vault_session.key_for(self.password, salt, params)
+            self._salt, self._kdf = salt, params
+        self._fernet = Fernet(_journal_key(key))
+
+    def _encode(self, payload):
+        data = json.dumps(payload, separators=(",", ":")).encode()
+        if self._fernet is not None:
+            return self._fernet.encrypt(data) + b"\n"
+        return base64.b64encode(data) + b"." + hashlib.sha256(data).hexdigest().encode() + b"\n"
+
+    def _verify(self, line):
+        """Decode a journal line, or return None if it fails verification"""
+        line = line.rstrip(b"\n")
+        try:
+            if self._fernet is not None:
+                data = self._fernet.decrypt(line)
+            else:
+                encoded, _, checksum = line.partition(b".")
+                data = base64.b64decode(encoded, validate=True)
+                if hashlib.sha256(data).hexdigest().encode() != checksum:
+                    return None
+            payload = json.loads(data)
+            return payload if isinstance(payload, dict) else None
+        except (InvalidToken, ValueError):
+            return None
+
+    def _header(self, digest):
+        salt = base64.b64encode(self._salt).decode() if self._salt is not None else None
+        header = {"format": JOURNAL_FORMAT, "version": JOURNAL_VERSION, "snapshot": digest, "salt": salt}
+        if self._kdf is not None:
+            header.update(self._kdf)
+        return json.dumps(header).encode() + b"\n"
+
+    # --- Mutation ---------------------------------------------------------
+
+    def put(self, token_id, token_data):
+        """Add or replace a token by appending one journal record"""
+        self._append({"op": "put", "id": token_id, "data": token_data})
+
+    def delete(self, token_id):
+        """Remove a token by appending one journal record"""
+        self._append({"op": "delete", "id": token_id})
+
+    def _append(self, payload):
+        with self._lock:
+            if self._snapshot_digest is None:
+                raise RuntimeError("Journal vault must be loaded before it is modified")
+            if self._journal_size == 0:
+                # Start a journal for the current snapshot
+                self._use_salt(None)
+                header = self._header(self._snapshot_digest)
+                write_file_atomic(self.journal_path, header)
+                self._journal_size = len(header)
+
+            payload["seq"] = self._sequence + 1
+            line = self._encode(payload)
+            with open(self.journal_path, "ab") as file:
+                file.write(line)
+                file.flush()
+                os.fsync(file.fileno())
+            self._sequence += 1
+            self._edits += 1
+            self._journal_size += len(line)
+            self._apply(payload)
+            self._remember_files()
+
+            if self._journal_size >= self.compact_threshold:
+                self.compact_in_background()
+
+    # --- Compaction -------------------------------------------------------
+
+    def _snapshot_content(self, tokens):
+        if self.password is not None:
+            return encrypt_tokens(tokens, self.password, envelope=self._envelope)
+        return json.dumps(tokens, indent=4).encode()
+
+    def write_snapshot(self, tokens=None):
+        """Write a new snapshot and start an empty journal for it
+
+        Args:
+            tokens (dict): Tokens to write; defaults to the current contents
+        """
+        for _ in range(3):
+            with self._lock:
+                edits = self._edits
+                current = dict(self._tokens if tokens is None else tokens)
+            # Serializing and encrypting happens without blocking edits
+            content = self._snapshot_content(current)
+            with self._lock:
+                if self._edits == edits:
+                    self._install_snapshot(current, content)
+                    return
+        # Edits kept arriving; finish while holding the lock
+        with self._lock:
+            current = dict(self._tokens if tokens is None else tokens)
+            self._install_snapshot(current, self._snapshot_content(current))
+
+    def save_all(self, tokens):
+        self.write_snapshot(tokens)
+        return True
+
+    def _install_snapshot(self, tokens, content):
+        """Replace the snapshot, then drop the journal it includes (lock held)"""
+        write_file_atomic(self.snapshot_path, content)
+        invalidate_cache(self.snapshot_path)
+        self._tokens = tokens
+        self._edits += 1
+        self._snapshot_digest = hashlib.sha256(content).hexdigest()
+        # A crash before this point leaves a journal for the old snapshot, which load ignores
+        try:
+            os.remove(self.journal_path)
+        except FileNotFoundError:
+            pass
+        self._journal_size = 0
+        self._sequence = 0
+        self._remember_files()
+        print(f"Journal vault: compacted {len(tokens)} tokens into a new snapshot")
+
+    def compact_in_background(self):
+        """Fold the journal into a new snapshot on a background thread"""
+        with self._lock:
+            if self._compaction_thread is not None and self._compaction_thread.is_alive():
+                return
+            self._compaction_thread = threading.Thread(target=self._compact_safely, daemon=True)
+            self._compaction_thread.start()
+
+    def _compact_safely(self):
+        try:
+            self.write_snapshot()
+        except Exception as e:
+            print(f"Journal vault: background compaction failed: {e}")
+
+    def flush(self):
+        """Fold any journal records into the snapshot so tokens.json is current"""
+        thread = self._compaction_thread
+        if thread is not None:
+            thread.join()
+        with self._lock:
+            if self._journal_size > 0:
+                self.write_snapshot()
+
+    @property
+    def watch_paths(self):
+        return (self.snapshot_path, self.journal_path)
+
+    def is_current(self):
+        with self._lock:
+            return super().is_current()
+
+    @property
+    def loaded(self):
+        """True once the vault was loaded or written, so edits can be journaled"""
+        return self._snapshot_digest is not None
+
+    @property
+    def journal_size(self):
+        """Current journal size in bytes (0 when everything is in the snapshot)"""
+        return self._journal_size
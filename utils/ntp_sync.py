@@ -3,6 +3,7 @@ import time
 import threading
 import logging
 from datetime import datetime
+from utils.clock import Clock, SystemClock
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -26,6 +27,7 @@ _sync_initialized = False  # Flag to track if sync has been initialized
 _last_request_time = 0  # Last time get_accurate_time was called
 _request_count = 0  # Counter for get_accurate_time requests
 _sync_in_progress = False  # Flag to prevent multiple concurrent syncs
+_base_clock = SystemClock()  # Uncorrected clock the NTP offset is applied to
 
 def get_ntp_time(server=None):
     """
@@ -80,7 +82,7 @@ def calculate_offset():
         # Try each NTP server until one succeeds
         ntp_time = get_ntp_time()
         if ntp_time is not None:
-            system_time = time.time()
+            system_time = _base_clock.time()
             offset = ntp_time - system_time
             
             with _sync_lock:
@@ -112,10 +114,10 @@ def get_accurate_time():
     # Ensure NTP sync is initialized
     if not _sync_initialized:
         # Just use system time on first call
-        return time.time()
+        return _base_clock.time()
         
     with _sync_lock:
-        current_time = time.time()
+        current_time = _base_clock.time()
         
         # Track request frequency
         if current_time - _last_request_time < 1.0:  # Within 1 second
@@ -141,6 +143,37 @@ def get_accurate_time():
         
         return current_time + _time_offset
 
+def set_base_clock(clock):
+    """
+    Set the uncorrected clock the NTP offset is applied to.
+    
+    Args:
+        clock (Clock): Clock to use, or None to restore the system clock
+    """
+    global _base_clock
+    _base_clock = clock if clock is not None else SystemClock()
+
+class NtpClock(Clock):
+    """Clock that returns the NTP-corrected time (see get_accurate_time)"""
+
+    def time(self):
+        return get_accurate_time()
+
+# Default clock for code generation
+default_clock = NtpClock()
+
+def get_accurate_timestamp(period=30):
+    """
+    Get the current TOTP window number for a period, adjusted by the NTP offset.
+    
+    Args:
+        period (int): TOTP period in seconds. Defaults to 30.
+    
+    Returns:
+        int: Current window number
+    """
+    return int(get_accurate_time() // period)
+
 def get_accurate_timestamp_30s():
     """
     Get the current 30-second timestamp adjusted by the NTP offset.
@@ -149,7 +182,7 @@ def get_accurate_timestamp_30s():
     Returns:
         int: Current 30-second timestamp
     """
-    return int(get_accurate_time() // 30)
+    return get_accurate_timestamp(30)
 
 def format_time(timestamp=None):
     """
@@ -231,7 +264,7 @@ def get_sync_status():
     """
     with _sync_lock:
         # Calculate time since last sync
-        current_time = time.time()
+        current_time = _base_clock.time()
         time_since_sync = current_time - _last_sync if _last_sync > 0 else float('inf')
         
         # Determine if we're synced (had a successful sync in the last sync interval)
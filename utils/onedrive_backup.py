@@ -1,13 +1,10 @@
 import os
 import json
-import tempfile
 import webbrowser
 from datetime import datetime
 import requests
 import msal
-from utils.auth import get_auth_type
-from utils.crypto import decrypt_tokens_file
-from utils.file_io import read_json
+from utils.exporters.stream_exporter import ENCRYPTED_EXTENSION
 
 # OneDrive API settings
 # Using 'common' endpoint to support both personal and business accounts
@@ -29,7 +26,6 @@ CLIENT_ID = "fec71448-5af2-4b56-aa74-114bfb6cd647"  # Replace with your actual c
 SCOPES = ["Files.ReadWrite"]
 REDIRECT_URI = "http://localhost:8000"
 TOKEN_PATH = os.path.join(os.path.expandvars('%APPDATA%'), 'WinOTP', 'token_onedrive.json')
-AUTH_CONFIG_PATH = os.path.join(os.path.expandvars('%APPDATA%'), 'WinOTP', 'auth_config.json')
 
 
 def _is_access_token_valid(token):
@@ -283,15 +279,16 @@ def authenticate_user():
     return result
 
 
-def get_backup_filename():
+def get_backup_filename(encrypted=False):
     """
     Returns the backup filename for today's date.
+    Encrypted backups (of a protected vault) get the encrypted export extension.
     """
     current_date = datetime.now().strftime("%Y-%m-%d")
-    return f"tokens_backup_{current_date}.json"
+    return f"tokens_backup_{current_date}.json" + (ENCRYPTED_EXTENSION if encrypted else "")
 
 
-def check_backup_exists(folder_name="WinOTP Backups"):
+def check_backup_exists(folder_name="WinOTP Backups", encrypted=False):
     """
     Checks if today's backup file exists on OneDrive.
     Returns True if the file exists, False otherwise.
@@ -315,7 +312,7 @@ def check_backup_exists(folder_name="WinOTP Backups"):
         access_token = token_result["access_token"]
         
         # Get backup filename
-        backup_filename = get_backup_filename()
+        backup_filename = get_backup_filename(encrypted)
         
         # First, check if the folder exists
         folder_id = get_or_create_folder(access_token, folder_name)
@@ -422,56 +419,28 @@ def get_or_create_folder(access_token, folder_name):
         return None
 
 
-def upload_tokens_json_to_onedrive(local_file_path='tokens.json', folder_name='WinOTP Backups'):
+def upload_tokens_json_to_onedrive(local_file_path, folder_name='WinOTP Backups'):
     """
-    Uploads tokens.json to OneDrive in a specific folder. Creates/updates the file as needed.
-    The backup file will be decrypted and include the current date in the filename.
+    Uploads a backup file to OneDrive in a specific folder. Creates/updates the file as needed.
+    The backup is written by ``write_backup_file`` (an encrypted stream for protected vaults)
+    and is streamed from disk; the filename includes the current date.
     """
     # Import required modules inside the function to avoid scope issues
-    import json
     import os
-    import tempfile
     from datetime import datetime
     
     try:
         print(f"===== ONEDRIVE BACKUP PROCESS STARTED =====")
         print(f"Starting OneDrive backup process for {local_file_path}")
         print(f"Backup folder name: {folder_name}")
-        print(f"Current working directory: {os.getcwd()}")
         print(f"Local file exists: {os.path.exists(local_file_path)}")
-        print(f"Local file absolute path: {os.path.abspath(local_file_path)}")
         # Print MSAL version for debugging
         print(f"MSAL version: {msal.__version__ if hasattr(msal, '__version__') else 'Unknown'}")
         print(f"Token path: {TOKEN_PATH}")
         print(f"Token file exists: {os.path.exists(TOKEN_PATH)}")
         os.makedirs(os.path.dirname(TOKEN_PATH), exist_ok=True)
-        tokens_data = read_json(local_file_path)
-        print("Preparing data for OneDrive backup...")
-        decrypted_tokens = {}
-        if isinstance(tokens_data, dict) and tokens_data.get("encrypted", False):
-            print("File is encrypted, creating unencrypted backup...")
-            try:
-                auth_type = get_auth_type()
-                auth_config = read_json(AUTH_CONFIG_PATH) or {}
-                if auth_type == "pin":
-                    decrypted_tokens = decrypt_tokens_file(local_file_path, auth_config.get("pin_hash", "")) or {}
-                elif auth_type == "password":
-                    decrypted_tokens = decrypt_tokens_file(local_file_path, auth_config.get("password_hash", "")) or {}
-                else:
-                    decrypted_tokens = {}
-            except Exception as decrypt_error:
-                print(f"Error decrypting tokens for OneDrive backup: {decrypt_error}")
-                decrypted_tokens = {}
-        elif isinstance(tokens_data, dict):
-            print("File is not encrypted, using as is")
-            decrypted_tokens = tokens_data
-        else:
-            decrypted_tokens = {}
-        # Create a temporary file with the tokens
-        with tempfile.NamedTemporaryFile(mode='w', delete=False, suffix='.json') as temp_file:
-            json.dump(decrypted_tokens, temp_file, indent=4)
-            temp_file_path = temp_file.name
-        backup_filename = get_backup_filename()
+        encrypted = local_file_path.endswith(ENCRYPTED_EXTENSION)
+        backup_filename = get_backup_filename(encrypted)
         print(f"Backup filename: {backup_filename}")
         print("Getting authentication token...")
         token_result = get_auth_token()
@@ -512,39 +481,25 @@ def upload_tokens_json_to_onedrive(local_file_path='tokens.json', folder_name='W
         except Exception as e:
             print(f"Exception during file search: {e}")
             return False
-        with open(temp_file_path, 'rb') as f:
-            file_content = f.read()
         if files:
             file_id = files[0]["id"]
             print(f"Updating existing file with ID: {file_id}")
-            update_url = f"https://graph.microsoft.com/v1.0/me/drive/items/{file_id}/content"
-            try:
-                response = requests.put(update_url, headers=headers, data=file_content)
-                if response.status_code not in [200, 201]:
-                    print(f"Error updating file: {response.text}")
-                    return False
-                print(f"File updated successfully with status code: {response.status_code}")
-                print(f"File URL: {response.json().get('webUrl', 'Unknown')}")
-            except Exception as e:
-                print(f"Exception during file update: {e}")
-                return False
+            upload_url = f"https://graph.microsoft.com/v1.0/me/drive/items/{file_id}/content"
         else:
             print(f"Creating new file '{backup_filename}'")
             upload_url = f"https://graph.microsoft.com/v1.0/me/drive/items/{folder_id}:/{backup_filename}:/content"
-            try:
-                response = requests.put(upload_url, headers=headers, data=file_content)
-                if response.status_code not in [200, 201]:
-                    print(f"Error creating file: {response.text}")
-                    return False
-                print(f"File created successfully with status code: {response.status_code}")
-                print(f"File URL: {response.json().get('webUrl', 'Unknown')}")
-            except Exception as e:
-                print(f"Exception during file creation: {e}")
-                return False
         try:
-            os.unlink(temp_file_path)
+            # The file object is streamed as the request body instead of being read into memory
+            with open(local_file_path, 'rb') as backup_file:
+                response = requests.put(upload_url, headers=headers, data=backup_file)
+            if response.status_code not in [200, 201]:
+                print(f"Error uploading file: {response.text}")
+                return False
+            print(f"File uploaded successfully with status code: {response.status_code}")
+            print(f"File URL: {response.json().get('webUrl', 'Unknown')}")
         except Exception as e:
-            print(f"Warning: Could not delete temporary file {temp_file_path}: {e}")
+            print(f"Exception during file upload: {e}")
+            return False
         print(f"OneDrive backup complete: {backup_filename}")
         return True
     except Exception as e:
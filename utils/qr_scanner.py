@@ -1,7 +1,21 @@
 from PIL import Image
 from pyzbar.pyzbar import decode
 import re
-from urllib.parse import unquote
+from urllib.parse import unquote, urlparse, parse_qs
+from models.totp_engine import params_from_query
+
+
+class QrTokenResult(tuple):
+    """``(issuer, secret, name)`` tuple that also carries the otpauth parameters
+
+    Unpacks exactly like the plain 3-tuple; ``params`` is an OtpParams with the
+    URI's period, digits and algorithm (defaults when they are omitted).
+    """
+
+    def __new__(cls, issuer, secret, name, params):
+        result = super().__new__(cls, (issuer, secret, name))
+        result.params = params
+        return result
 
 def scan_qr_image(image_input):
     """Scan a QR code image and extract TOTP information
@@ -10,7 +24,8 @@ def scan_qr_image(image_input):
         image_input (str or PIL.Image): Path to the QR code image or a PIL Image object
         
     Returns:
-        tuple: (issuer, secret, name) or the raw QR data string for Google Auth migration QR codes
+        QrTokenResult: (issuer, secret, name) tuple with a ``params`` attribute,
+            or the raw QR data string for Google Auth migration QR codes
     """
     try:
         # Handle both file path and PIL Image input
@@ -38,6 +53,9 @@ def scan_qr_image(image_input):
             # Return the raw data for Google Auth migration QR codes
             return qr_data
         
+        # period/digits/algorithm query parameters (ValueError if unsupported)
+        params = params_from_query(parse_qs(urlparse(qr_data).query))
+
         # Parse the otpauth URL
         # Format: otpauth://totp/ISSUER:ACCOUNT?secret=SECRET&issuer=ISSUER
         match = re.match(r'otpauth://totp/([^:]+):([^?]+)\?secret=([^&]+)(&.*)?', qr_data)
@@ -46,7 +64,7 @@ def scan_qr_image(image_input):
             issuer = unquote(match.group(1))
             name = unquote(match.group(2))
             secret = match.group(3)
-            return (issuer, secret, name)
+            return QrTokenResult(issuer, secret, name, params)
             
         # Alternative format: otpauth://totp/ACCOUNT?secret=SECRET&issuer=ISSUER
         match = re.match(r'otpauth://totp/([^?]+)\?secret=([^&]+)&issuer=([^&]+)(.*)?', qr_data)
@@ -55,7 +73,7 @@ def scan_qr_image(image_input):
             name = unquote(match.group(1))
             secret = match.group(2)
             issuer = unquote(match.group(3))
-            return (issuer, secret, name)
+            return QrTokenResult(issuer, secret, name, params)
             
         return None
         
@@ -0,0 +1,284 @@
+import os
+import json
+import base64
+import sqlite3
+import threading
+from cryptography.exceptions import InvalidTag
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from .crypto import LEGACY_KDF_PARAMS, vault_session, kdf_params
+from .vault_storage import VaultStorage, JsonVaultStorage
+
+SCHEMA_VERSION = 1
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS tokens (
+    id TEXT PRIMARY KEY,
+    issuer TEXT NOT NULL,
+    name TEXT NOT NULL,
+    created TEXT,
+    icon TEXT,
+    period INTEGER,
+    digits INTEGER,
+    algorithm TEXT,
+    secret BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_tokens_issuer_name ON tokens (issuer COLLATE NOCASE, name COLLATE NOCASE);
+CREATE INDEX IF NOT EXISTS idx_tokens_created ON tokens (created);
+"""
+
+# Statements are kept as constants so sqlite3's statement cache prepares each one once
+_SELECT_ALL = "SELECT id, issuer, name, created, icon, period, digits, algorithm, secret FROM tokens ORDER BY rowid"
+_UPSERT = """
+INSERT INTO tokens (id, issuer, name, created, icon, period, digits, algorithm, secret)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (id) DO UPDATE SET
+    issuer = excluded.issuer, name = excluded.name, created = excluded.created, icon = excluded.icon,
+    period = excluded.period, digits = excluded.digits, algorithm = excluded.algorithm, secret = excluded.secret
+"""
+_DELETE = "DELETE FROM tokens WHERE id = ?"
+_DELETE_ALL = "DELETE FROM tokens"
+_GET_META = "SELECT value FROM meta WHERE key = ?"
+_SET_META = "INSERT INTO meta (key, value) VALUES (?, ?) ON CONFLICT (key) DO UPDATE SET value = excluded.value"
+_DATA_VERSION = "PRAGMA data_version"
+
+# Encrypted under the vault key to tell a wrong password from a corrupted row
+_CHECK_PLAINTEXT = b"winotp-vault"
+_NONCE_SIZE = 12
+
+
+class SqliteVault(VaultStorage):
+    """Token vault in a SQLite database, for large (shared) vaults.
+
+    One row per token, so an edit is a single indexed write instead of a
+    rewrite of the whole vault. The database runs in WAL mode, and issuer/name
+    and created are indexed. With a password, each secret is encrypted on its
+    own row with AES-GCM (the row id is authenticated as associated data, so
+    secrets can't be swapped between rows) under a key derived once per vault;
+    the other columns stay queryable.
+
+    The database is the only copy: tokens.json is written (encrypted the
+    same way as the JSON backend) by ``export_tokens_file`` alone, when
+    protection changes or the vault moves back to the JSON format.
+
+    ``is_current`` uses SQLite's ``data_version``, a counter that only moves
+    when another connection commits, so this vault's own writes never look
+    like external changes.
+    """
+
+    format = "sqlite"
+    incremental = True
+
+    def __init__(self, db_path, tokens_path, password=None):
+        """
+        Args:
+            db_path (str): Path to the database file
+            tokens_path (str): Path to tokens.json, written by ``export_tokens_file``
+            password (str): Password for per-row secret encryption, or None
+        """
+        super().__init__(tokens_path, password)
+        self.db_path = db_path
+        self._lock = threading.RLock()
+        self._connection = None
+        self._aead = None
+        self._data_version = None   # PRAGMA data_version when the vault was last loaded
+
+    # --- Connection -------------------------------------------------------
+
+    def _connect(self):
+        """Open the database and set up the schema and key (lock held)"""
+        if self._connection is not None:
+            return self._connection
+
+        directory = os.path.dirname(self.db_path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory, exist_ok=True)
+        connection = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        connection.executescript(_SCHEMA)
+        self._connection = connection
+        if self._get_meta("schema_version") is None:
+            self._set_meta("schema_version", str(SCHEMA_VERSION))
+        return connection
+
+    def _get_meta(self, key):
+        row = self._connection.execute(_GET_META, (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, key, value):
+        self._connection.execute(_SET_META, (key, value))
+
+    def _cipher(self, create=False):
+        """Return the AES-GCM cipher for the password, or None if secrets are stored plain (lock held).
+
+        Raises:
+            ValueError: If the password doesn't match the vault
+        """
+        if self.password is None or self._aead is not None:
+            return self._aead
+
+        salt, check, kdf = self._get_meta("salt"), self._get_meta("check"), self._get_meta("kdf")
+        if salt is None:
+            if not create:
+                return None  # Nothing has been encrypted yet
+            # The session key, derived when the vault was unlocked
+            key, salt_bytes, params = vault_session.write_key(self.password)
+            aead = AESGCM(base64.urlsafe_b64decode(key))
+            nonce = os.urandom(_NONCE_SIZE)
+            self._set_meta("salt", base64.b64encode(salt_bytes).decode())
+            self._set_meta("kdf", json.dumps(params))
+            self._set_meta("check", base64.b64encode(nonce + aead.encrypt(nonce, _CHECK_PLAINTEXT, None)).decode())
+        else:
+            # Databases from before the unified key derivation name no KDF
+            params = kdf_params(json.loads(kdf)) if kdf else LEGACY_KDF_PARAMS
+            salt_bytes = base64.b64decode(salt)
+            key = vault_session.key_for(self.password, salt_bytes, params)
+            aead = AESGCM(base64.urlsafe_b64decode(key))
+            check = base64.b64decode(check)
+            try:
+                aead.decrypt(check[:_NONCE_SIZE], check[_NONCE_SIZE:], None)
+            except InvalidTag:
+                raise ValueError("Incorrect password for vault")
+            vault_session.remember(self.password, salt_bytes, key, params)
+        self._aead = aead
+        return aead
+
+    def close(self):
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+                self._aead = None
+                self._data_version = None
+
+    # --- Rows -------------------------------------------------------------
+
+    def _row(self, token_id, token_data, aead):
+        secret = token_data["secret"].encode()
+        if aead is not None:
+            nonce = os.urandom(_NONCE_SIZE)
+            secret = nonce + aead.encrypt(nonce, secret, token_id.encode())
+        return (
+            token_id,
+            token_data.get("issuer", "Unknown"),
+            token_data.get("name", "Unknown"),
+            token_data.get("created"),
+            token_data.get("icon"),
+            token_data.get("period"),
+            token_data.get("digits"),
+            token_data.get("algorithm"),
+            secret
+        )
+
+    def _token_data(self, row, aead):
+        token_id, issuer, name, created, icon, period, digits, algorithm, secret = row
+        if aead is not None:
+            secret = aead.decrypt(secret[:_NONCE_SIZE], secret[_NONCE_SIZE:], token_id.encode())
+        data = {"issuer": issuer, "name": name, "secret": secret.decode()}
+        if created is not None:
+            data["created"] = created
+        if icon is not None:
+            data["icon"] = icon
+        if period is not None:
+            data["period"] = period
+        if digits is not None:
+            data["digits"] = digits
+        if algorithm is not None:
+            data["algorithm"] = algorithm
+        return data
+
+    # --- VaultStorage -----------------------------------------------------
+
+    def load(self):
+        try:
+            with self._lock:
+                connection = self._connect()
+                aead = self._cipher()
+                self._data_version = connection.execute(_DATA_VERSION).fetchone()[0]
+                return {row[0]: self._token_data(row, aead) for row in connection.execute(_SELECT_ALL)}
+        except (ValueError, InvalidTag) as e:
+            print(f"Error decrypting SQLite vault: {e}")
+            return None
+
+    def save_all(self, tokens):
+        with self._lock:
+            connection = self._connect()
+            # A full save may come with a new password: re-key every row
+            self._aead = None
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                connection.execute("DELETE FROM meta WHERE key IN ('salt', 'check', 'kdf')")
+                aead = self._cipher(create=True)
+                connection.execute(_DELETE_ALL)
+                connection.executemany(_UPSERT, (self._row(token_id, data, aead) for token_id, data in tokens.items()))
+                connection.execute("COMMIT")
+            except BaseException:
+                connection.execute("ROLLBACK")
+                self._aead = None
+                raise
+        return True
+
+    def put(self, token_id, token_data):
+        with self._lock:
+            connection = self._connect()
+            connection.execute(_UPSERT, self._row(token_id, token_data, self._cipher(create=True)))
+
+    def delete(self, token_id):
+        with self._lock:
+            self._connect().execute(_DELETE, (token_id,))
+
+    @property
+    def watch_paths(self):
+        return (self.db_path, self.db_path + "-wal")
+
+    def is_current(self):
+        with self._lock:
+            if self._connection is None or self._data_version is None:
+                return False
+            return self._connection.execute(_DATA_VERSION).fetchone()[0] == self._data_version
+
+    def flush(self):
+        with self._lock:
+            if self._connection is not None:
+                self._connection.execute("PRAGMA wal_checkpoint(PASSIVE)")
+
+    def export_tokens_file(self):
+        with self._lock:
+            tokens = self.load()
+            if tokens is None:
+                raise ValueError("Could not read the SQLite vault to export tokens.json")
+            JsonVaultStorage(self.tokens_path, self.password).save_all(tokens)
+            self.flush()
+
+
+def migrate_tokens_file(tokens_path, db_path, password=None):
+    """Copy a tokens.json vault into a new SQLite vault
+
+    Args:
+        tokens_path (str): Existing tokens.json
+        db_path (str): Database to create
+        password (str): Password the tokens.json is encrypted with (and the
+            database will be), or None for a plain vault
+
+    Returns:
+        int: Number of tokens migrated
+
+    Raises:
+        ValueError: If tokens.json can't be read or decrypted
+    """
+    tokens = JsonVaultStorage(tokens_path, password).load()
+    if not isinstance(tokens, dict):
+        raise ValueError(f"Could not read tokens from {tokens_path}")
+    tokens = {token_id: data for token_id, data in tokens.items() if isinstance(data, dict) and "secret" in data}
+
+    vault = SqliteVault(db_path, tokens_path, password)
+    try:
+        vault.save_all(tokens)
+    finally:
+        vault.close()
+    print(f"Migrated {len(tokens)} tokens from {tokens_path} to {db_path}")
+    return len(tokens)
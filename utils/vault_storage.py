@@ -0,0 +1,205 @@
+import abc
+import os
+import threading
+from .file_io import read_json, write_json, file_signature
+from .crypto import (
+    VAULT_VERSION, kdf_outdated, VaultEnvelope, decrypt_tokens, parse_vault_header, read_vault_header,
+    vault_version, write_encrypted_tokens_file
+)
+
+# Values of the "vault_format" setting
+VAULT_FORMATS = ("json", "journal", "sqlite")
+
+
+class VaultStorage(abc.ABC):
+    """Where the token vault is persisted.
+
+    The API only talks to this interface, so it runs unchanged on any backend.
+    Tokens are exchanged in the tokens.json ``{token_id: token_data}`` format.
+    Every backend implements ``load`` and ``save_all``. Backends with
+    ``incremental = True`` also override the optional ``put`` and ``delete``
+    hooks to persist single edits; the others are saved with ``save_all``
+    (debounced by the API).
+
+    The API watches ``watch_paths`` and, when one changes, asks ``is_current``
+    whether the change was its own write before reloading anything.
+    """
+
+    format = None
+    incremental = False
+
+    def __init__(self, tokens_path, password=None):
+        """
+        Args:
+            tokens_path (str): Path to tokens.json
+            password (str): Password for an encrypted vault, or None for a plain one
+        """
+        self.tokens_path = tokens_path
+        self.password = password
+        self._signatures = None  # Stat signatures of watch_paths after the last load or write
+
+    @property
+    def loaded(self):
+        """True once the storage was loaded or written, so single edits can be persisted"""
+        return True
+
+    @property
+    def watch_paths(self):
+        """Files whose changes mean the vault was modified"""
+        return (self.tokens_path,)
+
+    def is_current(self):
+        """True if the vault on disk is still what this storage last loaded or wrote
+
+        Called after a file-watch event so the app doesn't reload its own writes.
+        The default compares the stat signatures of ``watch_paths``.
+        """
+        return self._signatures is not None and self._signatures == self._file_signatures()
+
+    def _file_signatures(self):
+        return tuple(file_signature(path) for path in self.watch_paths)
+
+    def _remember_files(self):
+        """Record the files as written or loaded by this storage"""
+        self._signatures = self._file_signatures()
+
+    @abc.abstractmethod
+    def load(self):
+        """Return every token, or None if the vault could not be decrypted"""
+
+    @abc.abstractmethod
+    def save_all(self, tokens):
+        """Replace the stored vault with ``tokens``; returns True on success"""
+
+    def put(self, token_id, token_data):
+        """Add or replace one token
+
+        Optional hook: only backends with ``incremental = True`` override it
+        (and ``delete``). The API never calls it on the others.
+        """
+        raise TypeError(f"{type(self).__name__} is not incremental; save with save_all")
+
+    def delete(self, token_id):
+        """Remove one token
+
+        Optional hook, overridden together with ``put`` by incremental backends.
+        """
+        raise TypeError(f"{type(self).__name__} is not incremental; save with save_all")
+
+    def flush(self):
+        """Write buffered edits to this storage's own files (on exit, lock and backups)"""
+
+    def export_tokens_file(self):
+        """Make tokens.json hold the whole vault, for code that works on the file itself
+
+        Called when protection is enabled or disabled (tokens.json is re-encrypted
+        directly) and when switching back to the JSON format. Backends whose
+        snapshot is tokens.json only need ``flush``.
+        """
+        self.flush()
+
+    def close(self):
+        """Release any open handles"""
+
+
+class JsonVaultStorage(VaultStorage):
+    """The whole vault in tokens.json, rewritten (and re-encrypted) on every save
+
+    An encrypted vault carries a ``generation`` counter in its header, bumped
+    by every save, so ``is_current`` recognizes this storage's own writes from
+    the header alone, without running the key derivation. A plain vault is
+    compared by its stat signature.
+
+    Tokens are sealed one by one (see ``VaultEnvelope``), so a save only
+    encrypts the tokens that changed since the last load or save. A file in an
+    older format, or keyed with PBKDF2, is rewritten in the current format
+    under the session key the first time it is decrypted.
+    """
+
+    format = "json"
+
+    def __init__(self, tokens_path, password=None):
+        super().__init__(tokens_path, password)
+        self._lock = threading.Lock()
+        self.generation = None  # Generation of the encrypted vault last loaded or written
+        self._envelope = VaultEnvelope()
+
+    def load(self):
+        with self._lock:
+            if self.password is None:
+                # Signature first: a write racing the read then looks external, never the reverse
+                self._remember_files()
+                return read_json(self.tokens_path)
+            try:
+                try:
+                    with open(self.tokens_path, "rb") as file:
+                        content = file.read()
+                except FileNotFoundError:
+                    return {}
+                header, _ = parse_vault_header(content)
+                self.generation = header.get("generation") if header is not None else None
+                tokens = decrypt_tokens(content, self.password, self._envelope)
+            except Exception as e:
+                print(f"Error decrypting tokens file: {e}")
+                return None
+
+            version = vault_version(content)
+            outdated = version is not None and (
+                version != VAULT_VERSION or kdf_outdated(header))
+            if tokens is not None and outdated:
+                print("Upgrading tokens file to the current vault format and key derivation")
+                self._write_encrypted(tokens)
+            return tokens
+
+    def save_all(self, tokens):
+        with self._lock:
+            if self.password is None:
+                success = write_json(self.tokens_path, tokens)
+                if success:
+                    self._remember_files()
+                return success
+            return self._write_encrypted(tokens)
+
+    def _write_encrypted(self, tokens):
+        """Write the encrypted vault with the next generation (lock held)"""
+        generation = (self.generation or 0) + 1
+        success = write_encrypted_tokens_file(self.tokens_path, tokens, self.password, generation, self._envelope)
+        if success:
+            self.generation = generation
+        return success
+
+    def is_current(self):
+        with self._lock:
+            if self.password is None:
+                return super().is_current()
+            if self.generation is None:
+                return False
+            header = read_vault_header(self.tokens_path)
+            return header is not None and header.get("generation") == self.generation
+
+
+def sqlite_path_for(tokens_path):
+    """Return the database path used next to a tokens.json"""
+    return os.path.splitext(tokens_path)[0] + ".db"
+
+
+def open_vault_storage(vault_format, tokens_path, password=None):
+    """Create the storage backend for a ``vault_format`` setting
+
+    A SQLite vault that doesn't exist yet is migrated from tokens.json.
+
+    Raises:
+        ValueError: If the format is unknown
+    """
+    if vault_format == "json":
+        return JsonVaultStorage(tokens_path, password)
+    if vault_format == "journal":
+        from .journal_vault import JournalVault
+        return JournalVault(tokens_path, password)
+    if vault_format == "sqlite":
+        from .sqlite_vault import SqliteVault, migrate_tokens_file
+        db_path = sqlite_path_for(tokens_path)
+        if not os.path.exists(db_path) and os.path.exists(tokens_path):
+            migrate_tokens_file(tokens_path, db_path, password)
+        return SqliteVault(db_path, tokens_path, password)
+    raise ValueError(f"Unknown vault format: {vault_format}")
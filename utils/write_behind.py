@@ -0,0 +1,105 @@
+import threading
+import time
+
+
+class WriteBehind:
+    """Coalesce repeated saves into one write after a short debounce.
+
+    Callers mark the data dirty after each change and return immediately; a
+    background thread calls ``save`` once the changes have been quiet for
+    ``delay`` seconds (or at the latest ``max_delay`` seconds after the first
+    unsaved change). ``flush`` writes pending changes synchronously and is used
+    as a barrier wherever the file on disk must be current (exit, lock,
+    backups, re-encryption).
+    """
+
+    def __init__(self, save, delay=0.5, max_delay=5.0):
+        """
+        Args:
+            save (callable): Writes the data; returns a ``{"status", "message"}`` dict
+            delay (float): Seconds without new changes before writing
+            max_delay (float): Upper bound on how long a change may stay unsaved
+        """
+        self._save = save
+        self._delay = delay
+        self._max_delay = max_delay
+
+        self._condition = threading.Condition()
+        self._save_lock = threading.Lock()  # Serializes calls to save
+        self._generation = 0        # Bumped by every mark_dirty
+        self._saved_generation = 0  # Generation written by the last successful save
+        self._first_dirty = None    # Monotonic time of the oldest unsaved change
+        self._last_dirty = None     # Monotonic time of the newest unsaved change
+        self._thread = None
+        self._closed = False
+
+    @property
+    def dirty(self):
+        """True while there are changes that have not been written"""
+        with self._condition:
+            return self._generation != self._saved_generation
+
+    def mark_dirty(self):
+        """Record a change and schedule a write"""
+        with self._condition:
+            now = time.monotonic()
+            if self._generation == self._saved_generation:
+                self._first_dirty = now
+            self._last_dirty = now
+            self._generation += 1
+            if self._thread is None and not self._closed:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+            self._condition.notify_all()
+
+    def flush(self):
+        """Write pending changes now.
+
+        Returns:
+            dict: Result of ``save``, or a success result if nothing was pending
+        """
+        with self._save_lock:
+            with self._condition:
+                generation = self._generation
+                if generation == self._saved_generation:
+                    return {"status": "success", "message": "No pending changes"}
+            result = self._save()
+            if result.get("status") == "success":
+                with self._condition:
+                    self._saved_generation = max(self._saved_generation, generation)
+                    self._condition.notify_all()
+            else:
+                print(f"Write-behind save failed: {result.get('message')}")
+            return result
+
+    def close(self):
+        """Flush pending changes and stop the background thread"""
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        return self.flush()
+
+    def _due_at(self):
+        """Monotonic time at which pending changes should be written (condition held)"""
+        return min(self._last_dirty + self._delay, self._first_dirty + self._max_delay)
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._closed and self._generation == self._saved_generation:
+                    self._condition.wait()
+                if self._closed:
+                    return
+                remaining = self._due_at() - time.monotonic()
+                if remaining > 0:
+                    self._condition.wait(remaining)
+                    continue
+            try:
+                result = self.flush()
+            except Exception as e:
+                result = {"status": "error", "message": str(e)}
+                print(f"Write-behind save failed: {e}")
+            if result.get("status") != "success":
+                # Back off before retrying so a failing disk isn't hammered
+                with self._condition:
+                    self._condition.wait(self._max_delay)